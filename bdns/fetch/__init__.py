@@ -18,6 +18,10 @@ def __getattr__(name):
         from bdns.fetch.client import BDNSClient
 
         return BDNSClient
+    if name == "AsyncBDNSClient":
+        from bdns.fetch.async_client import AsyncBDNSClient
+
+        return AsyncBDNSClient
     raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
@@ -33,4 +37,5 @@ __all__ = [
     "BDNSError",
     "BDNSWarning",
     "BDNSClient",
+    "AsyncBDNSClient",
 ]
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, AsyncGenerator, Dict, Optional
+
+import aiohttp
+
+from bdns.fetch import json_backend
+from bdns.fetch.cache import ResponseCache
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.endpoints import BDNS_API_BASE_URL, endpoint_name
+from bdns.fetch.metrics import MetricsHook
+from bdns.fetch.exceptions import BDNSRetryableError
+from bdns.fetch.pagination import aiter_window
+from bdns.fetch.utils import format_url, AsyncRateLimiter, RateLimiter
+
+# Use a named logger for this module, don't configure at import time
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+
+def _unsupported(name: str, reason: str):
+    """A BDNSClient method that can't work on asyncio, raising TypeError."""
+
+    def method(self, *args, **kwargs):
+        raise TypeError(
+            f"AsyncBDNSClient.{name} is not supported: {reason}. Use BDNSClient."
+        )
+
+    method.__name__ = name
+    return method
+
+
+class AsyncBDNSClient(BDNSClient):
+    """
+    asyncio client for the BDNS API, built on aiohttp.
+
+    Exposes the same fetch_* methods as BDNSClient: endpoint URLs and query
+    parameters are built by the shared methods, only the transport differs.
+    Listing methods return async generators, binary downloads return coroutines:
+
+        async with AsyncBDNSClient() as client:
+            async for item in client.fetch_organos(idAdmon="C"):
+                ...
+            pdf = await client.fetch_convocatorias_pdf(id=608268, vpd="A07")
+
+    Resume journals, streamed JSON decoding, deduplication and drift handling
+    (journal_dir, resume, stream_json, dedup and on_drift of BDNSClient) are
+    not supported: paginated queries are fetched in full, as the API returns
+    them. Neither are fetch_sharded, the sync_* methods nor the synchronous
+    context manager, which raise TypeError.
+    """
+
+    # Draws from the same token bucket as BDNSClient, so threaded and asyncio
+    # clients running in one process share the 10 requests/second budget.
+    _rate_limiter = AsyncRateLimiter(BDNSClient._rate_limiter)
+
+    _retryable_exceptions = (
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+        BDNSRetryableError,
+    )
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        wait_time: int = 2,
+        max_workers: int = 5,
+        return_raw: bool = False,
+        pool_maxsize: Optional[int] = None,
+        max_prefetch: Optional[int] = None,
+        ordered: bool = False,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        base_url: str = BDNS_API_BASE_URL,
+        metrics: Optional[MetricsHook] = None,
+    ):
+        """
+        Initialize the asyncio BDNS client.
+
+        Args:
+            max_retries (int): Maximum number of retries for failed requests. Default: 3
+            wait_time (int): Time to wait between retries in seconds. Default: 2
+            max_workers (int): Maximum number of concurrent page requests per paginated query. Default: 5
+            return_raw (bool): Return raw page objects instead of individual items from paginated responses. Default: False
+            pool_maxsize (int): Maximum number of open connections to the API. Default: max_workers
+            max_prefetch (int): Maximum number of pages in flight or waiting to be consumed during pagination. Default: 2 * max_workers
+            ordered (bool): Emit paginated results in page order while still fetching pages concurrently. Default: False
+            cache (ResponseCache): Cache for responses of catalog endpoints, see bdns.fetch.cache.open_cache. Default: None (no cache)
+            rate_limiter (RateLimiter): Rate limiter for this client instead of the one shared by all clients. Default: None (shared)
+            base_url (str): Root URL the API requests are sent to instead of the BDNS API. Default: BDNS_API_BASE_URL
+            metrics (MetricsHook): Receives per-request metrics, see bdns.fetch.metrics. Default: None (not collected)
+        """
+        super().__init__(
+            max_retries=max_retries,
+            wait_time=wait_time,
+            max_workers=max_workers,
+            return_raw=return_raw,
+            pool_maxsize=pool_maxsize,
+            max_prefetch=max_prefetch,
+            ordered=ordered,
+            cache=cache,
+            base_url=base_url,
+            metrics=metrics,
+        )
+        if rate_limiter is not None:
+            self._rate_limiter = AsyncRateLimiter(rate_limiter)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        aiohttp session shared by all requests of this client.
+
+        Created on first use, which must happen inside a running event loop.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the aiohttp session and release pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _acquire_rate_limit(self) -> None:
+        """Waits for the rate limiter, reporting the time blocked."""
+        start = time.perf_counter()
+        await self._rate_limiter.acquire()
+        self.metrics.on_rate_limit_wait(time.perf_counter() - start)
+
+    # Inherited from BDNSClient, but blocking or iterating synchronously
+    __enter__ = _unsupported("__enter__", "use 'async with'")
+    __exit__ = _unsupported("__exit__", "use 'async with'")
+    fetch_sharded = _unsupported("fetch_sharded", "date shards run on threads")
+    sync_concesiones_busqueda = _unsupported(
+        "sync_concesiones_busqueda", "sync runs synchronously"
+    )
+    sync_ayudasestado_busqueda = _unsupported(
+        "sync_ayudasestado_busqueda", "sync runs synchronously"
+    )
+    sync_minimis_busqueda = _unsupported(
+        "sync_minimis_busqueda", "sync runs synchronously"
+    )
+    sync_partidospoliticos_busqueda = _unsupported(
+        "sync_partidospoliticos_busqueda", "sync runs synchronously"
+    )
+
+    async def _fetch_single_page(self, url: str) -> Dict[str, Any]:
+        """
+        Fetches data from a single page with error handling and retries.
+        """
+        cached = self._cached_response(url)
+        if cached is not None and self.cache.is_fresh(url, cached):
+            self._count_cache("hits")
+            return cached.data
+        headers = self._conditional_headers(cached)
+
+        retry_decorator = self._create_retry_decorator(url)
+
+        @retry_decorator
+        async def fetch_with_retries():
+            logger.debug(f"HTTP REQUEST: GET {url}")
+
+            await self._acquire_rate_limit()
+            start_time = time.time()
+
+            async with self.session.get(
+                self._request_url(url), headers=headers
+            ) as response:
+                body = await response.read()
+
+            response_time = (time.time() - start_time) * 1000
+
+            if response.status == 304 and cached is not None:
+                return self._revalidated_response(
+                    url, cached, response.headers, len(body), response_time
+                )
+
+            try:
+                data = json_backend.loads(body)
+            except ValueError:
+                data = body.decode("utf-8", errors="replace")
+
+            data = self._process_page_response(
+                url,
+                response.status,
+                response.reason,
+                response.headers,
+                data,
+                len(body),
+                response_time,
+            )
+            self._store_response(url, data, response.headers, body, cached)
+            return data
+
+        return await fetch_with_retries()
+
+    async def _fetch_paginated(
+        self,
+        base_url: str,
+        params: Dict[str, Any],
+        from_page: int = 0,
+        num_pages: int = 0,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Asynchronous generator for paginated data fetching.
+        """
+        first_page_url = format_url(base_url, {**params, "page": from_page})
+        first_response = await self._fetch_single_page(first_page_url)
+        total_pages = first_response.get("totalPages", 1)
+
+        for item in self._page_items(first_response):
+            yield item
+
+        to_page = (
+            total_pages if num_pages == 0 else min(from_page + num_pages, total_pages)
+        )
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch_page(page: int):
+            async with semaphore:
+                return await self._fetch_single_page(
+                    format_url(base_url, {**params, "page": page})
+                )
+
+        pages = range(from_page + 1, to_page)
+        stats = self.last_pagination_stats = {"pages": 1}
+        try:
+            async for data in aiter_window(
+                fetch_page,
+                pages,
+                self.max_prefetch,
+                ordered=self.ordered,
+                stats=stats,
+                on_depth=functools.partial(
+                    self.metrics.on_queue_depth, endpoint_name(base_url)
+                ),
+            ):
+                stats["pages"] += 1
+                if isinstance(data, dict):
+                    for item in self._page_items(data):
+                        yield item
+        except Exception as e:
+            logger.error(f"Error in paginated fetch: {e}")
+            raise
+
+        if self.ordered:
+            logger.debug(
+                f"Ordered pagination held back up to "
+                f"{stats['reorder_buffer_peak']} pages for reordering"
+            )
+
+    async def _fetch(
+        self, url: str, params: Dict[str, Any] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Fetches data from a single non-paginated endpoint with retries and error handling.
+        """
+        full_url = format_url(url, params) if params else url
+        data = await self._fetch_single_page(full_url)
+
+        if self.return_raw:
+            yield data
+        elif isinstance(data, list):
+            for item in data:
+                yield item
+        elif isinstance(data, dict):
+            if "content" in data and isinstance(data["content"], list):
+                for item in data["content"]:
+                    yield item
+            else:
+                yield data
+        else:
+            logger.warning(f"Unexpected response type: {type(data)}")
+            yield data
+
+    async def _fetch_binary(self, url: str) -> bytes:
+        """
+        Asynchronously fetches binary content from a URL, with retries.
+        """
+        from bdns.fetch.exceptions import handle_api_response
+
+        logger.debug(f"Starting binary fetch from: {url}")
+
+        retry_decorator = self._create_retry_decorator(url)
+
+        @retry_decorator
+        async def fetch_with_retries():
+            await self._acquire_rate_limit()
+            start_time = time.perf_counter()
+            async with self.session.get(self._request_url(url)) as response:
+                content = await response.read()
+                self.metrics.on_request(
+                    endpoint_name(url),
+                    url,
+                    response.status,
+                    time.perf_counter() - start_time,
+                    len(content),
+                )
+                logger.debug(
+                    f"Binary response: {response.status} - Content-Type: {response.headers.get('content-type', 'unknown')}"
+                )
+                if response.status == 200:
+                    logger.debug(f"Binary content fetched: {len(content)} bytes")
+                    return content
+                elif response.status == 204:
+                    logger.debug("No content returned (204)")
+                    return b""
+                elif response.status == 404:
+                    logger.warning(f"Resource not found (404) for URL: {url}")
+                    return b""
+                else:
+                    raise handle_api_response(
+                        response.status,
+                        url,
+                        await response.text(),
+                        dict(response.headers),
+                    )
+
+        try:
+            return await fetch_with_retries()
+        except aiohttp.ClientError as e:
+            logger.error(f"Request failed for binary fetch: {e}")
+            raise
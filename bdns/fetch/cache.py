@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+On-disk cache of decoded API responses.
+
+Catalog endpoints (actividades, sectores, organos...) change rarely, so their
+responses are kept for a per-endpoint TTL instead of spending a rate-limiter
+token on every run. Entries are keyed on the final request URL and evicted
+least-recently-used first once the cache exceeds its size bound.
+
+Entries also keep the response validators (ETag / Last-Modified) and a hash of
+the body, so expired entries can be revalidated with a conditional request
+instead of downloaded again.
+"""
+
+import abc
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+from bdns.fetch.endpoints import *
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+DAY = 24 * 60 * 60
+
+# Seconds a response stays fresh, per endpoint. Endpoints not listed here are
+# never cached: search results change as new records are registered.
+DEFAULT_CACHE_TTLS = {
+    BDNS_API_ENDPOINT_ACTIVIDADES: 7 * DAY,
+    BDNS_API_ENDPOINT_SECTORES: 7 * DAY,
+    BDNS_API_ENDPOINT_REGIONES: 7 * DAY,
+    BDNS_API_ENDPOINT_FINALIDADES: 7 * DAY,
+    BDNS_API_ENDPOINT_TIPOS_BENEFICIARIOS: 7 * DAY,
+    BDNS_API_ENDPOINT_INSTRUMENTOS: 7 * DAY,
+    BDNS_API_ENDPOINT_REGLAMENTOS: 7 * DAY,
+    BDNS_API_ENDPOINT_OBJETIVOS: 7 * DAY,
+    BDNS_API_ENDPOINT_ORGANOS: DAY,
+    BDNS_API_ENDPOINT_ORGANOS_AGRUPACION: DAY,
+    BDNS_API_ENDPOINT_ORGANOS_CODIGO: DAY,
+    BDNS_API_ENDPOINT_ORGANOS_CODIGO_ADMIN: DAY,
+    BDNS_API_ENDPOINT_GRANDES_BENEFICIARIOS_ANIOS: DAY,
+}
+
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def default_cache_dir() -> Path:
+    """Per-user cache directory, honouring XDG_CACHE_HOME."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "bdns-fetch"
+
+
+class CacheEntry(NamedTuple):
+    """A cached response body, when it was stored and how to revalidate it."""
+
+    data: Any
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+class ResponseCache(abc.ABC):
+    """
+    Base class of response caches. Subclasses implement the storage of encoded
+    entries through _read, _write and _evict; TTL handling is shared.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        max_size: int = DEFAULT_CACHE_MAX_SIZE,
+    ):
+        self.ttls = DEFAULT_CACHE_TTLS if ttls is None else ttls
+        self.max_size = max_size
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def ttl(self, url: str) -> float:
+        """Seconds a response for this URL stays fresh, 0 if it is not cacheable."""
+        return self.ttls.get(url.split("?", 1)[0], 0)
+
+    def is_fresh(self, url: str, entry: CacheEntry) -> bool:
+        """Whether an entry for this URL is still within its TTL."""
+        return time.time() - entry.stored_at <= self.ttl(url)
+
+    def get(self, url: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Returns the cached entry for a URL, if any. Expired entries are only
+        returned with allow_stale, e.g. to revalidate them.
+        """
+        if not self.ttl(url):
+            return None
+        payload = self._read(self.key(url))
+        if payload is None:
+            return None
+        stored = json.loads(payload)
+        entry = CacheEntry(*(stored.get(field) for field in CacheEntry._fields))
+        if not allow_stale and not self.is_fresh(url, entry):
+            return None
+        return entry
+
+    def set(
+        self,
+        url: str,
+        data: Any,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_hash: Optional[str] = None,
+    ) -> None:
+        """Stores a response for a cacheable URL."""
+        if not self.ttl(url):
+            return
+        entry = CacheEntry(data, time.time(), etag, last_modified, content_hash)
+        payload = json.dumps({"url": url, **entry._asdict()}, ensure_ascii=False)
+        self._write(self.key(url), payload)
+        self._evict()
+
+    def refresh(self, url: str, entry: CacheEntry) -> None:
+        """Restarts the TTL of an entry the server confirmed as unchanged."""
+        self.set(url, entry.data, entry.etag, entry.last_modified, entry.content_hash)
+
+    def close(self) -> None:
+        """Releases resources held by the cache."""
+
+    @abc.abstractmethod
+    def _read(self, key: str) -> Optional[str]:
+        """Returns the encoded entry stored under key, None if there is none."""
+
+    @abc.abstractmethod
+    def _write(self, key: str, payload: str) -> None:
+        """Stores an encoded entry under key, replacing any previous one."""
+
+    @abc.abstractmethod
+    def _evict(self) -> None:
+        """Drops least recently used entries until the cache fits in max_size."""
+
+
+class DirectoryCache(ResponseCache):
+    """
+    One JSON file per response. Reads refresh the file's modification time,
+    which drives least-recently-used eviction.
+    """
+
+    def __init__(self, path: Union[str, Path], **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[str]:
+        file = self._file(key)
+        try:
+            payload = file.read_text(encoding="utf-8")
+            os.utime(file)
+        except OSError:
+            return None
+        return payload
+
+    def _write(self, key: str, payload: str) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a
+        # partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self._file(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _evict(self) -> None:
+        files = []
+        for file in self.path.glob("*.json"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, file in sorted(files):
+            if size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            size -= file_size
+            logger.debug(f"Evicted cached response {file.name}")
+
+
+class SQLiteCache(ResponseCache):
+    """Responses stored in a single SQLite file, with last access times for LRU."""
+
+    def __init__(self, path: Union[str, Path], **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def _read(self, key: str) -> Optional[str]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT payload FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return row[0]
+
+    def _write(self, key: str, payload: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), time.time()),
+            )
+
+    def _evict(self) -> None:
+        with self._lock, self._connection:
+            (size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            rows = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at"
+            ).fetchall()
+            for key, entry_size in rows:
+                if size <= self.max_size:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                size -= entry_size
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def open_cache(path: Union[str, Path], **kwargs) -> ResponseCache:
+    """
+    Opens a response cache: a SQLite file if the path ends in .db/.sqlite/.sqlite3,
+    a directory of JSON files otherwise.
+    """
+    if Path(path).suffix in SQLITE_SUFFIXES:
+        return SQLiteCache(path, **kwargs)
+    return DirectoryCache(path, **kwargs)
@@ -17,12 +17,27 @@ BDNS Fetch CLI: Command-line interface for BDNS data fetching.
 
 import typer
 import functools
+import inspect
+import json
 import logging
+import time
 import click
 from pathlib import Path
 
-from bdns.fetch.utils import write_to_file
+from bdns.fetch.utils import write_to_file, AdaptiveRateLimiter, SharedRateLimiter
+from bdns.fetch.types import (
+    RateLimitBackend,
+    JSONBackend,
+    OutputFormat,
+    DedupMode,
+    DriftPolicy,
+)
+from bdns.fetch.json_backend import use_json_backend
 from bdns.fetch.client import BDNSClient
+from bdns.fetch.sync import SyncState
+from bdns.fetch.cache import default_cache_dir, open_cache
+from bdns.fetch.compression import compression_codec
+from bdns.fetch.metrics import InMemoryMetrics, format_run_summary, run_summary
 from bdns.fetch import options
 from bdns.fetch import __version__
 
@@ -30,6 +45,10 @@ from bdns.fetch import __version__
 # Define a global BDNSClient instance with default parameters
 bnds_client = None
 app = typer.Typer()
+sync_app = typer.Typer(
+    help="Incrementally sync records registered since the last run (fechaRegInicio/fechaRegFin)."
+)
+app.add_typer(sync_app, name="sync")
 
 
 @app.callback(invoke_without_command=True)
@@ -39,6 +58,24 @@ def main(
     max_retries: int = options.max_retries,
     wait_time: int = options.wait_time,
     max_workers: int = options.max_workers,
+    max_prefetch: int = options.max_prefetch,
+    ordered: bool = options.ordered,
+    resume: bool = options.resume,
+    max_rate: float = options.max_rate,
+    rate_limit_backend: RateLimitBackend = options.rate_limit_backend,
+    rate_limit_file: Path = options.rate_limit_file,
+    cache_dir: Path = options.cache_dir,
+    no_cache: bool = options.no_cache,
+    stream_json: bool = options.stream_json,
+    dedup: DedupMode = options.dedup,
+    on_drift: DriftPolicy = options.on_drift,
+    metrics_file: Path = options.metrics_file,
+    stats: bool = options.stats,
+    stats_file: Path = options.stats_file,
+    json_backend: JSONBackend = options.json_backend,
+    output_format: OutputFormat = options.output_format,
+    line_buffered: bool = options.line_buffered,
+    compression_level: int = options.compression_level,
     return_raw: bool = options.return_raw,
     version: bool = options.version,
     verbose_flag: bool = options.verbose_flag,
@@ -67,17 +104,103 @@ def main(
         typer.echo(ctx.get_help())
         raise typer.Exit()
 
+    # Paginated downloads into a file keep a journal of the pages already
+    # written next to it, so an interrupted run can be resumed
+    writing_to_stdout = str(output_file) == "-"
+    if resume and writing_to_stdout:
+        raise typer.BadParameter(
+            "--resume requires --output-file", param_hint="--resume"
+        )
+    if (
+        output_format in (OutputFormat.parquet, OutputFormat.sqlite)
+        and writing_to_stdout
+    ):
+        raise typer.BadParameter(
+            f"--format {output_format.value} requires --output-file",
+            param_hint="--format",
+        )
+    # JSON lines are appended to after an interruption and SQLite upserts are
+    # idempotent; other formats have a header or footer and can't be resumed
+    if resume and output_format not in (OutputFormat.jsonl, OutputFormat.sqlite):
+        raise typer.BadParameter(
+            f"--resume can't be used with --format {output_format.value}",
+            param_hint="--resume",
+        )
+    # A compressed file cut short by an interruption can't be appended to
+    if resume and compression_codec(output_file) is not None:
+        raise typer.BadParameter(
+            "--resume can't be used with a compressed --output-file",
+            param_hint="--resume",
+        )
+    journal_dir = None if writing_to_stdout else f"{output_file}.resume"
+    # Only the output of an interrupted run is appended to: without a journal
+    # (e.g. the previous run completed) it is written from scratch
+    resuming = resume and any(Path(journal_dir).glob("*.jsonl"))
+
+    use_json_backend(json_backend.value)
+
+    cache = None if no_cache else open_cache(cache_dir or default_cache_dir())
+
+    if rate_limit_backend == RateLimitBackend.shared:
+        rate_limiter = SharedRateLimiter(
+            rate_limit_file or default_cache_dir() / "rate-limit.sqlite",
+            rate=max_rate,
+        )
+    else:
+        rate_limiter = AdaptiveRateLimiter(rate=max_rate)
+
+    collect_stats = stats or stats_file is not None
+    metrics = InMemoryMetrics() if metrics_file or collect_stats else None
+
     # Create configured client instance
     global bnds_client
     bnds_client = BDNSClient(
         max_retries=max_retries,
         wait_time=wait_time,
         max_workers=max_workers,
+        max_prefetch=max_prefetch,
+        ordered=ordered,
+        journal_dir=journal_dir,
+        resume=resume,
+        # Pages are only recorded as done once write_to_file has flushed them
+        journal_autoflush=False,
+        cache=cache,
+        rate_limiter=rate_limiter,
+        stream_json=stream_json,
+        dedup=dedup.value if dedup else None,
+        on_drift=on_drift.value,
         return_raw=return_raw,
+        metrics=metrics,
     )
+    ctx.call_on_close(bnds_client.close)
+    if cache is not None:
+        ctx.call_on_close(cache.close)
+    if isinstance(rate_limiter, SharedRateLimiter):
+        ctx.call_on_close(rate_limiter.close)
+    # Written even if the command fails, when the metrics matter most
+    if metrics_file is not None:
+        ctx.call_on_close(lambda: metrics.write_prometheus(metrics_file))
+    # Filled by write_to_file with the records written and the time writing them
+    write_stats = {} if collect_stats else None
+    if collect_stats:
+        started = time.perf_counter()
+
+        def report_stats():
+            summary = run_summary(metrics, time.perf_counter() - started, write_stats)
+            if stats_file is not None:
+                stats_file.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+            if stats:
+                typer.echo(format_run_summary(summary), err=True)
+
+        ctx.call_on_close(report_stats)
 
     ctx.obj = {
         "output_file": output_file,
+        "write_mode": "a" if resuming else "w",
+        "line_buffered": line_buffered,
+        "compression_level": compression_level,
+        "output_format": output_format.value,
+        "write_stats": write_stats,
         "verbose": verbose_flag,
         "client": bnds_client,  # Store configured client in context
     }
@@ -106,6 +229,15 @@ def main(
         logging.getLogger("bdns.fetch").setLevel(logging.INFO)
 
 
+def _command_signature(client_method_name):
+    """
+    Signature of a client method without self, for Typer. Read from the class,
+    so registering commands doesn't build a client for each of them.
+    """
+    signature = inspect.signature(getattr(BDNSClient, client_method_name))
+    return signature.replace(parameters=list(signature.parameters.values())[1:])
+
+
 def cli_wrapper(client_method_name):
     """
     Wrapper that executes a client method and writes the result to file.
@@ -116,9 +248,7 @@ def cli_wrapper(client_method_name):
     Returns:
         A function that can be used as a Typer command
     """
-    # Get the method signature from the global client instance
-    client = BDNSClient()
-    original_method = getattr(client, client_method_name)
+    original_method = getattr(BDNSClient, client_method_name)
 
     @functools.wraps(original_method)
     def wrapper(*args, **kwargs):
@@ -128,55 +258,106 @@ def cli_wrapper(client_method_name):
         # Call the method on the selected client
         client_method = getattr(bnds_client, client_method_name)
         data_generator = client_method(*args, **kwargs)
-        write_to_file(data_generator, output_file)
+        write_to_file(
+            data_generator,
+            output_file,
+            ctx.obj["write_mode"],
+            line_buffered=ctx.obj["line_buffered"],
+            on_flush=bnds_client.flush_journals,
+            compression_level=ctx.obj["compression_level"],
+            output_format=ctx.obj["output_format"],
+            table=client_method_name.removeprefix("fetch_"),
+            stats=ctx.obj["write_stats"],
+        )
         return None
 
+    wrapper.__signature__ = _command_signature(client_method_name)
     return wrapper
 
 
-# Register all commands using method names
-app.command("actividades")(cli_wrapper("fetch_actividades"))
-app.command("sectores")(cli_wrapper("fetch_sectores"))
-app.command("regiones")(cli_wrapper("fetch_regiones"))
-app.command("finalidades")(cli_wrapper("fetch_finalidades"))
-app.command("beneficiarios")(cli_wrapper("fetch_beneficiarios"))
-app.command("instrumentos")(cli_wrapper("fetch_instrumentos"))
-app.command("reglamentos")(cli_wrapper("fetch_reglamentos"))
-app.command("objetivos")(cli_wrapper("fetch_objetivos"))
-app.command("grandesbeneficiarios-anios")(
-    cli_wrapper("fetch_grandesbeneficiarios_anios")
-)
-app.command("planesestrategicos")(cli_wrapper("fetch_planesestrategicos"))
-app.command("organos")(cli_wrapper("fetch_organos"))
-app.command("organos-agrupacion")(cli_wrapper("fetch_organos_agrupacion"))
-app.command("organos-codigo")(cli_wrapper("fetch_organos_codigo"))
-app.command("organos-codigoadmin")(cli_wrapper("fetch_organos_codigoadmin"))
-app.command("convocatorias")(cli_wrapper("fetch_convocatorias"))
-app.command("concesiones-busqueda")(cli_wrapper("fetch_concesiones_busqueda"))
-app.command("ayudasestado-busqueda")(cli_wrapper("fetch_ayudasestado_busqueda"))
-app.command("terceros")(cli_wrapper("fetch_terceros"))
-app.command("convocatorias-busqueda")(cli_wrapper("fetch_convocatorias_busqueda"))
-app.command("convocatorias-ultimas")(cli_wrapper("fetch_convocatorias_ultimas"))
-app.command("convocatorias-documentos")(cli_wrapper("fetch_convocatorias_documentos"))
-app.command("convocatorias-pdf")(cli_wrapper("fetch_convocatorias_pdf"))
-app.command("grandesbeneficiarios-busqueda")(
-    cli_wrapper("fetch_grandesbeneficiarios_busqueda")
-)
-app.command("minimis-busqueda")(cli_wrapper("fetch_minimis_busqueda"))
-app.command("partidospoliticos-busqueda")(
-    cli_wrapper("fetch_partidospoliticos_busqueda")
-)
-app.command("planesestrategicos-busqueda")(
-    cli_wrapper("fetch_planesestrategicos_busqueda")
-)
-app.command("planesestrategicos-documentos")(
-    cli_wrapper("fetch_planesestrategicos_documentos")
-)
-app.command("planesestrategicos-vigencia")(
-    cli_wrapper("fetch_planesestrategicos_vigencia")
-)
-app.command("sanciones-busqueda")(cli_wrapper("fetch_sanciones_busqueda"))
+def sync_cli_wrapper(client_method_name):
+    """
+    Wrapper that runs a client sync_* method, writes the delta to file and only
+    then advances the checkpoint in the state file.
+
+    Args:
+        client_method_name: The name of the client sync method to wrap
+
+    Returns:
+        A function that can be used as a Typer command
+    """
+    original_method = getattr(BDNSClient, client_method_name)
+
+    @functools.wraps(original_method)
+    def wrapper(*args, state_file, **kwargs):
+        ctx = click.get_current_context()
+        output_file = ctx.obj["output_file"]
+
+        # The checkpoint is committed when the block exits cleanly, i.e. after
+        # write_to_file has flushed and closed the output
+        with SyncState(state_file) as state:
+            client_method = getattr(bnds_client, client_method_name)
+            data_generator = client_method(*args, state_file=state, **kwargs)
+            write_to_file(
+                data_generator,
+                output_file,
+                ctx.obj["write_mode"],
+                line_buffered=ctx.obj["line_buffered"],
+                on_flush=bnds_client.flush_journals,
+                compression_level=ctx.obj["compression_level"],
+                output_format=ctx.obj["output_format"],
+                table=client_method_name.removeprefix("sync_"),
+                stats=ctx.obj["write_stats"],
+            )
+
+    wrapper.__signature__ = _command_signature(client_method_name)
+    return wrapper
+
+
+# Commands and the client methods they run, in the order they are listed
+COMMANDS = {
+    "actividades": "fetch_actividades",
+    "sectores": "fetch_sectores",
+    "regiones": "fetch_regiones",
+    "finalidades": "fetch_finalidades",
+    "beneficiarios": "fetch_beneficiarios",
+    "instrumentos": "fetch_instrumentos",
+    "reglamentos": "fetch_reglamentos",
+    "objetivos": "fetch_objetivos",
+    "grandesbeneficiarios-anios": "fetch_grandesbeneficiarios_anios",
+    "planesestrategicos": "fetch_planesestrategicos",
+    "organos": "fetch_organos",
+    "organos-agrupacion": "fetch_organos_agrupacion",
+    "organos-codigo": "fetch_organos_codigo",
+    "organos-codigoadmin": "fetch_organos_codigoadmin",
+    "convocatorias": "fetch_convocatorias",
+    "concesiones-busqueda": "fetch_concesiones_busqueda",
+    "ayudasestado-busqueda": "fetch_ayudasestado_busqueda",
+    "terceros": "fetch_terceros",
+    "convocatorias-busqueda": "fetch_convocatorias_busqueda",
+    "convocatorias-ultimas": "fetch_convocatorias_ultimas",
+    "convocatorias-documentos": "fetch_convocatorias_documentos",
+    "convocatorias-pdf": "fetch_convocatorias_pdf",
+    "grandesbeneficiarios-busqueda": "fetch_grandesbeneficiarios_busqueda",
+    "minimis-busqueda": "fetch_minimis_busqueda",
+    "partidospoliticos-busqueda": "fetch_partidospoliticos_busqueda",
+    "planesestrategicos-busqueda": "fetch_planesestrategicos_busqueda",
+    "planesestrategicos-documentos": "fetch_planesestrategicos_documentos",
+    "planesestrategicos-vigencia": "fetch_planesestrategicos_vigencia",
+    "sanciones-busqueda": "fetch_sanciones_busqueda",
+}
+
+SYNC_COMMANDS = {
+    "concesiones-busqueda": "sync_concesiones_busqueda",
+    "ayudasestado-busqueda": "sync_ayudasestado_busqueda",
+    "minimis-busqueda": "sync_minimis_busqueda",
+    "partidospoliticos-busqueda": "sync_partidospoliticos_busqueda",
+}
 
+for command_name, client_method_name in COMMANDS.items():
+    app.command(command_name)(cli_wrapper(client_method_name))
+for command_name, client_method_name in SYNC_COMMANDS.items():
+    sync_app.command(command_name)(sync_cli_wrapper(client_method_name))
 
 if __name__ == "__main__":
     app()
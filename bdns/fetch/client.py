@@ -11,22 +11,35 @@
 # You should have received a copy of the GNU General Public License along
 # with this program. If not, see <https://www.gnu.org/licenses/>.
 
+import functools
+import hashlib
 import json
 import logging
-from typing import Any, Dict, Generator, List
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Generator, List, Mapping, Optional, Union
 from datetime import date
 import concurrent.futures
 
-import requests
-from tqdm import tqdm
-from tenacity import retry, stop_after_attempt, retry_if_exception_type, wait_fixed
 
 from bdns.fetch.utils import (
     format_url,
     format_date_for_api_request,
     extract_option_values,
+    parse_retry_after,
+    query_fingerprint,
+    AdaptiveRateLimiter,
     RateLimiter,
 )
+from bdns.fetch import json_backend
+from bdns.fetch.exceptions import BDNSRetryableError
+from bdns.fetch.pagination import DRIFT_MAX_REFETCH_ROUNDS, iter_window, ResumeJournal
+from bdns.fetch.cache import CacheEntry, ResponseCache
+from bdns.fetch.dedup import Deduplicator
+from bdns.fetch.metrics import MetricsHook
+from bdns.fetch.streaming import STREAM_CHUNK_SIZE, StreamedPage
+from bdns.fetch.sharding import fetch_sharded
+from bdns.fetch.sync import make_sync_method
 from bdns.fetch.endpoints import *
 from bdns.fetch.types import (
     TipoAdministracion,
@@ -37,6 +50,11 @@ from bdns.fetch.types import (
 )
 from bdns.fetch import options
 
+# requests, tqdm and tenacity are imported where they are used: the CLI
+# imports this module to build its commands and should start without them
+if TYPE_CHECKING:
+    import requests
+
 # Use a named logger for this module, don't configure at import time
 logger = logging.getLogger(__name__)
 
@@ -53,7 +71,18 @@ class BDNSClient:
 
     # Shared across all instances/threads: the API allows at most 10 GET
     # requests per second per IP, regardless of how many workers fetch pages.
-    _rate_limiter = RateLimiter(rate=10, per=1.0)
+    # The rate backs off on 429/5xx or rising latency and recovers up to 10.
+    _rate_limiter = AdaptiveRateLimiter(rate=10, per=1.0)
+
+    @property
+    def _retryable_exceptions(self) -> tuple:
+        """
+        Errors worth retrying: transport errors (the async client swaps in
+        aiohttp's) and 429/5xx responses.
+        """
+        import requests
+
+        return (requests.RequestException, BDNSRetryableError)
 
     def __init__(
         self,
@@ -61,6 +90,20 @@ class BDNSClient:
         wait_time: int = 2,
         max_workers: int = 5,
         return_raw: bool = False,
+        pool_maxsize: Optional[int] = None,
+        pool_block: bool = False,
+        max_prefetch: Optional[int] = None,
+        ordered: bool = False,
+        journal_dir: Optional[str] = None,
+        resume: bool = False,
+        journal_autoflush: bool = True,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        stream_json: bool = False,
+        dedup: Optional[str] = None,
+        on_drift: str = "warn",
+        base_url: str = BDNS_API_BASE_URL,
+        metrics: Optional[MetricsHook] = None,
     ):
         """
         Initialize the BDNS client with configurable retry settings.
@@ -70,15 +113,123 @@ class BDNSClient:
             wait_time (int): Time to wait between retries in seconds. Default: 2
             max_workers (int): Maximum number of concurrent threads for paginated requests. Default: 5
             return_raw (bool): Return raw page objects instead of individual items from paginated responses. Default: False
+            pool_maxsize (int): Maximum number of keep-alive connections kept open to the API. Default: max_workers, or max_prefetch with stream_json
+            pool_block (bool): Block when the connection pool is exhausted instead of opening throwaway connections. Default: False
+            max_prefetch (int): Maximum number of pages in flight or waiting to be consumed during pagination. Default: 2 * max_workers
+            ordered (bool): Emit paginated results in page order while still fetching pages concurrently. Default: False
+            journal_dir (str): Directory where paginated queries record their completed pages. Default: None (no journal)
+            resume (bool): Skip pages recorded as completed in journal_dir by a previous run of the same query. Default: False
+            journal_autoflush (bool): Record completed pages as soon as their items are consumed. Disable when the consumer buffers its output, and call flush_journals() after each flush of it. Default: True
+            cache (ResponseCache): Cache for responses of catalog endpoints, see bdns.fetch.cache.open_cache. Default: None (no cache)
+            rate_limiter (RateLimiter): Rate limiter for this client instead of the one shared by all clients, e.g. AdaptiveRateLimiter(rate=5). Default: None (shared)
+            stream_json (bool): Decode paginated responses item by item as they arrive instead of whole pages at once. Ignored with return_raw. Default: False
+            dedup (str): Drop records of paginated queries already seen in the same query, keyed on the endpoint's natural key: "memory", "bloom" or "disk", see bdns.fetch.dedup. Ignored with return_raw. Default: None (no deduplication)
+            on_drift (str): What to do when the pages of a paginated query report different totalElements, i.e. the result set changed mid-run: "warn", or "refetch" the pages served from an outdated result set (deduplicating records, in memory unless dedup is set). Default: "warn"
+            base_url (str): Root URL the API requests are sent to instead of the BDNS API, e.g. a mirror or the local server of benchmarks/fake_server.py. Cache keys, journals and logs keep the BDNS URLs. Default: BDNS_API_BASE_URL
+            metrics (MetricsHook): Receives per-request latency, bytes, records, retries, rate limiter waits and queue depth, e.g. InMemoryMetrics from bdns.fetch.metrics. Default: None (not collected)
         """
         self.max_retries = max_retries
         self.wait_time = wait_time
         self.max_workers = max_workers
         self.return_raw = return_raw
+        self.max_prefetch = max_prefetch or 2 * max_workers
+        # A streamed page holds its connection until it is consumed, and up to
+        # max_prefetch pages can be waiting
+        self.pool_maxsize = pool_maxsize or (
+            max(max_workers, self.max_prefetch) if stream_json else max_workers
+        )
+        self.pool_block = pool_block
+        self.ordered = ordered
+        self.journal_dir = journal_dir
+        self.resume = resume
+        self.journal_autoflush = journal_autoflush
+        # Journals holding back entries until flush_journals()
+        self._journals: List[ResumeJournal] = []
+        self.cache = cache
+        if rate_limiter is not None:
+            self._rate_limiter = rate_limiter
+        self.stream_json = stream_json
+        self.dedup = dedup
+        self.on_drift = on_drift
+        self.base_url = base_url.rstrip("/")
+        self.metrics = metrics if metrics is not None else MetricsHook()
+        # Cache outcomes: fresh hits, downloads, 304 revalidations, and
+        # downloads whose content hash matched the stale cached copy
+        self.cache_stats: Dict[str, int] = dict.fromkeys(
+            ("hits", "misses", "revalidations", "unchanged"), 0
+        )
+        self._cache_stats_lock = threading.Lock()
+        # Statistics of the last paginated fetch, e.g. reorder buffering cost
+        self.last_pagination_stats: Dict[str, int] = {}
+        self._session = None
+        self._session_lock = threading.Lock()
 
-    def _log_retry_attempt(self, retry_state):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self) -> "requests.Session":
+        """
+        HTTP session shared by all worker threads of this client.
+
+        Created on first use so that building a client (e.g. for CLI introspection)
+        does not allocate a connection pool. Connections are kept alive and reused
+        across pages, avoiding a TCP+TLS handshake per request.
+        """
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=self.pool_block,
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def current_rate(self) -> float:
+        """
+        Requests per second the client's rate limiter currently allows.
+
+        The adaptive limiter lowers it on 429/5xx responses or rising latency
+        and recovers it up to max_rate.
+        """
+        return self._rate_limiter.current_rate
+
+    def close(self) -> None:
+        """Close the HTTP session and release pooled connections."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _request_url(self, url: str) -> str:
+        """URL a request for an API URL is sent to, under base_url."""
+        if self.base_url != BDNS_API_BASE_URL and url.startswith(BDNS_API_BASE_URL):
+            return self.base_url + url[len(BDNS_API_BASE_URL) :]
+        return url
+
+    def _acquire_rate_limit(self) -> None:
+        """Waits for the rate limiter, reporting the time blocked."""
+        start = time.perf_counter()
+        self._rate_limiter.acquire()
+        self.metrics.on_rate_limit_wait(time.perf_counter() - start)
+
+    def _log_retry_attempt(self, retry_state, url: Optional[str] = None):
         """Log retry attempts with instance-specific retry count."""
         exc = retry_state.outcome.exception()
+        if url is not None and exc is not None:
+            self.metrics.on_retry(endpoint_name(url), url, exc)
         exc_type = type(exc).__name__ if exc else "None"
         exc_msg = str(exc) if exc else "No exception"
 
@@ -87,92 +238,322 @@ class BDNSClient:
             f"Attempt {retry_state.attempt_number} of {self.max_retries}."
         )
 
-    def _create_retry_decorator(self):
+    def _create_retry_decorator(self, url: Optional[str] = None):
         """Create a retry decorator with instance-specific settings."""
+        from tenacity import (
+            retry,
+            retry_if_exception_type,
+            stop_after_attempt,
+            wait_fixed,
+        )
+
         return retry(
             stop=stop_after_attempt(self.max_retries),
-            retry=retry_if_exception_type((requests.RequestException,)),
+            retry=retry_if_exception_type(self._retryable_exceptions),
             wait=wait_fixed(self.wait_time),
-            before_sleep=self._log_retry_attempt,
+            before_sleep=functools.partial(self._log_retry_attempt, url=url),
         )
 
     def _fetch_single_page(self, url: str) -> Dict[str, Any]:
         """
         Fetches data from a single page with error handling and retries.
         """
-        retry_decorator = self._create_retry_decorator()
+        cached = self._cached_response(url)
+        if cached is not None and self.cache.is_fresh(url, cached):
+            self._count_cache("hits")
+            return cached.data
+        headers = self._conditional_headers(cached)
+
+        retry_decorator = self._create_retry_decorator(url)
 
         @retry_decorator
         def fetch_with_retries():
             # Log the outgoing request
             logger.debug(f"HTTP REQUEST: GET {url}")
 
-            import time
-
-            self._rate_limiter.acquire()
+            self._acquire_rate_limit()
             start_time = time.time()
 
-            response = requests.get(url, timeout=30)
+            response = self.session.get(
+                self._request_url(url), headers=headers, timeout=30
+            )
 
             end_time = time.time()
             response_time = (end_time - start_time) * 1000  # Convert to milliseconds
 
-            # Log response details
-            logger.debug(
-                f"HTTP RESPONSE: {response.status_code} {response.reason} - {response_time:.1f}ms"
-            )
-            logger.debug(f"Response Headers: {dict(response.headers)}")
+            if response.status_code == 304 and cached is not None:
+                return self._revalidated_response(
+                    url,
+                    cached,
+                    response.headers,
+                    len(response.content),
+                    response_time,
+                )
 
             try:
-                data = response.json()
+                data = json_backend.loads(response.content)
             except ValueError:
                 data = response.text
 
-            # Log response content size and basic info
-            content_size = len(response.text)
-            logger.debug(f"Response Content-Length: {content_size} bytes")
+            data = self._process_page_response(
+                url,
+                response.status_code,
+                response.reason,
+                response.headers,
+                data,
+                len(response.content),
+                response_time,
+            )
+            self._store_response(url, data, response.headers, response.content, cached)
+            return data
+
+        return fetch_with_retries()
 
-            if isinstance(data, dict):
-                if "content" in data and isinstance(data["content"], list):
-                    logger.debug(f"Response contains {len(data['content'])} items")
-                if "totalPages" in data:
-                    logger.debug(f"Total pages available: {data['totalPages']}")
-                if "number" in data:
-                    logger.debug(f"Current page: {data['number']}")
-
-            # Handle API errors
-            if isinstance(data, dict) and "codigo" in data and "error" in data:
-                logger.error(f"API Error Response: {data}")
-                from bdns.fetch.exceptions import BDNSError
-
-                tech_details = (
-                    f"API error code {data['codigo']}: {data['error']} from {url}"
-                )
-                tech_details += f"\nResponse status: {response.status_code}"
-                tech_details += f"\nResponse headers: {dict(response.headers)}"
-                tech_details += f"\nFull response data: {data}"
-
-                raise BDNSError(
-                    message=f"API returned error: {data['error']}",
-                    suggestion="Check your parameters and try again. Use --help for valid options.",
-                    technical_details=tech_details,
-                )
+    def _fetch_page_stream(self, url: str) -> StreamedPage:
+        """
+        Requests a page without reading its body. The returned StreamedPage
+        decodes the content items while they are consumed. The request is
+        retried up to the first item: once an item has been handed over, a body
+        cut short raises instead.
+        """
+        retry_decorator = self._create_retry_decorator(url)
 
-            if response.status_code != 200:
-                logger.error(f"HTTP Error {response.status_code}: {response.reason}")
-                logger.error(f"Response body: {data}")
-                from bdns.fetch.exceptions import handle_api_error
+        @retry_decorator
+        def open_with_retries():
+            logger.debug(f"HTTP REQUEST: GET {url} (streamed)")
+
+            self._acquire_rate_limit()
+            start_time = time.time()
+
+            response = self.session.get(self._request_url(url), timeout=30, stream=True)
+
+            response_time = (time.time() - start_time) * 1000
 
-                response_text = (
-                    json.dumps(data) if isinstance(data, dict) else str(data)
+            if response.status_code != 200:
+                # Errors are small: read them whole and raise as usual
+                try:
+                    data = json_backend.loads(response.content)
+                except ValueError:
+                    data = response.text
+                self._process_page_response(
+                    url,
+                    response.status_code,
+                    response.reason,
+                    response.headers,
+                    data,
+                    len(response.content),
+                    response_time,
                 )
-                raise handle_api_error(
-                    response.status_code, url, response_text, dict(response.headers)
+
+            # The rate limiter adapts to the latency up to the headers, not to
+            # how fast the consumer reads the body
+            self._report_response(
+                url,
+                response.status_code,
+                response.headers,
+                int(response.headers.get("Content-Length", 0)),
+                response_time,
+            )
+
+            def on_complete(page: StreamedPage) -> None:
+                # Log and check the page metadata (API errors come back as 200
+                # with codigo/error members) once the body has been decoded
+                if page.items_read:
+                    self.metrics.on_records(endpoint_name(url), page.items_read)
+                self._process_page_response(
+                    url,
+                    response.status_code,
+                    response.reason,
+                    response.headers,
+                    page.metadata,
+                    page.bytes_read,
+                    response_time,
+                    report=False,
                 )
 
-            return data
+            page = StreamedPage(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE),
+                close=response.close,
+                on_complete=on_complete,
+            )
+            try:
+                return page.start()
+            except ValueError as e:
+                # No item has been handed over yet: request the page again
+                raise BDNSRetryableError(
+                    message=f"Truncated response body from {url}",
+                    technical_details=str(e),
+                ) from e
+
+        return open_with_retries()
+
+    def _count_cache(self, outcome: str) -> None:
+        with self._cache_stats_lock:
+            self.cache_stats[outcome] += 1
+
+    def _cached_response(self, url: str) -> Optional[CacheEntry]:
+        """Returns the cached response for a URL, fresh or due for revalidation."""
+        if self.cache is None:
+            return None
+        return self.cache.get(url, allow_stale=True)
+
+    @staticmethod
+    def _conditional_headers(cached: Optional[CacheEntry]) -> Dict[str, str]:
+        """Validators of a stale cached response, sent to revalidate it."""
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def _revalidated_response(
+        self,
+        url: str,
+        cached: CacheEntry,
+        headers: Mapping[str, str],
+        content_size: int,
+        response_time: float,
+    ) -> Any:
+        """Handles a 304 Not Modified: the stale cached response is still valid."""
+        logger.debug(
+            f"HTTP RESPONSE: 304 Not Modified - {response_time:.1f}ms - "
+            f"reusing cached {url}"
+        )
+        self._report_response(url, 304, headers, content_size, response_time)
+        self._count_cache("revalidations")
+        self.cache.refresh(url, cached)
+        return cached.data
 
-        return fetch_with_retries()
+    def _store_response(
+        self,
+        url: str,
+        data: Any,
+        headers: Mapping[str, str],
+        body: bytes,
+        cached: Optional[CacheEntry],
+    ) -> None:
+        """
+        Caches a successful response if its endpoint is cacheable, with its
+        validators. Without validators, the body hash still tells whether the
+        content changed since the cached copy.
+        """
+        if self.cache is None or not self.cache.ttl(url):
+            return
+        self._count_cache("misses")
+        content_hash = hashlib.sha256(body).hexdigest()
+        if cached is not None and cached.content_hash == content_hash:
+            self._count_cache("unchanged")
+            logger.debug(f"Downloaded content unchanged since cached: {url}")
+        self.cache.set(
+            url,
+            data,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            content_hash=content_hash,
+        )
+
+    def _report_response(
+        self,
+        url: str,
+        status_code: int,
+        headers: Mapping[str, str],
+        content_size: int,
+        response_time: float,
+        records: Optional[int] = None,
+    ) -> None:
+        """
+        Reports a response to the metrics hook, with the records it carried,
+        and to the rate limiter, which adapts to throttling, server errors and
+        latency. response_time is in milliseconds.
+        """
+        endpoint = endpoint_name(url)
+        self.metrics.on_request(
+            endpoint, url, status_code, response_time / 1000, content_size
+        )
+        if records:
+            self.metrics.on_records(endpoint, records)
+        self._rate_limiter.record_response(
+            status_code,
+            response_time / 1000,
+            parse_retry_after(headers.get("Retry-After")),
+        )
+
+    def _process_page_response(
+        self,
+        url: str,
+        status_code: int,
+        reason: str,
+        headers: Mapping[str, str],
+        data: Any,
+        content_size: int,
+        response_time: float,
+        records: Optional[int] = None,
+        report: bool = True,
+    ) -> Any:
+        """
+        Logs a decoded page response, reports its metrics and raises the
+        matching BDNS error if the request failed. Shared by the synchronous
+        and asynchronous clients. records defaults to the items in data.
+        report=False leaves out the metrics and the rate limiter, for a
+        streamed page reported when its headers arrived.
+        """
+        # Log response details
+        logger.debug(f"HTTP RESPONSE: {status_code} {reason} - {response_time:.1f}ms")
+
+        if status_code == 200:
+            if records is None and isinstance(data, dict):
+                content = data.get("content")
+                records = len(content) if isinstance(content, list) else None
+            elif records is None and isinstance(data, list):
+                records = len(data)
+        else:
+            records = None
+        if report:
+            self._report_response(
+                url, status_code, headers, content_size, response_time, records
+            )
+        logger.debug(f"Response Headers: {headers}")
+
+        # Log response content size and basic info
+        logger.debug(f"Response Content-Length: {content_size} bytes")
+
+        if isinstance(data, dict):
+            if "content" in data and isinstance(data["content"], list):
+                logger.debug(f"Response contains {len(data['content'])} items")
+            if "totalPages" in data:
+                logger.debug(f"Total pages available: {data['totalPages']}")
+            if "number" in data:
+                logger.debug(f"Current page: {data['number']}")
+
+        # Handle API errors
+        if isinstance(data, dict) and "codigo" in data and "error" in data:
+            logger.error(f"API Error Response: {data}")
+            from bdns.fetch.exceptions import BDNSError
+
+            tech_details = (
+                f"API error code {data['codigo']}: {data['error']} from {url}"
+            )
+            tech_details += f"\nResponse status: {status_code}"
+            tech_details += f"\nResponse headers: {headers}"
+            tech_details += f"\nFull response data: {data}"
+
+            raise BDNSError(
+                message=f"API returned error: {data['error']}",
+                suggestion="Check your parameters and try again. Use --help for valid options.",
+                technical_details=tech_details,
+            )
+
+        if status_code != 200:
+            logger.error(f"HTTP Error {status_code}: {reason}")
+            logger.error(f"Response body: {data}")
+            from bdns.fetch.exceptions import handle_api_error
+
+            response_text = json.dumps(data) if isinstance(data, dict) else str(data)
+            raise handle_api_error(status_code, url, response_text, headers)
+
+        return data
 
     def _fetch_paginated(
         self,
@@ -184,79 +565,206 @@ class BDNSClient:
         """
         Synchronous generator for paginated data fetching.
         """
-        # Fetch the first page to get total page count
-        first_page_params = {**params, "page": from_page}
-        first_page_url = format_url(base_url, first_page_params)
+        journal = None
+        if self.journal_dir is not None:
+            fingerprint = query_fingerprint(
+                base_url, {**params, "from_page": from_page, "num_pages": num_pages}
+            )
+            journal = ResumeJournal(
+                self.journal_dir, fingerprint, autoflush=self.journal_autoflush
+            ).open(self.resume)
+            if not self.journal_autoflush:
+                self._journals.append(journal)
+            if journal.completed:
+                logger.info(
+                    f"Resuming: skipping {len(journal.completed)} completed pages"
+                )
 
-        try:
-            first_response = self._fetch_single_page(first_page_url)
-            total_pages = first_response.get("totalPages", 1)
+        # Raw pages are yielded whole, so only stream items
+        fetch = (
+            self._fetch_page_stream
+            if self.stream_json and not self.return_raw
+            else self._fetch_single_page
+        )
 
-            # Handle first page based on return_raw setting
-            if self.return_raw:
-                # Yield the entire first page response
-                yield first_response
-            else:
-                # Yield individual items from the first page
-                for item in first_response.get("content", []):
-                    yield item
+        def fetch_page(page: int):
+            return page, fetch(format_url(base_url, {**params, "page": page}))
+
+        # Pages shift when records are registered mid-run, so the same record
+        # may show up on two pages. Re-fetching drifted pages relies on it too
+        endpoint = endpoint_name(base_url)
+        deduplicator = None
+        if (self.dedup or self.on_drift == "refetch") and not self.return_raw:
+            deduplicator = Deduplicator(endpoint, self.dedup or "memory")
+
+        def page_items(page, data):
+            items = self._page_items(data)
+            if journal:
+                items = journal.track(page, items)
+            return deduplicator.filter(items) if deduplicator else items
+
+        # totalElements reported by each page, fetched in this run or by the
+        # run being resumed: a page disagreeing with the others was served from
+        # a different result set
+        snapshots: Dict[int, Optional[int]] = (
+            dict(journal.total_elements) if journal else {}
+        )
 
-            # Determine pages to fetch
+        def fetch_pages(executor, pages, desc):
+            from tqdm import tqdm
+
+            # Keep a bounded window of pages in flight; the next page is
+            # only scheduled once the consumer has taken a finished one
+            for page, data in tqdm(
+                iter_window(
+                    executor,
+                    fetch_page,
+                    pages,
+                    self.max_prefetch,
+                    ordered=self.ordered,
+                    stats=stats,
+                    on_depth=functools.partial(self.metrics.on_queue_depth, endpoint),
+                ),
+                total=len(pages),
+                desc=desc,
+            ):
+                stats["pages"] += 1
+                if isinstance(data, (dict, StreamedPage)):
+                    yield from page_items(page, data)
+                    snapshots[page] = data.get("totalElements")
+                if journal:
+                    journal.mark(page, snapshots.get(page))
+
+        def page_range(total_pages: int) -> range:
             to_page = (
                 total_pages
                 if num_pages == 0
                 else min(from_page + num_pages, total_pages)
             )
+            return range(from_page + 1, to_page)
+
+        try:
+            stats = self.last_pagination_stats = {"pages": 0}
 
-            # # If there are more pages, fetch them sequentially
-            # if from_page + 1 < to_page:
-            #     pages_to_fetch = list(range(from_page + 1, to_page))
-
-            #     for page in tqdm(
-            #         pages_to_fetch,
-            #         desc=f"Fetching from page {from_page + 1} to page {to_page} out of {total_pages} pages",
-            #     ):
-            #         page_params = {**params, "page": page}
-            #         page_url = format_url(base_url, page_params)
-            #         response = self._fetch_single_page(page_url)
-            #         content = response.get("content", [])
-            #         if isinstance(content, list):
-            #             for item in content:
-            #                 yield item
-
-            pages_to_fetch = list(range(from_page + 1, to_page))
-            urls = [
-                format_url(base_url, {**params, "page": page})
-                for page in pages_to_fetch
+            # Fetch the first page to get total page count, unless a previous
+            # run already delivered it and recorded the count
+            if journal and from_page in journal.completed and journal.total_pages:
+                total_pages = journal.total_pages
+            else:
+                _, first_response = fetch_page(from_page)
+                stats["pages"] += 1
+
+                # Yield the first page or its items based on return_raw setting.
+                # A streamed page only knows its metadata once fully consumed
+                yield from page_items(from_page, first_response)
+                total_pages = first_response.get("totalPages", 1)
+                snapshots[from_page] = first_response.get("totalElements")
+                if journal:
+                    journal.set_total_pages(total_pages)
+                    journal.mark(from_page, snapshots[from_page])
+
+            pages = page_range(total_pages)
+            pages_to_fetch = [
+                page for page in pages if not journal or page not in journal.completed
             ]
 
             with concurrent.futures.ThreadPoolExecutor(
                 max_workers=self.max_workers
             ) as executor:
-                # Submit all tasks, getting a future for each
-                futures = [
-                    executor.submit(self._fetch_single_page, url) for url in urls
-                ]
-
-                # Process results as they complete
-                for future in tqdm(
-                    concurrent.futures.as_completed(futures),
-                    total=len(futures),
-                    desc="Fetching pages",
-                ):
-                    data = future.result()
-                    if isinstance(data, dict):
-                        if self.return_raw:
-                            # Yield the entire page response
-                            yield data
-                        else:
-                            # Yield individual items from content
-                            for item in data.get("content", []):
-                                yield item
+                yield from fetch_pages(executor, pages_to_fetch, "Fetching pages")
+
+                rounds = 0
+                while True:
+                    totals = {
+                        total for total in snapshots.values() if total is not None
+                    }
+                    if len(totals) < 2:
+                        break
+                    stats["drift"] = sorted(totals)
+                    if self.on_drift != "refetch" or self.return_raw:
+                        logger.warning(
+                            f"The result set changed during pagination "
+                            f"(totalElements {min(totals)}-{max(totals)}): records "
+                            f"may be missing or repeated. Use on_drift='refetch' "
+                            f"(--on-drift refetch) to re-fetch the affected pages."
+                        )
+                        break
+                    if rounds == DRIFT_MAX_REFETCH_ROUNDS:
+                        logger.warning(
+                            "The result set kept changing while re-fetching pages: "
+                            "records may be missing"
+                        )
+                        break
+                    rounds += 1
+
+                    # Learn the current result set from a fresh first page, then
+                    # re-fetch every page served from another one, and any page
+                    # the result set grew into
+                    _, first_response = fetch_page(from_page)
+                    stats["pages"] += 1
+                    yield from page_items(from_page, first_response)
+                    current = snapshots[from_page] = first_response.get("totalElements")
+                    total_pages = first_response.get("totalPages", total_pages)
+                    drifted = [
+                        page
+                        for page in page_range(total_pages)
+                        if (page in snapshots and snapshots[page] != current)
+                        or page not in pages
+                    ]
+                    pages = page_range(max(total_pages, pages.stop))
+                    logger.warning(
+                        f"The result set changed during pagination (totalElements "
+                        f"{min(totals)}-{max(totals)}, now {current}): re-fetching "
+                        f"{len(drifted)} pages"
+                    )
+                    stats["refetched_pages"] = (
+                        stats.get("refetched_pages", 0) + len(drifted) + 1
+                    )
+                    yield from fetch_pages(executor, drifted, "Re-fetching pages")
+
+            if self.ordered:
+                logger.debug(
+                    f"Ordered pagination held back up to "
+                    f"{stats['reorder_buffer_peak']} pages for reordering"
+                )
+
+            if journal:
+                journal.finish()
+
+            if deduplicator:
+                stats["duplicates"] = deduplicator.duplicates
+                logger.info(f"Dropped {deduplicator.duplicates} duplicate records")
 
         except Exception as e:
             logger.error(f"Error in paginated fetch: {e}")
             raise
+        finally:
+            if journal:
+                journal.close()
+            if deduplicator:
+                deduplicator.close()
+
+    def flush_journals(self) -> None:
+        """
+        Records as completed the pages consumed so far, for journals created with
+        journal_autoflush disabled. Call it once the consumer has persisted the
+        items it received (e.g. after flushing its output file).
+        """
+        for journal in self._journals:
+            journal.flush()
+        # In place, as copies of the client (see fetch_sharded) share the list
+        self._journals[:] = [
+            journal for journal in self._journals if not journal.finished
+        ]
+
+    def _page_items(self, data: Union[Dict[str, Any], StreamedPage]):
+        """Yields the page itself or its items depending on return_raw."""
+        if isinstance(data, StreamedPage):
+            yield from data
+        elif self.return_raw:
+            yield data
+        else:
+            yield from data.get("content", [])
 
     def _fetch(
         self, url: str, params: Dict[str, Any] = None
@@ -299,16 +807,26 @@ class BDNSClient:
         """
         Synchronously fetches binary content from a URL using requests, with retries.
         """
+        import requests
+
         from bdns.fetch.exceptions import handle_api_response
 
         logger.debug(f"Starting binary fetch from: {url}")
 
-        retry_decorator = self._create_retry_decorator()
+        retry_decorator = self._create_retry_decorator(url)
 
         @retry_decorator
         def fetch_with_retries():
-            self._rate_limiter.acquire()
-            response = requests.get(url, timeout=30)
+            self._acquire_rate_limit()
+            start_time = time.perf_counter()
+            response = self.session.get(self._request_url(url), timeout=30)
+            self.metrics.on_request(
+                endpoint_name(url),
+                url,
+                response.status_code,
+                time.perf_counter() - start_time,
+                len(response.content),
+            )
 
             logger.debug(
                 f"Binary response: {response.status_code} - Content-Type: {response.headers.get('content-type', 'unknown')}"
@@ -335,6 +853,47 @@ class BDNSClient:
             logger.error(f"Request failed for binary fetch: {e}")
             raise
 
+    def fetch_sharded(
+        self,
+        method_name: str,
+        start: date,
+        end: date,
+        by: str = "registro",
+        target_size: int = 100_000,
+        shard_workers: int = 2,
+        **filters: Any,
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Fetches a busqueda query over a date range as concurrent date shards.
+
+        The range is split into windows of at most target_size records (probing
+        each window's totalElements and bisecting the large ones), so no shard
+        needs deep pages. Works with fetch_concesiones_busqueda,
+        fetch_ayudasestado_busqueda, fetch_minimis_busqueda and
+        fetch_partidospoliticos_busqueda (by="registro" or by="concesion") and
+        fetch_convocatorias_busqueda (by="concesion"). Shards keep no resume
+        journal, even with journal_dir set.
+
+        Args:
+            method_name: Paginated method to shard, e.g. "fetch_concesiones_busqueda".
+            start: First day of the range.
+            end: Last day of the range.
+            by: "registro" (fechaRegInicio/fechaRegFin) or "concesion" (fechaDesde/fechaHasta).
+            target_size: Maximum number of records per shard. Default: 100000
+            shard_workers: Number of shards fetched at the same time. Default: 2
+            **filters: Any other parameter accepted by the method.
+        """
+        return fetch_sharded(
+            self,
+            method_name,
+            start,
+            end,
+            by=by,
+            target_size=target_size,
+            shard_workers=shard_workers,
+            **filters,
+        )
+
     @extract_option_values
     def fetch_actividades(
         self, vpd: str = options.vpd
@@ -342,14 +901,14 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/actividades"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_ACTIVIDADES, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_sectores(self) -> Generator[Dict[str, Any], None, None]:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/sectores"""
         params = {}
         url = format_url(BDNS_API_ENDPOINT_SECTORES, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_regiones(
@@ -358,7 +917,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/regiones"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_REGIONES, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_finalidades(
@@ -367,7 +926,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/finalidades"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_FINALIDADES, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_beneficiarios(
@@ -376,7 +935,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/beneficiarios"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_TIPOS_BENEFICIARIOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_instrumentos(
@@ -385,7 +944,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/instrumentos"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_INSTRUMENTOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_reglamentos(
@@ -397,7 +956,7 @@ class BDNSClient:
             "ambito": ambito.value if hasattr(ambito, "value") else ambito,
         }
         url = format_url(BDNS_API_ENDPOINT_REGLAMENTOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_objetivos(
@@ -406,14 +965,14 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/objetivos"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_OBJETIVOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_grandesbeneficiarios_anios(self) -> Generator[Dict[str, Any], None, None]:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/grandesbeneficiarios/anios"""
         params = {}
         url = format_url(BDNS_API_ENDPOINT_GRANDES_BENEFICIARIOS_ANIOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_planesestrategicos(
@@ -422,7 +981,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/planesestrategicos"""
         params = {"idPES": idPES}
         url = format_url(BDNS_API_ENDPOINT_PLANESESTRATEGICOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_organos(
@@ -436,7 +995,7 @@ class BDNSClient:
             "idAdmon": idAdmon.value if hasattr(idAdmon, "value") else idAdmon,
         }
         url = format_url(BDNS_API_ENDPOINT_ORGANOS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_organos_agrupacion(
@@ -450,7 +1009,7 @@ class BDNSClient:
             "idAdmon": idAdmon.value if hasattr(idAdmon, "value") else idAdmon,
         }
         url = format_url(BDNS_API_ENDPOINT_ORGANOS_AGRUPACION, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_organos_codigo(
@@ -459,7 +1018,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/organos/codigo"""
         params = {"codigo": codigo}
         url = format_url(BDNS_API_ENDPOINT_ORGANOS_CODIGO, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_organos_codigoadmin(
@@ -468,7 +1027,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/organos/codigoAdmin"""
         params = {"codigoAdmin": codigoAdmin}
         url = format_url(BDNS_API_ENDPOINT_ORGANOS_CODIGO_ADMIN, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_convocatorias(
@@ -477,7 +1036,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/convocatorias"""
         params = {"vpd": vpd, "numConv": numConv}
         url = format_url(BDNS_API_ENDPOINT_CONVOCATORIAS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_concesiones_busqueda(
@@ -541,7 +1100,7 @@ class BDNSClient:
         # Remove None values to keep URL clean
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_CONCESIONES_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -617,7 +1176,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_AYUDASESTADO_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -647,7 +1206,7 @@ class BDNSClient:
             "idPersona": idPersona,
         }
         url = format_url(BDNS_API_ENDPOINT_TERCEROS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_convocatorias_busqueda(
@@ -702,7 +1261,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_CONVOCATORIAS_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -716,7 +1275,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/convocatorias/ultimas"""
         params = {"vpd": vpd}
         url = format_url(BDNS_API_ENDPOINT_CONVOCATORIAS_ULTIMAS, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_convocatorias_documentos(
@@ -765,7 +1324,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_GRANDES_BENEFICIARIOS_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -839,7 +1398,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_MINIMIS_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -879,7 +1438,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_PLANESESTRATEGICOS_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -902,7 +1461,7 @@ class BDNSClient:
         """Fetches data from https://www.infosubvenciones.es/bdnstrans/api/planesestrategicos/vigencia"""
         params = {"vpd": vpd, "idPES": idPES}
         url = format_url(BDNS_API_ENDPOINT_PLANESESTRATEGICOS_VIGENCIA, params)
-        yield from self._fetch(url)
+        return self._fetch(url)
 
     @extract_option_values
     def fetch_partidospoliticos_busqueda(
@@ -961,7 +1520,7 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_PARTIDOSPOLITICOS_BUSQUEDA,
             params=params,
             from_page=from_page,
@@ -1021,9 +1580,23 @@ class BDNSClient:
         }
         params = {k: v for k, v in params.items() if v is not None}
 
-        yield from self._fetch_paginated(
+        return self._fetch_paginated(
             BDNS_API_ENDPOINT_SANCIONES_BUSQUEDA,
             params=params,
             from_page=from_page,
             num_pages=num_pages,
         )
+
+    # Incremental sync on registration dates, see bdns.fetch.sync
+    sync_concesiones_busqueda = extract_option_values(
+        make_sync_method(fetch_concesiones_busqueda)
+    )
+    sync_ayudasestado_busqueda = extract_option_values(
+        make_sync_method(fetch_ayudasestado_busqueda)
+    )
+    sync_minimis_busqueda = extract_option_values(
+        make_sync_method(fetch_minimis_busqueda)
+    )
+    sync_partidospoliticos_busqueda = extract_option_values(
+        make_sync_method(fetch_partidospoliticos_busqueda)
+    )
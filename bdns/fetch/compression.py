@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compressed output files, selected by file extension.
+
+Output files ending in .gz, .bz2, .xz or .zst are compressed on the fly. The
+compressor runs in a background thread fed through a bounded queue, so
+compressing one batch of records overlaps with fetching and encoding the next.
+zstd needs the optional zstandard package.
+"""
+
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import queue
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, NamedTuple, Optional, TextIO, Union
+
+from bdns.fetch.exceptions import BDNSError
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+# Writes handed to the compressor thread but not yet compressed. With batched
+# output each write is one batch of records (up to 1 MiB).
+DEFAULT_MAX_PENDING_WRITES = 8
+
+
+def _open_zstd(path: Path, mode: str, level: int) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError:
+        raise BDNSError(
+            message="Writing .zst files requires the zstandard package.",
+            suggestion="Install it with 'pip install bdns-fetch[zstd]' or use .gz output.",
+        ) from None
+    compressor = zstandard.ZstdCompressor(level=level)
+    return compressor.stream_writer(open(path, mode), closefd=True)
+
+
+class Codec(NamedTuple):
+    """How to open a compressed file, and the levels it accepts."""
+
+    open: Callable[[Path, str, int], BinaryIO]
+    min_level: int
+    max_level: int
+    default_level: int
+
+
+COMPRESSION_CODECS: Dict[str, Codec] = {
+    ".gz": Codec(lambda path, mode, level: gzip.open(path, mode, level), 1, 9, 6),
+    ".bz2": Codec(lambda path, mode, level: bz2.open(path, mode, level), 1, 9, 9),
+    ".xz": Codec(
+        lambda path, mode, level: lzma.open(path, mode, preset=level), 0, 9, 6
+    ),
+    ".zst": Codec(_open_zstd, 1, 22, 3),
+}
+
+
+def compression_codec(file: Union[str, Path]) -> Optional[Codec]:
+    """Returns the codec selected by the file extension, None if uncompressed."""
+    return COMPRESSION_CODECS.get(Path(file).suffix.lower())
+
+
+class BackgroundWriter(io.BufferedIOBase):
+    """
+    Binary stream whose writes are performed by a background thread.
+
+    Data is queued as-is and written to the wrapped stream in order. The queue
+    is bounded, so a slow stream still applies back-pressure. An error raised
+    by the wrapped stream is re-raised by the next write(), flush() or close().
+    flush() does not wait for the queue: data reaches the wrapped stream,
+    and is flushed, when the writer is closed.
+    """
+
+    def __init__(
+        self, raw: BinaryIO, max_pending_writes: int = DEFAULT_MAX_PENDING_WRITES
+    ):
+        super().__init__()
+        self.raw = raw
+        self._queue: queue.Queue = queue.Queue(max_pending_writes)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name="bdns-fetch-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            # Keep draining after an error so writers never block on the queue
+            if self._error is None:
+                try:
+                    self.raw.write(data)
+                except BaseException as e:
+                    self._error = e
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._check()
+        data = bytes(data)
+        self._queue.put(data)
+        return len(data)
+
+    def flush(self) -> None:
+        self._check()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self.raw.close()
+        except BaseException as e:
+            self._error = self._error or e
+        # Marks the stream closed and re-raises a pending error via flush()
+        super().close()
+
+
+def open_compressed(
+    file: Union[str, Path],
+    mode: str = "w",
+    encoding: str = "utf-8",
+    newline: Optional[str] = None,
+    level: Optional[int] = None,
+    background: bool = True,
+) -> TextIO:
+    """
+    Opens a compressed file for writing text, the codec chosen by its extension.
+    Args:
+        file: Path ending in .gz, .bz2, .xz or .zst.
+        mode: "w" to overwrite the file, "a" to add a new compressed stream to it.
+        encoding: Text encoding.
+        newline: Newline translation, as in open().
+        level: Compression level, the codec default if None.
+        background: Compress in a background thread.
+    """
+    codec = compression_codec(file)
+    if codec is None:
+        raise ValueError(f"{file} does not have a compressed file extension")
+    if mode not in ("w", "a"):
+        raise ValueError(
+            f"Compressed files can only be written, not opened as {mode!r}"
+        )
+
+    if level is None:
+        level = codec.default_level
+    elif not codec.min_level <= level <= codec.max_level:
+        raise BDNSError(
+            message=f"Invalid compression level {level} for {Path(file).suffix} files.",
+            suggestion=f"Use a level from {codec.min_level} to {codec.max_level}.",
+        )
+
+    stream = codec.open(Path(file), mode + "b", level)
+    if background:
+        stream = BackgroundWriter(stream)
+    logger.debug(f"Writing {Path(file).suffix} compressed output (level {level})")
+    return io.TextIOWrapper(
+        stream, encoding=encoding, newline=newline, write_through=True
+    )
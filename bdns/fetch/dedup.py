@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Deduplication of records across pages and shards.
+
+Paginating a live dataset can return a record twice when new records shift the
+pages mid-run, and shards of a date range may both return a record whose
+dates changed mid-run. A Deduplicator drops records whose identity (the endpoint's natural key)
+was already seen, remembering only a 64-bit digest per record, in one of:
+
+- DigestSet: a set of digests in memory (exact up to 64-bit collisions).
+- BloomFilter: fixed-size bit array; may drop a few unique records, at the
+  configured false positive rate, but memory doesn't grow with the run.
+- DiskDigestStore: digests in a temporary SQLite file, for very large runs.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from bdns.fetch import json_backend
+
+# Natural key of the records of each endpoint. Endpoints not listed here, or
+# whose records lack the field, are keyed on "id" when records have one.
+RECORD_KEYS = {
+    "concesiones_busqueda": "codConcesion",
+    "ayudasestado_busqueda": "codConcesion",
+    "minimis_busqueda": "codConcesion",
+    "partidospoliticos_busqueda": "codConcesion",
+    "convocatorias_busqueda": "numeroConvocatoria",
+}
+
+DEDUP_MODES = ("memory", "bloom", "disk")
+
+DEFAULT_BLOOM_CAPACITY = 10_000_000
+DEFAULT_BLOOM_ERROR_RATE = 1e-6
+
+# Digests inserted into a DiskDigestStore per transaction
+_DISK_COMMIT_EVERY = 10000
+
+
+def record_digest(record: Dict[str, Any], key: Optional[str] = None) -> int:
+    """
+    Signed 64-bit digest of a record's identity: its key field, else its "id",
+    else the whole record.
+    """
+    if key is not None and record.get(key) is not None:
+        identity = f"{key}={record[key]}"
+    elif record.get("id") is not None:
+        identity = f"id={record['id']}"
+    else:
+        identity = json_backend.dumps(record)
+    digest = hashlib.blake2b(identity.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class DigestSet:
+    """Digests seen so far, in memory."""
+
+    def __init__(self):
+        self._digests = set()
+
+    def add(self, digest: int) -> bool:
+        """Adds a digest. Returns False if it was already there."""
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def close(self) -> None:
+        self._digests.clear()
+
+
+class BloomFilter:
+    """
+    Bloom filter over digests, sized for capacity digests at error_rate false
+    positives. Bit positions are derived from the two halves of the digest.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_BLOOM_CAPACITY,
+        error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+    ):
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, digest: int) -> bool:
+        """Adds a digest. Returns False if it was (probably) already there."""
+        digest &= 0xFFFFFFFFFFFFFFFF
+        low, high = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        bits, size = self._bits, self.size
+        new = False
+        for i in range(self.hashes):
+            position = (low + i * high) % size
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        return new
+
+    def close(self) -> None:
+        self._bits = bytearray()
+
+
+class DiskDigestStore:
+    """Digests seen so far, in a temporary SQLite file removed on close."""
+
+    def __init__(self, directory: Optional[Union[str, Path]] = None):
+        fd, self.path = tempfile.mkstemp(
+            dir=directory, prefix="bdns-fetch-dedup-", suffix=".sqlite"
+        )
+        os.close(fd)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        # Scratch data: no need to survive a crash
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute("CREATE TABLE digests (digest INTEGER PRIMARY KEY)")
+        self._pending = 0
+
+    def add(self, digest: int) -> bool:
+        """Adds a digest. Returns False if it was already there."""
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO digests VALUES (?)", (digest,)
+        )
+        self._pending += 1
+        if self._pending >= _DISK_COMMIT_EVERY:
+            self._connection.commit()
+            self._pending = 0
+        return cursor.rowcount == 1
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            os.unlink(self.path)
+
+
+def open_digest_store(mode: str = "memory", **kwargs):
+    """
+    Opens a digest store: "memory" (DigestSet), "bloom" (BloomFilter, kwargs
+    capacity/error_rate) or "disk" (DiskDigestStore, kwarg directory).
+    """
+    if mode == "memory":
+        return DigestSet(**kwargs)
+    if mode == "bloom":
+        return BloomFilter(**kwargs)
+    if mode == "disk":
+        return DiskDigestStore(**kwargs)
+    raise ValueError(f"Unknown dedup mode {mode!r}, use one of {DEDUP_MODES}")
+
+
+class Deduplicator:
+    """
+    Drops records whose identity was already seen, counting them.
+    Args:
+        endpoint: Endpoint name (e.g. "concesiones_busqueda"), selects the key.
+        mode: Digest store, see open_digest_store.
+        key: Identity field, instead of the endpoint's natural key.
+    """
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        mode: str = "memory",
+        key: Optional[str] = None,
+        **kwargs,
+    ):
+        self.key = key or RECORD_KEYS.get(endpoint)
+        self.store = open_digest_store(mode, **kwargs)
+        self.records = 0
+        self.duplicates = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def filter(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields the records not seen before."""
+        add, key = self.store.add, self.key
+        for record in records:
+            self.records += 1
+            if add(record_digest(record, key)):
+                yield record
+            else:
+                self.duplicates += 1
+
+    def close(self) -> None:
+        self.store.close()
@@ -64,3 +64,9 @@ BDNS_API_ENDPOINT_MICROPORTAL_CONFIGURACION = (
     f"{BDNS_API_BASE_URL}/vpd/{{vpd}}/configuracion"
 )
 BDNS_API_ENDPOINT_ENLACES = f"{BDNS_API_BASE_URL}/enlaces"
+
+
+def endpoint_name(url: str) -> str:
+    """Name of the endpoint of an API URL, e.g. "concesiones_busqueda"."""
+    path = url.split("?", 1)[0].removeprefix(BDNS_API_BASE_URL)
+    return path.strip("/").replace("/", "_")
@@ -43,6 +43,12 @@ class BDNSWarning(BDNSError):
     pass
 
 
+class BDNSRetryableError(BDNSError):
+    """Transient server-side error (429 or 5xx) worth retrying"""
+
+    pass
+
+
 def parse_bdns_error_response(response_text: str) -> tuple[str, list[str]]:
     """
     Parse BDNS API error responses to extract structured error information
@@ -192,7 +198,12 @@ def handle_api_response(
             message = format_bdns_error_message(error_code, error_messages)
             suggestion = "Check your internet connection and try again."
 
-        return BDNSError(
+        error_class = (
+            BDNSRetryableError
+            if status_code == 429 or status_code >= 500
+            else BDNSError
+        )
+        return error_class(
             message=message, suggestion=suggestion, technical_details=tech_details
         )
 
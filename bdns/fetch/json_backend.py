@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+JSON decoding of responses and encoding of JSONL output.
+
+orjson or msgspec, when installed, are used instead of the json module. Every
+backend writes the same bytes as json.dumps(record, ensure_ascii=False): ", "
+and ": " separators, UTF-8 kept as-is. Fast backends write compact JSON, whose
+separators can only be told apart from the same characters in strings for
+flat records: nested records, strings holding "," or ":", floats printed with
+an exponent, NaN and infinities written as null, integers beyond 64 bits,
+non-string keys... fall back to the json module, so switching backends never
+changes the output.
+"""
+
+import json
+import logging
+import math
+import re
+from typing import Any, Callable, Dict, Tuple, Union
+
+from bdns.fetch.exceptions import BDNSError
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+# Preferred order when the backend is chosen automatically
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+
+# Fast encoders print exponents as 1e-7/1e22 where json prints 1e-07/1e+22.
+# Matches in strings are harmless: those records just take the json module
+_EXPONENT = re.compile(r"e[-+]?[0-9]")
+
+# orjson may decode integers beyond 64 bits as floats; leave any long run of
+# digits to the json module
+_LONG_DIGITS = {bytes: re.compile(rb"[0-9]{19}"), str: re.compile(r"[0-9]{19}")}
+
+
+def _has_non_finite(obj: Any) -> bool:
+    """Whether obj holds a NaN or infinite float, which fast backends write as null."""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    return False
+
+
+def _json_loads(data: Union[str, bytes]) -> Any:
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _load_backend(name: str) -> Tuple[Callable, Callable]:
+    """Returns the (loads, dumps) pair of a backend. Raises ImportError if missing."""
+    if name == "json":
+        return _json_loads, _json_dumps
+
+    if name == "orjson":
+        import orjson
+
+        def decode(data: Union[str, bytes]) -> Any:
+            if _LONG_DIGITS[type(data)].search(data):
+                return json.loads(data)
+            return orjson.loads(data)
+
+        encode = orjson.dumps
+        errors = (ValueError, TypeError)
+    elif name == "msgspec":
+        import msgspec
+
+        decode, encode = msgspec.json.decode, msgspec.json.Encoder().encode
+        errors = (ValueError, TypeError, msgspec.MsgspecError)
+    else:
+        raise ValueError(f"Unknown JSON backend {name!r}, use one of {JSON_BACKENDS}")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        try:
+            return decode(data)
+        except errors:
+            # Let the json module decode what the backend rejects (NaN, huge
+            # integers) or raise the usual ValueError
+            return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        try:
+            text = encode(obj).decode("utf-8")
+        except errors:
+            return _json_dumps(obj)
+        # Every "," and ":" of a flat object is a separator exactly when there
+        # are as many as its members need, i.e. none is inside a string
+        if (
+            type(obj) is not dict
+            or text.count(":") != len(obj)
+            or text.count(",") != len(obj) - 1
+            or _EXPONENT.search(text)
+            # Only records with a null can hold a non-finite float
+            or ("null" in text and _has_non_finite(obj))
+        ):
+            return _json_dumps(obj)
+        return text.replace(",", ", ").replace(":", ": ")
+
+    return loads, dumps
+
+
+_backend: Dict[str, Any] = {}
+
+
+def use_json_backend(name: str = "auto") -> str:
+    """
+    Selects the JSON backend used by loads() and dumps().
+    Args:
+        name: "orjson", "msgspec", "json", or "auto" for the fastest installed.
+    Returns:
+        str: The name of the selected backend.
+    """
+    candidates = JSON_BACKENDS if name == "auto" else (name,)
+    for candidate in candidates:
+        try:
+            loads_fn, dumps_fn = _load_backend(candidate)
+        except ImportError:
+            continue
+        _backend.update(name=candidate, loads=loads_fn, dumps=dumps_fn)
+        logger.debug(f"Using the {candidate} JSON backend")
+        return candidate
+
+    raise BDNSError(
+        message=f"JSON backend {name} is not installed.",
+        suggestion=f"Install it with 'pip install {name}' or use --json-backend auto.",
+    )
+
+
+def json_backend() -> str:
+    """Name of the JSON backend in use."""
+    if not _backend:
+        use_json_backend()
+    return _backend["name"]
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decodes a JSON document. Raises ValueError if it is not valid JSON."""
+    if not _backend:
+        use_json_backend()
+    return _backend["loads"](data)
+
+
+def dumps(obj: Any) -> str:
+    """Encodes an object as one line of JSON, non-ASCII characters kept."""
+    if not _backend:
+        use_json_backend()
+    return _backend["dumps"](obj)
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Metrics of the requests made by a client.
+
+A client reports each response (latency, status, bytes), the records it
+decoded, retries, time waiting for the rate limiter and the depth of the queue
+of pages being fetched to a MetricsHook. The base class ignores them; subclass
+it to forward them elsewhere, or use InMemoryMetrics, which aggregates them and
+exports them in the Prometheus text format. run_summary() condenses them, with
+the output timings of write_to_file, into the run summary of --stats.
+"""
+
+import bisect
+import collections
+import heapq
+import itertools
+import threading
+from pathlib import Path
+from typing import Any, Counter, Dict, Iterable, List, Mapping, Tuple, Union
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MetricsHook:
+    """
+    Receives the metrics of a client. Every method does nothing: override the
+    ones needed. Methods are called from the client's worker threads, possibly
+    concurrently, and should be quick.
+    """
+
+    def on_request(
+        self, endpoint: str, url: str, status: int, latency: float, size: int
+    ) -> None:
+        """
+        A response was received: status code, seconds until it was read, bytes.
+        A streamed page is reported once its headers arrive, with the bytes of
+        its Content-Length (0 without one).
+        """
+
+    def on_records(self, endpoint: str, count: int) -> None:
+        """count records were decoded from a response."""
+
+    def on_retry(self, endpoint: str, url: str, error: BaseException) -> None:
+        """A request failed with error and is about to be retried."""
+
+    def on_rate_limit_wait(self, seconds: float) -> None:
+        """A request waited seconds for the rate limiter."""
+
+    def on_queue_depth(self, endpoint: str, depth: int) -> None:
+        """depth pages of a paginated query are in flight or waiting to be consumed."""
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, plus observations above the last one
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations up to it) per bucket, ending with +Inf."""
+        bounds = [*self.buckets, float("inf")]
+        total, result = 0, []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _format_labels(**labels) -> str:
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in labels.values()
+    )
+    return (
+        "{"
+        + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped))
+        + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class InMemoryMetrics(MetricsHook):
+    """
+    Aggregates the metrics of one or more clients in memory.
+    Args:
+        buckets: Upper bounds, in seconds, of the latency histogram buckets.
+        slowest: Number of slowest requests kept, see slowest_requests().
+    """
+
+    def __init__(
+        self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS, slowest: int = 10
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.slowest = slowest
+        # Min-heap of (latency, sequence, url, status) of the slowest requests
+        self._slowest: List[Tuple[float, int, str, int]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.requests: Counter[Tuple[str, int]] = collections.Counter()
+        self.latency: Dict[str, Histogram] = {}
+        self.bytes: Counter[str] = collections.Counter()
+        self.records: Counter[str] = collections.Counter()
+        self.retries: Counter[str] = collections.Counter()
+        self.rate_limit_wait = 0.0
+        self.queue_depth: Dict[str, int] = {}
+        self.queue_depth_max: Dict[str, int] = {}
+
+    def on_request(
+        self, endpoint: str, url: str, status: int, latency: float, size: int
+    ) -> None:
+        with self._lock:
+            self.requests[endpoint, status] += 1
+            histogram = self.latency.get(endpoint)
+            if histogram is None:
+                histogram = self.latency[endpoint] = Histogram(self.buckets)
+            histogram.observe(latency)
+            self.bytes[endpoint] += size
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(
+                    self._slowest, (latency, next(self._sequence), url, status)
+                )
+            elif self._slowest and latency > self._slowest[0][0]:
+                heapq.heapreplace(
+                    self._slowest, (latency, next(self._sequence), url, status)
+                )
+
+    def on_records(self, endpoint: str, count: int) -> None:
+        with self._lock:
+            self.records[endpoint] += count
+
+    def on_retry(self, endpoint: str, url: str, error: BaseException) -> None:
+        with self._lock:
+            self.retries[endpoint] += 1
+
+    def on_rate_limit_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.rate_limit_wait += seconds
+
+    def on_queue_depth(self, endpoint: str, depth: int) -> None:
+        with self._lock:
+            self.queue_depth[endpoint] = depth
+            self.queue_depth_max[endpoint] = max(
+                depth, self.queue_depth_max.get(endpoint, 0)
+            )
+
+    def slowest_requests(self) -> List[Dict[str, Any]]:
+        """The slowest requests seen, slowest first: url, status and seconds."""
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return [
+            {"url": url, "status": status, "seconds": latency}
+            for latency, _, url, status in slowest
+        ]
+
+    def prometheus_text(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(
+                    f"{name}{suffix}{_format_labels(**labels) if labels else ''} "
+                    f"{_format_value(value)}"
+                )
+
+        with self._lock:
+            family(
+                "bdns_fetch_requests_total",
+                "counter",
+                "HTTP responses received, by endpoint and status code.",
+                [
+                    ("", {"endpoint": endpoint, "status": status}, count)
+                    for (endpoint, status), count in sorted(self.requests.items())
+                ],
+            )
+            samples = []
+            for endpoint, histogram in sorted(self.latency.items()):
+                for bound, count in histogram.cumulative():
+                    le = _format_value(bound)
+                    samples.append(("_bucket", {"endpoint": endpoint, "le": le}, count))
+                samples.append(("_sum", {"endpoint": endpoint}, histogram.sum))
+                samples.append(("_count", {"endpoint": endpoint}, histogram.count))
+            family(
+                "bdns_fetch_request_duration_seconds",
+                "histogram",
+                "Time from sending a request to reading its response.",
+                samples,
+            )
+            for name, help_text, counter in (
+                ("response_bytes", "Bytes of response bodies.", self.bytes),
+                ("records", "Records decoded from responses.", self.records),
+                ("retries", "Requests retried after an error.", self.retries),
+            ):
+                family(
+                    f"bdns_fetch_{name}_total",
+                    "counter",
+                    help_text,
+                    [
+                        ("", {"endpoint": endpoint}, count)
+                        for endpoint, count in sorted(counter.items())
+                    ],
+                )
+            family(
+                "bdns_fetch_rate_limit_wait_seconds_total",
+                "counter",
+                "Time requests spent waiting for the rate limiter.",
+                [("", {}, self.rate_limit_wait)],
+            )
+            for name, help_text, gauge in (
+                (
+                    "queue_depth",
+                    "Pages in flight or waiting, last seen.",
+                    self.queue_depth,
+                ),
+                (
+                    "queue_depth_max",
+                    "Pages in flight or waiting, maximum seen.",
+                    self.queue_depth_max,
+                ),
+            ):
+                family(
+                    f"bdns_fetch_{name}",
+                    "gauge",
+                    help_text,
+                    [
+                        ("", {"endpoint": endpoint}, depth)
+                        for endpoint, depth in sorted(gauge.items())
+                    ],
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path]) -> None:
+        """Writes the metrics to a file in the Prometheus text format."""
+        Path(path).write_text(self.prometheus_text(), encoding="utf-8")
+
+
+def run_summary(
+    metrics: InMemoryMetrics, wall_time: float, write_stats: Mapping[str, float]
+) -> Dict[str, Any]:
+    """
+    Summary of a run: where its wall time went, from the metrics of its client
+    and the write_stats filled by write_to_file.
+    """
+    with metrics._lock:
+        pages = sum(
+            count for (_, status), count in metrics.requests.items() if status == 200
+        )
+        summary = {
+            "wall_time": wall_time,
+            "requests": sum(metrics.requests.values()),
+            "pages": pages,
+            "records": write_stats.get("records", 0),
+            "bytes": sum(metrics.bytes.values()),
+            "retries": sum(metrics.retries.values()),
+            # Summed over concurrent requests, so it can exceed the wall time
+            "rate_limit_wait": metrics.rate_limit_wait,
+            "write_time": write_stats.get("write_time", 0.0),
+        }
+    elapsed = max(wall_time, 1e-9)
+    summary["pages_per_second"] = pages / elapsed
+    summary["records_per_second"] = summary["records"] / elapsed
+    summary["slowest_requests"] = metrics.slowest_requests()
+    return summary
+
+
+def format_run_summary(summary: Mapping[str, Any]) -> str:
+    """Human readable run_summary()."""
+    lines = [
+        "Run summary:",
+        f"  Wall time           {summary['wall_time']:,.2f} s",
+        f"  Pages fetched       {summary['pages']:,} "
+        f"({summary['pages_per_second']:,.1f}/s, {summary['requests']:,} requests)",
+        f"  Records written     {summary['records']:,} "
+        f"({summary['records_per_second']:,.0f}/s)",
+        f"  Downloaded          {summary['bytes'] / 2**20:,.1f} MiB",
+        f"  Retries             {summary['retries']:,}",
+        f"  Rate limiter wait   {summary['rate_limit_wait']:,.2f} s (all requests)",
+        f"  Writing output      {summary['write_time']:,.2f} s",
+    ]
+    if summary["slowest_requests"]:
+        lines.append("  Slowest requests:")
+        lines.extend(
+            f"    {request['seconds']:7.2f} s  {request['status']}  {request['url']}"
+            for request in summary["slowest_requests"]
+        )
+    return "\n".join(lines)
@@ -17,7 +17,6 @@ from pathlib import Path
 
 import click
 import typer
-import dateparser
 
 from bdns.fetch.types import (
     Order,
@@ -25,6 +24,11 @@ from bdns.fetch.types import (
     Direccion,
     TipoAdministracion,
     DescripcionTipoBusqueda,
+    RateLimitBackend,
+    JSONBackend,
+    OutputFormat,
+    DedupMode,
+    DriftPolicy,
 )
 
 
@@ -32,6 +36,10 @@ class DateParamType(click.ParamType):
     name = "date"
 
     def convert(self, value, param, ctx) -> date:
+        # dateparser takes about half a second to import: only pay for it
+        # when a date option is given
+        import dateparser
+
         dt = dateparser.parse(value)
         if dt is None:
             self.fail(f"Could not parse date: {value}", param, ctx)
@@ -428,6 +436,21 @@ codigo_required: str = typer.Option(
     "-cod",
     help="Organ code.",
 )
+state_file: Path = typer.Option(
+    "bdns-fetch-state.json",
+    "--state-file",
+    "-sf",
+    help="JSON file storing the last synced registration date per endpoint and filter set.",
+    show_default=True,
+)
+since: Optional[date] = typer.Option(
+    None,
+    "--since",
+    click_type=DateType,
+    metavar="DATE",
+    help="Registration date to start from when there is no checkpoint yet. Without it, the first sync fetches every record. See https://github.com/scrapinghub/dateparser for supported formats.",
+    show_default=True,
+)
 
 verbose_flag: bool = typer.Option(
     False,
@@ -447,6 +470,138 @@ max_workers: int = typer.Option(
     show_default=True,
 )
 
+max_prefetch: Optional[int] = typer.Option(
+    None,
+    "--max-prefetch",
+    "-mp",
+    min=1,
+    help="Maximum number of pages in flight or waiting to be written during pagination. Defaults to twice --max-workers.",
+    show_default=False,
+)
+
+ordered: bool = typer.Option(
+    False,
+    "--ordered",
+    help="Write paginated results in page order. Pages are still fetched concurrently.",
+    show_default=True,
+)
+
+resume: bool = typer.Option(
+    False,
+    "--resume",
+    help="Resume an interrupted paginated download into --output-file, appending only the pages it had not written yet.",
+    show_default=True,
+)
+
+max_rate: float = typer.Option(
+    10.0,
+    "--max-rate",
+    min=0.1,
+    max=10.0,
+    help="Ceiling of requests per second. The rate backs off on 429/5xx responses or rising latency and recovers up to this value.",
+    show_default=True,
+)
+
+rate_limit_backend: RateLimitBackend = typer.Option(
+    RateLimitBackend.local,
+    "--rate-limit-backend",
+    help="'local' shares the request budget between the threads of this process; 'shared' between all local bdns-fetch processes, through --rate-limit-file.",
+    show_default=True,
+)
+
+rate_limit_file: Optional[Path] = typer.Option(
+    None,
+    "--rate-limit-file",
+    help="SQLite file holding the shared request budget for --rate-limit-backend shared. Defaults to $XDG_CACHE_HOME/bdns-fetch/rate-limit.sqlite.",
+    show_default=False,
+)
+
+cache_dir: Optional[Path] = typer.Option(
+    None,
+    "--cache-dir",
+    help="Cache for catalog endpoint responses (actividades, sectores, organos...): a directory, or a SQLite file if it ends in .db/.sqlite. Defaults to $XDG_CACHE_HOME/bdns-fetch.",
+    show_default=False,
+)
+
+no_cache: bool = typer.Option(
+    False,
+    "--no-cache",
+    help="Always download catalog endpoints instead of using the response cache.",
+    show_default=True,
+)
+
+stream_json: bool = typer.Option(
+    False,
+    "--stream-json",
+    help="Decode paginated responses record by record as they arrive, so memory does not grow with --pageSize.",
+    show_default=True,
+)
+
+json_backend: JSONBackend = typer.Option(
+    JSONBackend.auto,
+    "--json-backend",
+    help="JSON library used to decode responses and write output. 'auto' picks orjson or msgspec when installed, else the standard library. The output is identical with every backend.",
+    show_default=True,
+)
+
+dedup: Optional[DedupMode] = typer.Option(
+    None,
+    "--dedup",
+    help="Drop records of paginated commands already seen in the same run, keyed on the endpoint's natural key (codConcesion, numeroConvocatoria, id): memory (exact), bloom (fixed memory, may drop a few unique records) or disk (temporary SQLite file).",
+    show_default=False,
+)
+
+on_drift: DriftPolicy = typer.Option(
+    DriftPolicy.warn,
+    "--on-drift",
+    help="When the result set changes during a paginated download (new records registered mid-run): warn, or refetch the affected pages so the dump is complete.",
+    show_default=True,
+)
+
+metrics_file: Optional[Path] = typer.Option(
+    None,
+    "--metrics-file",
+    help="Write request metrics (latency histograms, bytes, records, retries, rate limiter wait, queue depth) to this file in the Prometheus text format at the end of the run.",
+    show_default=False,
+)
+
+stats: bool = typer.Option(
+    False,
+    "--stats",
+    help="Print a summary of the run to stderr when it ends: wall time, pages, records written, throughput, retries, time waiting for the rate limiter and writing output, and the slowest requests.",
+    show_default=True,
+)
+
+stats_file: Optional[Path] = typer.Option(
+    None,
+    "--stats-file",
+    help="Write the summary of the run to this file as JSON when it ends.",
+    show_default=False,
+)
+
+output_format: OutputFormat = typer.Option(
+    OutputFormat.jsonl,
+    "--format",
+    help="Output format: jsonl, csv, tsv, parquet (requires the parquet extra) or sqlite (upserts into a table named after the command). parquet and sqlite require --output-file.",
+    show_default=True,
+)
+
+line_buffered: bool = typer.Option(
+    False,
+    "--line-buffered",
+    help="Write each record as soon as it is fetched, e.g. when piping into jq. By default records are written in large batches.",
+    show_default=True,
+)
+
+compression_level: Optional[int] = typer.Option(
+    None,
+    "--compression-level",
+    min=0,
+    max=22,
+    help="Compression level when --output-file ends in .gz, .bz2, .xz or .zst (default: 6 for gzip/xz, 9 for bz2, 3 for zstd).",
+    show_default=False,
+)
+
 return_raw: bool = typer.Option(
     False,
     "--return-raw",
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Scheduling helpers for concurrent pagination.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import json
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+# Rounds of re-fetching pages of a result set that changed mid-run before
+# giving up, in case it keeps changing
+DRIFT_MAX_REFETCH_ROUNDS = 3
+
+
+def iter_window(
+    executor: concurrent.futures.Executor,
+    fn: Callable[[Any], Any],
+    args: Iterable[Any],
+    window: int,
+    ordered: bool = False,
+    stats: Optional[Dict[str, int]] = None,
+    on_depth: Optional[Callable[[int], None]] = None,
+) -> Generator[Any, None, None]:
+    """
+    Runs fn over args on executor, yielding results as they complete.
+
+    At most `window` calls are in flight or completed-but-not-yet-consumed at any
+    time: a new call is only submitted when the consumer takes a result, so a slow
+    consumer throttles the producer and memory stays bounded by the window size.
+    Args:
+        executor: Executor running the calls.
+        fn: Function called with each element of args.
+        args: Arguments to schedule, consumed lazily.
+        window: Maximum number of scheduled calls not yet handed to the consumer.
+        ordered: Yield results in the order of args instead of completion order.
+            Finished calls queued behind a slower earlier one stay in the window,
+            which doubles as the reorder buffer.
+        stats: Optional dict updated with "reorder_buffer_peak", the largest number
+            of finished results held back waiting for an earlier one.
+        on_depth: Optional callback given the number of scheduled calls not yet
+            handed to the consumer, before each result is yielded.
+    Yields:
+        The result of each call.
+    """
+    args = iter(args)
+    if stats is not None:
+        stats.setdefault("reorder_buffer_peak", 0)
+
+    if ordered:
+        queue = collections.deque(
+            executor.submit(fn, arg) for arg in itertools.islice(args, window)
+        )
+        try:
+            while queue:
+                if on_depth is not None:
+                    on_depth(len(queue))
+                head = queue.popleft()
+                result = head.result()
+                if stats is not None:
+                    held_back = sum(future.done() for future in queue)
+                    stats["reorder_buffer_peak"] = max(
+                        stats["reorder_buffer_peak"], held_back
+                    )
+                yield result
+                for arg in itertools.islice(args, 1):
+                    queue.append(executor.submit(fn, arg))
+        finally:
+            for future in queue:
+                future.cancel()
+        return
+
+    pending = {executor.submit(fn, arg) for arg in itertools.islice(args, window)}
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if on_depth is not None:
+                on_depth(len(done) + len(pending))
+            for future in done:
+                yield future.result()
+                for arg in itertools.islice(args, 1):
+                    pending.add(executor.submit(fn, arg))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def aiter_window(
+    fn: Callable[[Any], Awaitable[Any]],
+    args: Iterable[Any],
+    window: int,
+    ordered: bool = False,
+    stats: Optional[Dict[str, int]] = None,
+    on_depth: Optional[Callable[[int], None]] = None,
+) -> AsyncGenerator[Any, None]:
+    """
+    asyncio counterpart of iter_window: runs the coroutine function fn over args as
+    tasks, keeping at most `window` of them in flight or unconsumed.
+    """
+    import asyncio
+
+    args = iter(args)
+    if stats is not None:
+        stats.setdefault("reorder_buffer_peak", 0)
+
+    if ordered:
+        queue = collections.deque(
+            asyncio.ensure_future(fn(arg)) for arg in itertools.islice(args, window)
+        )
+        try:
+            while queue:
+                if on_depth is not None:
+                    on_depth(len(queue))
+                result = await queue.popleft()
+                if stats is not None:
+                    held_back = sum(task.done() for task in queue)
+                    stats["reorder_buffer_peak"] = max(
+                        stats["reorder_buffer_peak"], held_back
+                    )
+                yield result
+                for arg in itertools.islice(args, 1):
+                    queue.append(asyncio.ensure_future(fn(arg)))
+        finally:
+            for task in queue:
+                task.cancel()
+        return
+
+    pending = {asyncio.ensure_future(fn(arg)) for arg in itertools.islice(args, window)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            if on_depth is not None:
+                on_depth(len(done) + len(pending))
+            for task in done:
+                yield task.result()
+                for arg in itertools.islice(args, 1):
+                    pending.add(asyncio.ensure_future(fn(arg)))
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class ResumeJournal:
+    """
+    Append-only record of the pages of one paginated query already handed to the
+    consumer, so an interrupted download can skip them when re-run.
+
+    The journal is a JSONL file named after the query fingerprint: a header line
+    with the fingerprint, the total page count once known, then one line per
+    completed page, with the totalElements it reported so a resumed run can
+    tell whether the result set changed meanwhile. It is removed when the query
+    completes.
+
+    With autoflush disabled, entries (and the removal) are held back until
+    flush(), so a consumer that buffers its output can record progress only for
+    what it has actually written. flush() then also records how many items of
+    the page being consumed were handed over (see track()), and a resumed run
+    skips them when it fetches that page again.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], fingerprint: str, autoflush: bool = True
+    ):
+        self.path = Path(directory) / f"{fingerprint}.jsonl"
+        self.fingerprint = fingerprint
+        self.autoflush = autoflush
+        self.total_pages: Optional[int] = None
+        self.completed: Set[int] = set()
+        # totalElements reported by each completed page
+        self.total_elements: Dict[int, Optional[int]] = {}
+        # Items of pages a previous run was cut short in that it wrote already
+        self.partial: Dict[int, int] = {}
+        self.finished = False
+        # [page, items handed over] of the page being consumed
+        self._current: Optional[List[int]] = None
+        self._recorded_partial: Optional[Tuple[int, int]] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._file = None
+
+    def open(self, resume: bool = True) -> "ResumeJournal":
+        """
+        Loads the completed pages of a previous run (if resuming). Without
+        resume, any previous journal is discarded.
+        """
+        if resume and self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line may be truncated if the previous run was killed
+                        continue
+                    if "items" in entry:
+                        if entry["page"] not in self.completed:
+                            self.partial[entry["page"]] = entry["items"]
+                    elif "page" in entry:
+                        self.completed.add(entry["page"])
+                        self.partial.pop(entry["page"], None)
+                        self.total_elements[entry["page"]] = entry.get("total_elements")
+                    elif "total_pages" in entry:
+                        self.total_pages = entry["total_pages"]
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"fingerprint": self.fingerprint}) + "\n")
+        return self
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        self._pending.append(entry)
+        if self.autoflush:
+            self.flush()
+
+    def set_total_pages(self, total_pages: int) -> None:
+        if self.total_pages != total_pages:
+            self.total_pages = total_pages
+            self._record({"total_pages": total_pages})
+
+    def track(self, page: int, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Yields the items of a page, counting them for flush(). Items a previous
+        run wrote before it was cut short in the page are skipped.
+        """
+        skip = self.partial.pop(page, 0)
+        current = self._current = [page, 0]
+        for item in items:
+            current[1] += 1
+            if current[1] > skip:
+                yield item
+
+    def mark(self, page: int, total_elements: Optional[int] = None) -> None:
+        """Records a page whose items have all been consumed."""
+        self.completed.add(page)
+        self.total_elements[page] = total_elements
+        if self._current is not None and self._current[0] == page:
+            self._current = None
+        entry = {"page": page}
+        if total_elements is not None:
+            entry["total_elements"] = total_elements
+        self._record(entry)
+
+    def flush(self) -> None:
+        """Writes the pending entries, and deletes the journal once finished."""
+        if not self.autoflush and self._current is not None and self._current[1]:
+            partial = (self._current[0], self._current[1])
+            if partial != self._recorded_partial:
+                self._pending.append({"page": partial[0], "items": partial[1]})
+                self._recorded_partial = partial
+        if self._pending:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.writelines(json.dumps(entry) + "\n" for entry in self._pending)
+            self._file.flush()
+            self._pending.clear()
+        if self.finished:
+            self._remove()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> None:
+        """Marks the query as completed: the journal is deleted on flush."""
+        self.finished = True
+        if self.autoflush:
+            self.flush()
+
+    def _remove(self) -> None:
+        self.close()
+        self._pending.clear()
+        self.path.unlink(missing_ok=True)
+        try:
+            self.path.parent.rmdir()
+        except OSError:
+            pass  # Other journals still in progress
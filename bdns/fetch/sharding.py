@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Date-range sharding for large busqueda queries.
+
+A sweep over a wide date range is split into sub-windows small enough that none
+of them needs deep (slow) pages. Each window's size is probed with a one-item
+request, windows above the target size are bisected, and the resulting shards
+are fetched concurrently under the client's shared rate limiter.
+"""
+
+import concurrent.futures
+import copy
+import inspect
+import logging
+import queue
+import threading
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Generator, List, NamedTuple
+
+from bdns.fetch.dedup import Deduplicator
+from bdns.fetch.exceptions import BDNSError
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+# Date filters a range can be sharded on: registration date (recommended for
+# sync/change detection) or the endpoint's own date (fechaConcesion, etc.)
+SHARD_DATE_FIELDS = {
+    "registro": ("fechaRegInicio", "fechaRegFin"),
+    "concesion": ("fechaDesde", "fechaHasta"),
+}
+
+_DONE = object()
+
+
+class DateShard(NamedTuple):
+    """A date window and the number of records the API reports for it."""
+
+    start: date
+    end: date
+    total_elements: int
+
+
+def plan_date_shards(
+    probe: Callable[[date, date], int],
+    start: date,
+    end: date,
+    target_size: int,
+) -> List[DateShard]:
+    """
+    Splits [start, end] into windows of at most target_size records.
+    Args:
+        probe: Function returning the number of records between two dates (inclusive).
+        start: First day of the range.
+        end: Last day of the range.
+        target_size: Maximum number of records per shard. Single-day windows are
+            kept even if they exceed it, as they cannot be split further.
+    Returns:
+        List[DateShard]: Non-empty shards, in date order.
+    """
+    if start > end:
+        raise ValueError("The start date must not be after the end date.")
+
+    total = probe(start, end)
+    if total == 0:
+        return []
+    if total <= target_size or start == end:
+        return [DateShard(start, end, total)]
+
+    middle = start + (end - start) // 2
+    return plan_date_shards(probe, start, middle, target_size) + plan_date_shards(
+        probe, middle + timedelta(days=1), end, target_size
+    )
+
+
+def fetch_sharded(
+    client,
+    method_name: str,
+    start: date,
+    end: date,
+    by: str = "registro",
+    target_size: int = 100_000,
+    shard_workers: int = 2,
+    batch_size: int = 1000,
+    **filters: Any,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Fetches a paginated busqueda query over [start, end] as concurrent date shards.
+    Args:
+        client: BDNSClient used for probing and fetching.
+        method_name: Paginated client method, e.g. "fetch_concesiones_busqueda".
+        start: First day of the range.
+        end: Last day of the range.
+        by: "registro" shards on fechaRegInicio/fechaRegFin, "concesion" on
+            fechaDesde/fechaHasta.
+        target_size: Maximum number of records per shard.
+        shard_workers: Number of shards fetched at the same time.
+        batch_size: Number of items handed over from a shard worker at once.
+        **filters: Any other parameter of the client method.
+    Yields:
+        Items (or raw pages if the client has return_raw) of all shards, in
+        completion order.
+    """
+    if by not in SHARD_DATE_FIELDS:
+        raise ValueError(f"by must be one of {sorted(SHARD_DATE_FIELDS)}")
+    from_key, to_key = SHARD_DATE_FIELDS[by]
+
+    method = getattr(client, method_name)
+    parameters = inspect.signature(method).parameters
+    if from_key not in parameters or "num_pages" not in parameters:
+        raise BDNSError(
+            message=f"{method_name} cannot be sharded by {by}.",
+            suggestion=f"Use a paginated busqueda method accepting {from_key}/{to_key}.",
+        )
+
+    # Copies of the client share its HTTP session (created here, as a copy of
+    # a client without one would create and leak its own) and rate limiter
+    client.session
+
+    # Probing needs the page metadata, so it runs on a raw-mode copy. Probes
+    # are one-page queries of their own: they don't need journals or dedup
+    probe_client = copy.copy(client)
+    probe_client.return_raw = True
+    probe_client.journal_dir = None
+    probe_client.dedup = None
+    probe_method = getattr(probe_client, method_name)
+
+    # Shards run on worker threads and mark their pages completed as soon as
+    # they hand them over, before the consumer has written them: a journal
+    # would record pages that were never written, so shards keep none
+    shard_client = copy.copy(client)
+    if client.journal_dir is not None:
+        logger.warning(
+            "Sharded fetches keep no resume journal: an interrupted run starts over"
+        )
+        shard_client.journal_dir = None
+
+    # Deduplicate over all shards at once rather than shard by shard, so a
+    # record returned by two shards (e.g. its dates changed mid-run) is dropped
+    deduplicator = None
+    if client.dedup and not client.return_raw:
+        shard_client.dedup = None
+        deduplicator = Deduplicator(method_name.removeprefix("fetch_"), client.dedup)
+    method = getattr(shard_client, method_name)
+
+    def probe(window_start: date, window_end: date) -> int:
+        page = next(
+            iter(
+                probe_method(
+                    **{
+                        **filters,
+                        from_key: window_start,
+                        to_key: window_end,
+                        "pageSize": 1,
+                        "from_page": 0,
+                        "num_pages": 1,
+                    }
+                )
+            ),
+            {},
+        )
+        return page.get("totalElements", 0)
+
+    shards = plan_date_shards(probe, start, end, target_size)
+    logger.info(
+        f"Sharded {method_name} into {len(shards)} windows "
+        f"({sum(shard.total_elements for shard in shards)} records)"
+    )
+
+    results = queue.Queue(maxsize=2 * shard_workers)
+    stop = threading.Event()
+
+    def put(obj) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(obj, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(shard: DateShard) -> None:
+        try:
+            if stop.is_set():
+                return
+            batch = []
+            shard_filters = {
+                **filters,
+                from_key: shard.start,
+                to_key: shard.end,
+                "from_page": 0,
+                "num_pages": 0,
+            }
+            for item in method(**shard_filters):
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch:
+                put(batch)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=shard_workers)
+    for shard in shards:
+        executor.submit(drain, shard)
+    try:
+        remaining = len(shards)
+        while remaining:
+            obj = results.get()
+            if obj is _DONE:
+                remaining -= 1
+            elif isinstance(obj, Exception):
+                raise obj
+            elif deduplicator:
+                yield from deduplicator.filter(obj)
+            else:
+                yield from obj
+        if deduplicator:
+            logger.info(f"Dropped {deduplicator.duplicates} duplicate records")
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        if deduplicator:
+            deduplicator.close()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Incremental decoding of paginated responses.
+
+A page is a JSON object whose "content" array holds the records. Instead of
+reading the whole body and decoding every record at once, StreamedPage decodes
+the records one by one as the body arrives, so memory is bounded by a record
+(plus a network chunk) rather than by the page.
+"""
+
+import codecs
+import itertools
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffered text reader over byte chunks with one-value JSON decoding."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk to the buffer. Returns False at end of input."""
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            self.buffer = self.buffer[self.pos :] + self._text.decode(b"", final=True)
+            self.pos = 0
+            return False
+        # Drop consumed text so the buffer only holds the value being decoded
+        self.buffer = self.buffer[self.pos :] + self._text.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, '' at end of input."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} in JSON stream, found {char or 'end of input'!r}"
+            )
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decodes the next JSON value, reading more input until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            # A value ending exactly at the buffer end may be truncated (e.g. a
+            # number split across chunks), so only trust it once more input or
+            # the end of input confirms it
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(
+    chunks: Iterable[bytes],
+    array_key: str = "content",
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[Any]:
+    """
+    Yields the items of one array member of a JSON object as they are decoded.
+    Args:
+        chunks: The raw JSON object, in byte chunks of any size.
+        array_key: Member whose items are yielded.
+        metadata: Dict filled with every other member of the object.
+    """
+    reader = _Reader(chunks)
+    metadata = {} if metadata is None else metadata
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == array_key and reader.peek() == "[":
+            reader.pos += 1
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            metadata[key] = reader.value()
+        if reader.expect(",}") == "}":
+            return
+
+
+class StreamedPage:
+    """
+    A paginated response whose content items are decoded while iterating.
+
+    Other members of the page (totalPages, number...) are collected in
+    `metadata` and readable through get() once the items have been consumed.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        close: Optional[Callable[[], None]] = None,
+        on_complete: Optional[Callable[["StreamedPage"], None]] = None,
+    ):
+        self.metadata: Dict[str, Any] = {}
+        self.bytes_read = 0
+        self.items_read = 0
+        self._chunks = chunks
+        self._close = close
+        self._on_complete = on_complete
+        self._items: Optional[Iterator[Any]] = None
+        self._head: List[Any] = []
+
+    def _count_bytes(self) -> Iterator[bytes]:
+        for chunk in self._chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.metadata.get(key, default)
+
+    def _decode(self) -> Iterator[Any]:
+        for item in iter_json_array(self._count_bytes(), "content", self.metadata):
+            self.items_read += 1
+            yield item
+        if self._on_complete is not None:
+            self._on_complete(self)
+
+    def start(self) -> "StreamedPage":
+        """
+        Decodes the body up to the first item, which iterating yields first.
+        A body cut short before it raises here, while the page can still be
+        requested again. The page is closed if decoding fails.
+        """
+        self._items = self._decode()
+        try:
+            self._head = list(itertools.islice(self._items, 1))
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def __iter__(self) -> Iterator[Any]:
+        items = self._decode() if self._items is None else self._items
+        try:
+            yield from self._head
+            self._head = []
+            yield from items
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Releases the underlying response without reading the rest of it."""
+        if self._close is not None:
+            self._close()
+            self._close = None
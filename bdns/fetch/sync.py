@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Incremental synchronisation on registration dates.
+
+Following the official guidance, changes are detected with fechaRegInicio /
+fechaRegFin. A SyncState file keeps, per endpoint and filter set, the last
+registration date fully fetched; each sync only asks for the delta since then.
+"""
+
+import inspect
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Generator, Optional, Union
+
+from bdns.fetch import options
+from bdns.fetch.utils import query_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+# Parameters driven by the sync engine itself, not part of the filter set
+SYNC_MANAGED_PARAMS = ("fechaRegInicio", "fechaRegFin", "num_pages", "from_page")
+
+# Parameters that change how results are paged, not which records match
+SYNC_IGNORED_PARAMS = ("pageSize", "order", "direccion")
+
+
+class SyncState:
+    """
+    Registration-date checkpoints persisted in a JSON file.
+
+    New checkpoints are staged in memory and only written by commit(), which
+    replaces the file atomically. Use it as a context manager to commit when the
+    block exits without error (e.g. after the output has been flushed).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._staged: Dict[str, Dict[str, Any]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f).get("checkpoints", {})
+
+    @staticmethod
+    def key(endpoint: str, filters: Dict[str, Any]) -> str:
+        """Identifies an endpoint + filter set."""
+        return f"{endpoint}:{query_fingerprint(endpoint, filters)}"
+
+    def get(self, endpoint: str, filters: Dict[str, Any]) -> Optional[date]:
+        """Returns the committed checkpoint for an endpoint + filter set, if any."""
+        checkpoint = self._load().get(self.key(endpoint, filters))
+        if checkpoint is None:
+            return None
+        return date.fromisoformat(checkpoint["last_registration_date"])
+
+    def stage(self, endpoint: str, filters: Dict[str, Any], until: date) -> None:
+        """Records a new checkpoint, written on the next commit()."""
+        self._staged[self.key(endpoint, filters)] = {
+            "endpoint": endpoint,
+            "filters": json.loads(json.dumps(filters, default=str)),
+            "last_registration_date": until.isoformat(),
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def rollback(self) -> None:
+        """Discards staged checkpoints."""
+        self._staged.clear()
+
+    def commit(self) -> None:
+        """
+        Atomically writes staged checkpoints. The file is re-read first so that
+        concurrent syncs of other endpoints sharing the file are preserved.
+        """
+        if not self._staged:
+            return
+        checkpoints = self._load()
+        checkpoints.update(self._staged)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"checkpoints": checkpoints}, f, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.debug(f"Committed {len(self._staged)} sync checkpoints to {self.path}")
+        self._staged.clear()
+
+
+def make_sync_method(fetch_method):
+    """
+    Builds a BDNSClient.sync_* method from a paginated fetch_* method.
+
+    The generated method takes the fetch method's filters (minus the parameters
+    managed by the sync engine), fetches every record registered since the last
+    checkpoint up to today, and stages today as the new checkpoint once all
+    records have been consumed. If state_file is a path the checkpoint is
+    committed right away; pass a SyncState to commit it yourself after the
+    output has been flushed.
+    """
+    fetch_name = fetch_method.__name__
+    endpoint = fetch_name.removeprefix("fetch_")
+
+    def run(
+        client,
+        state_file: Union[str, Path, SyncState],
+        since: Optional[date],
+        filters: Dict[str, Any],
+    ) -> Generator[Dict[str, Any], None, None]:
+        state = state_file if isinstance(state_file, SyncState) else None
+        owns_state = state is None
+        if owns_state:
+            state = SyncState(state_file)
+
+        key_filters = {
+            name: value
+            for name, value in filters.items()
+            if name not in SYNC_IGNORED_PARAMS
+        }
+        last_sync = state.get(endpoint, key_filters)
+        start = last_sync or since
+        until = date.today()
+        if start is None:
+            logger.warning(
+                f"No checkpoint for {endpoint}: fetching every registered record"
+            )
+        else:
+            logger.info(f"Syncing {endpoint} registered from {start} to {until}")
+
+        yield from getattr(client, fetch_name)(
+            **filters,
+            fechaRegInicio=start,
+            fechaRegFin=until,
+            from_page=0,
+            num_pages=0,
+        )
+
+        state.stage(endpoint, key_filters, until)
+        if owns_state:
+            state.commit()
+
+    def sync(*args, **kwargs) -> Generator[Dict[str, Any], None, None]:
+        arguments = dict(sync.__signature__.bind(*args, **kwargs).arguments)
+        client = arguments.pop("self")
+        state_file = arguments.pop("state_file", options.state_file.default)
+        since = arguments.pop("since", None)
+        return run(client, state_file, since, arguments)
+
+    fetch_signature = inspect.signature(fetch_method)
+    parameters = list(fetch_signature.parameters.values())
+    sync_parameters = [
+        parameters[0],
+        inspect.Parameter(
+            "state_file",
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            default=options.state_file,
+            annotation=Path,
+        ),
+        inspect.Parameter(
+            "since",
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            default=options.since,
+            annotation=date,
+        ),
+    ] + [
+        parameter
+        for parameter in parameters[1:]
+        if parameter.name not in SYNC_MANAGED_PARAMS
+    ]
+    sync.__signature__ = fetch_signature.replace(parameters=sync_parameters)
+    sync.__name__ = f"sync_{endpoint}"
+    sync.__qualname__ = f"BDNSClient.sync_{endpoint}"
+    sync.__doc__ = (
+        f"Incrementally syncs {endpoint} records by registration date "
+        f"(fechaRegInicio/fechaRegFin), see {fetch_name} for the filters."
+    )
+    return sync
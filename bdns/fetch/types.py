@@ -61,3 +61,34 @@ class Ambito(str, Enum):
     S = "S"  # Sanciones
     P = "P"  # Partidos políticos
     G = "G"  # Grandes Beneficiarios
+
+
+class RateLimitBackend(str, Enum):
+    local = "local"  # Shared by the threads of one process
+    shared = "shared"  # Shared by all local processes through a SQLite file
+
+
+class JSONBackend(str, Enum):
+    auto = "auto"  # Fastest installed
+    orjson = "orjson"
+    msgspec = "msgspec"
+    json = "json"  # Standard library
+
+
+class OutputFormat(str, Enum):
+    jsonl = "jsonl"  # One JSON object per line
+    csv = "csv"  # Flattened records under a fixed header
+    tsv = "tsv"  # Same as csv, tab separated
+    parquet = "parquet"  # Columnar, requires pyarrow
+    sqlite = "sqlite"  # Table upserted on the endpoint's natural key
+
+
+class DedupMode(str, Enum):
+    memory = "memory"  # Set of 64-bit digests
+    bloom = "bloom"  # Fixed-size Bloom filter, may drop a few unique records
+    disk = "disk"  # Digests in a temporary SQLite file
+
+
+class DriftPolicy(str, Enum):
+    warn = "warn"  # Log that records may be missing or repeated
+    refetch = "refetch"  # Re-fetch pages served from an outdated result set
@@ -16,23 +16,42 @@ Created on Sat May 17 16:23:45 2025
 Author: josemariacruzlorite@gmail.com
 """
 
+import logging
+import sqlite3
 import sys
 import threading
 import time
 from contextlib import contextmanager
-from datetime import datetime, date
+from datetime import datetime, date, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
 import functools
+import hashlib
 import inspect
 import json
-from typing import Any, Dict, Generator
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Optional, Union
 from urllib.parse import urlencode
-import requests
 
 import typer
 from typer.models import OptionInfo
 
+from bdns.fetch import json_backend
+from bdns.fetch.compression import compression_codec, open_compressed
 from bdns.fetch.exceptions import handle_api_response
+from bdns.fetch.writers import (
+    CSV_COLUMNS,
+    DEFAULT_CSV_BATCH_SIZE,
+    ArrowWriter,
+    CSVWriter,
+    JSONLWriter,
+    SQLiteWriter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
 
 
 class RateLimiter:
@@ -45,21 +64,247 @@ class RateLimiter:
         self._last = time.monotonic()
         self._lock = threading.Lock()
 
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available.
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds to wait before retrying.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate,
+                self._tokens + (now - self._last) * (self.rate / self.per),
+            )
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * (self.per / self.rate)
+
     def acquire(self) -> None:
         while True:
-            with self._lock:
-                now = time.monotonic()
-                self._tokens = min(
-                    self.rate,
-                    self._tokens + (now - self._last) * (self.rate / self.per),
-                )
-                self._last = now
-                if self._tokens >= 1:
-                    self._tokens -= 1
-                    return
-                wait = (1 - self._tokens) * (self.per / self.rate)
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
             time.sleep(wait)
 
+    def record_response(
+        self, status_code: int, latency: float, retry_after: Optional[float] = None
+    ) -> None:
+        """Feedback from a finished request. A fixed-rate limiter ignores it."""
+
+    @property
+    def current_rate(self) -> float:
+        """Requests per second currently allowed."""
+        return self.rate / self.per
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate follows AIMD (additive increase, multiplicative
+    decrease) from response feedback.
+
+    429 and 5xx responses, and latency rising to `latency_factor` times the best
+    seen (or `min_latency`, whichever is larger), cut the rate by `decrease`, at
+    most once per `per` seconds so that a burst of failures from concurrent
+    requests counts as one signal. Every other response adds
+    `increase` / rate, i.e. about `increase` requests per second gained per
+    second of healthy traffic, up to the starting rate, which is the ceiling.
+    A Retry-After pauses all requests for the given time.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        per: float = 1.0,
+        min_rate: float = 0.5,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        latency_factor: float = 3.0,
+        min_latency: float = 0.5,
+    ):
+        super().__init__(rate, per)
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.min_latency = min_latency
+        self._latency = None
+        self._best_latency = None
+        self._last_decrease = float("-inf")
+        self._paused_until = 0.0
+
+    def try_acquire(self) -> float:
+        with self._lock:
+            paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            return paused
+        return super().try_acquire()
+
+    def record_response(
+        self, status_code: int, latency: float, retry_after: Optional[float] = None
+    ) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+            # Exponentially weighted latency, compared against its best value
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = 0.8 * self._latency + 0.2 * latency
+            if self._best_latency is None or self._latency < self._best_latency:
+                self._best_latency = self._latency
+
+            congested = status_code == 429 or status_code >= 500
+            slow = self._latency > self.latency_factor * max(
+                self._best_latency, self.min_latency
+            )
+            if congested or slow:
+                if now - self._last_decrease < self.per:
+                    return
+                self._last_decrease = now
+                rate = max(self.min_rate, self.rate * self.decrease)
+                reason = f"HTTP {status_code}" if congested else "rising latency"
+                logger.warning(
+                    f"Backing off to {rate / self.per:.2f} requests/s ({reason})"
+                )
+            else:
+                rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+            self.rate = rate
+            self._tokens = min(self._tokens, rate)
+
+
+class SharedRateLimiter(AdaptiveRateLimiter):
+    """
+    AdaptiveRateLimiter whose token bucket and Retry-After pause live in a
+    SQLite file, so every local process using the same file (e.g. parallel
+    bdns-fetch runs from one egress IP) shares a single request budget.
+
+    Each take is a short write transaction; SQLite's file locking serialises
+    them across processes. Rate adaptation stays per process.
+    """
+
+    def __init__(self, path: Union[str, Path], rate: float, per: float = 1.0, **kwargs):
+        super().__init__(rate, per, **kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly in _transaction
+        self._connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        with self._transaction():
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), tokens REAL NOT NULL, "
+                "updated_at REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO bucket VALUES (0, ?, ?, 0)", (rate, time.time())
+            )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            # Take the write lock up front so read-modify-write is atomic
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def try_acquire(self) -> float:
+        with self._transaction():
+            tokens, updated_at, paused_until = self._connection.execute(
+                "SELECT tokens, updated_at, paused_until FROM bucket"
+            ).fetchone()
+            # Wall-clock time, as monotonic clocks are not comparable across processes
+            now = time.time()
+            if paused_until > now:
+                return paused_until - now
+            tokens = min(
+                self.rate,
+                tokens + max(0.0, now - updated_at) * (self.rate / self.per),
+            )
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) * (self.per / self.rate)
+            self._connection.execute(
+                "UPDATE bucket SET tokens = ?, updated_at = ?", (tokens, now)
+            )
+            return wait
+
+    def record_response(
+        self, status_code: int, latency: float, retry_after: Optional[float] = None
+    ) -> None:
+        super().record_response(status_code, latency, retry_after)
+        if retry_after:
+            with self._transaction():
+                self._connection.execute(
+                    "UPDATE bucket SET paused_until = MAX(paused_until, ?)",
+                    (time.time() + retry_after,),
+                )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class AsyncRateLimiter:
+    """
+    asyncio front-end for a RateLimiter: awaits instead of blocking the event loop.
+    Wrapping the same RateLimiter as the threaded client keeps a single budget
+    for both clients within the process.
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def acquire(self) -> None:
+        # Only the asyncio client needs asyncio: don't import it for the CLI
+        import asyncio
+
+        while True:
+            wait = self.limiter.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_response(
+        self, status_code: int, latency: float, retry_after: Optional[float] = None
+    ) -> None:
+        self.limiter.record_response(status_code, latency, retry_after)
+
+    @property
+    def current_rate(self) -> float:
+        return self.limiter.current_rate
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
 
 def format_date_for_api_request(value: date, output_format: str = "%d/%m/%Y"):
     """
@@ -103,6 +348,37 @@ def format_url(url: str, query_params: dict):
     return url
 
 
+def query_fingerprint(endpoint: str, params: dict) -> str:
+    """
+    Builds a stable identifier for a query.
+    Args:
+        endpoint (str): The endpoint URL or name.
+        params (dict): The query parameters. None values are ignored, enums and dates
+            are normalised so that equivalent calls produce the same fingerprint.
+    Returns:
+        str: A hex digest identifying the query.
+    """
+
+    def normalise(value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, (list, tuple)):
+            return [normalise(v) for v in value]
+        return value
+
+    canonical = {
+        key: normalise(value)
+        for key, value in params.items()
+        if value is not None and not isinstance(value, OptionInfo)
+    }
+    payload = json.dumps(
+        {"endpoint": endpoint, "params": canonical}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
 def api_request(url):
     """
     Fetches data from the BDNS API for concessions for a given date.
@@ -113,6 +389,8 @@ def api_request(url):
     Raises:
         BDNSAPIError: If the API request fails.
     """
+    import requests
+
     from bdns.fetch.exceptions import handle_api_error
 
     response = requests.get(url)
@@ -129,14 +407,25 @@ def api_request(url):
 
 
 @contextmanager
-def smart_open(file, *args, **kwargs):
+def smart_open(file, *args, compression_level: Optional[int] = None, **kwargs):
     """
     Open a file, or use stdin/stdout if file is '-'.
-    Passes all additional args/kwargs to open().
+    Files written with a .gz, .bz2, .xz or .zst extension are compressed on the
+    fly, see open_compressed. Passes all additional args/kwargs to open().
     """
+    mode = args[0] if args else kwargs.get("mode", "r")
     if str(file) == "-":
         sys.stdout.reconfigure(encoding="utf-8")
         yield sys.stdout
+    elif compression_codec(file) is not None and mode in ("w", "a"):
+        with open_compressed(
+            file,
+            mode,
+            kwargs.get("encoding", "utf-8"),
+            newline=kwargs.get("newline"),
+            level=compression_level,
+        ) as f:
+            yield f
     else:
         with open(file, *args, **kwargs) as f:
             yield f
@@ -148,40 +437,154 @@ def extract_option_values(func):
 
     This allows methods to use options.* parameters in their signatures (for CLI help)
     while getting the actual default values when called programmatically.
+
+    The signature is read and the option defaults resolved once, when decorating:
+    a call only fills in the options it wasn't given.
     """
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values())
+
+    if any(
+        parameter.kind
+        not in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+        for parameter in parameters
+    ):
+        # *args, **kwargs or positional-only parameters: bind every call
+        @functools.wraps(func)
+        def bind_wrapper(*args, **kwargs):
+            bound_args = signature.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            for param_name, value in bound_args.arguments.items():
+                if isinstance(value, OptionInfo):
+                    bound_args.arguments[param_name] = value.default
+            return func(*bound_args.args, **bound_args.kwargs)
+
+        return bind_wrapper
+
+    # (position, name, resolved default) of each parameter defaulting to an option
+    option_defaults = tuple(
+        (position, parameter.name, parameter.default.default)
+        for position, parameter in enumerate(parameters)
+        if isinstance(parameter.default, OptionInfo)
+    )
+    defaults = {name: default for _, name, default in option_defaults}
+    first_option = option_defaults[0][0] if option_defaults else len(parameters)
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Get the function signature
-        sig = inspect.signature(func)
-
-        # Bind arguments to get the full parameter mapping
-        bound_args = sig.bind(*args, **kwargs)
-        bound_args.apply_defaults()
-
-        # Extract values from all parameters
-        for param_name, value in bound_args.arguments.items():
+        for arg in args:
+            if isinstance(arg, OptionInfo):
+                args = tuple(
+                    arg.default if isinstance(arg, OptionInfo) else arg for arg in args
+                )
+                break
+        for name, value in kwargs.items():
             if isinstance(value, OptionInfo):
-                bound_args.arguments[param_name] = value.default
+                kwargs[name] = value.default
 
-        return func(*bound_args.args, **bound_args.kwargs)
+        # Usual case: options passed by keyword, if at all
+        if len(args) <= first_option:
+            return func(*args, **{**defaults, **kwargs})
+
+        given = len(args)
+        for position, name, default in option_defaults:
+            # Options given positionally are already in args
+            if position >= given:
+                kwargs.setdefault(name, default)
+        return func(*args, **kwargs)
 
     return wrapper
 
 
+def _write_items(writer, data_generator, stats: Optional[Dict[str, float]]) -> None:
+    """Writes every item with writer, then closes it, timing it into stats."""
+    if stats is None:
+        with writer:
+            for item in data_generator:
+                writer.write(item)
+        return
+
+    records, write_time = 0, 0.0
+    clock = time.perf_counter
+    try:
+        with writer:
+            for item in data_generator:
+                start = clock()
+                writer.write(item)
+                write_time += clock() - start
+                records += 1
+            # Closing flushes the last batch (and builds SQLite indexes)
+            start = clock()
+        write_time += clock() - start
+    finally:
+        stats["records"] = stats.get("records", 0) + records
+        stats["write_time"] = stats.get("write_time", 0.0) + write_time
+
+
 def write_to_file(
-    data_generator: Generator[Dict[str, Any], None, None], output_file: str = None
+    data_generator: Generator[Dict[str, Any], None, None],
+    output_file: str = None,
+    mode: str = "w",
+    line_buffered: bool = False,
+    on_flush: Optional[Callable[[], None]] = None,
+    compression_level: Optional[int] = None,
+    output_format: str = "jsonl",
+    table: str = "records",
+    stats: Optional[Dict[str, float]] = None,
 ) -> None:
     """
-    Streams data from a generator and writes each item to file as it comes.
+    Streams data from a generator and writes it to file as JSON lines, batching
+    records into large writes, as CSV/TSV rows, as Parquet row groups or into a
+    SQLite table.
 
     Args:
         data_generator: Generator that yields individual data items
         output_file: The output file path. If None, uses global _output_file or stdout
+        mode: "w" to overwrite the file, "a" to append to it (e.g. when resuming)
+        line_buffered: Write and flush every record as it comes
+        on_flush: Called after each flush of the output, see JSONLWriter
+        compression_level: Level used when output_file has a compressed extension
+        output_format: "jsonl", "csv"/"tsv" (see CSVWriter), "parquet" (see
+            ArrowWriter) or "sqlite" (see SQLiteWriter, which always upserts
+            whatever the mode)
+        table: Endpoint name, which selects the CSV columns and names the
+            SQLite table
+        stats: Optional dict updated with "records" written and "write_time",
+            the seconds spent encoding and writing them, excluding the time
+            waiting for data_generator
     """
     file_to_use = output_file or "-"
 
-    with smart_open(file_to_use, "w", encoding="utf-8", buffering=1) as f:
-        for item in data_generator:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
-            f.flush()
+    if output_format in ("parquet", "sqlite"):
+        if str(file_to_use) == "-":
+            raise ValueError(f"{output_format} output must be written to a file")
+        if output_format == "parquet":
+            writer = ArrowWriter(file_to_use, on_flush=on_flush)
+        else:
+            writer = SQLiteWriter(file_to_use, table, on_flush=on_flush)
+        _write_items(writer, data_generator, stats)
+        return
+
+    with smart_open(
+        file_to_use,
+        mode,
+        encoding="utf-8",
+        # The csv module writes its own line endings
+        newline="" if output_format in ("csv", "tsv") else None,
+        compression_level=compression_level,
+    ) as f:
+        if output_format in ("csv", "tsv"):
+            writer = CSVWriter(
+                f,
+                columns=CSV_COLUMNS.get(table),
+                delimiter="\t" if output_format == "tsv" else ",",
+                batch_size=1 if line_buffered else DEFAULT_CSV_BATCH_SIZE,
+                on_flush=on_flush,
+            )
+        else:
+            writer = JSONLWriter(f, line_buffered=line_buffered, on_flush=on_flush)
+        _write_items(writer, data_generator, stats)
+        closing = time.perf_counter()
+    if stats is not None:
+        # Closing flushes the compressor thread, if any
+        stats["write_time"] += time.perf_counter() - closing
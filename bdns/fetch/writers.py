@@ -0,0 +1,662 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Output writers for fetched records.
+"""
+
+import csv
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, TextIO, Union
+
+from bdns.fetch import json_backend
+from bdns.fetch.dedup import RECORD_KEYS
+from bdns.fetch.exceptions import BDNSError
+
+logger = logging.getLogger(__name__)
+
+# Add a NullHandler to prevent logging errors if no handlers are configured
+logger.addHandler(logging.NullHandler())
+
+# Flush once this many characters are buffered...
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# ...or once the oldest buffered record has waited this many seconds
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Records per Parquet row group, i.e. records held in memory by ArrowWriter
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# Arrow types of fields that can't be inferred from one row group alone:
+# amounts may be whole numbers in one row group and have cents in the next
+ARROW_FIELD_TYPES = {
+    "importe": "float64",
+    "ayudaEquivalente": "float64",
+}
+
+# Records per SQLite transaction
+DEFAULT_SQLITE_BATCH_SIZE = 10000
+
+# Columns indexed, when present, once records are loaded into SQLite: dates,
+# beneficiaries (NIF) and granting bodies are the usual filters
+SQLITE_INDEX_COLUMNS = (
+    "fechaConcesion",
+    "fechaRecepcion",
+    "fechaSancion",
+    "beneficiario",
+    "nifCif",
+    "numeroConvocatoria",
+    "nivel1",
+    "nivel2",
+    "nivel3",
+)
+
+# Rows per CSV batch, i.e. rows held in memory by CSVWriter
+DEFAULT_CSV_BATCH_SIZE = 10000
+
+# CSV columns of each endpoint, so that every run and every page has the same
+# columns. Nested objects are flattened into "parent.child" columns.
+# Endpoints not listed here take the columns of their first batch of records.
+_CONCESION_COLUMNS = [
+    "id",
+    "codConcesion",
+    "idConvocatoria",
+    "numeroConvocatoria",
+    "convocatoria",
+    "descripcionCooficial",
+    "nivel1",
+    "nivel2",
+    "nivel3",
+    "codigoInvente",
+    "fechaConcesion",
+    "idPersona",
+    "beneficiario",
+    "instrumento",
+    "importe",
+    "ayudaEquivalente",
+    "urlBR",
+    "tieneProyecto",
+]
+CSV_COLUMNS = {
+    "concesiones_busqueda": _CONCESION_COLUMNS,
+    "partidospoliticos_busqueda": _CONCESION_COLUMNS,
+    "convocatorias_busqueda": [
+        "id",
+        "mrr",
+        "numeroConvocatoria",
+        "descripcion",
+        "descripcionLeng",
+        "fechaRecepcion",
+        "nivel1",
+        "nivel2",
+        "nivel3",
+        "codigoInvente",
+    ],
+    "minimis_busqueda": [
+        "id",
+        "idConcesion",
+        "codConcesion",
+        "idConvocatoria",
+        "numeroConvocatoria",
+        "convocante",
+        "reglamento",
+        "instrumento",
+        "fechaConcesion",
+        "fechaRegistro",
+        "idPersona",
+        "beneficiario",
+        "sectorActividad",
+        "sectorProducto",
+        "ayudaEquivalente",
+    ],
+    "ayudasestado_busqueda": [
+        "id",
+        "idConcesion",
+        "codConcesion",
+        "idConvocatoria",
+        "numeroConvocatoria",
+        "convocatoria",
+        "descripcionCooficial",
+        "convocante",
+        "reglamento",
+        "objetivo",
+        "instrumento",
+        "fechaConcesion",
+        "fechaRegistro",
+        "idPersona",
+        "beneficiario",
+        "tipoBeneficiario",
+        "sectores",
+        "region",
+        "importe",
+        "ayudaEquivalente",
+        "entidad",
+        "intermediario",
+        "ayudaEstado",
+        "urlAyudaEstado",
+    ],
+    "sanciones_busqueda": [
+        "id",
+        "idPersona",
+        "beneficiario",
+        "fechaSancion",
+        "nivel1",
+        "nivel2",
+        "nivel3",
+        "importe",
+    ],
+}
+
+
+def flatten_record(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """
+    Flattens nested objects into "parent.child" keys. Lists are kept as JSON
+    text, since their length varies from record to record.
+    """
+    # Most records are flat already
+    for value in record.values():
+        if isinstance(value, (dict, list)):
+            break
+    else:
+        if not prefix:
+            return record
+
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f"{prefix}{key}."))
+        elif isinstance(value, list):
+            flat[f"{prefix}{key}"] = json_backend.dumps(value)
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+class JSONLWriter:
+    """
+    Writes records as JSON lines, batching them into large writes.
+
+    Encoded lines are buffered and written with a single write + flush once the
+    buffer reaches buffer_size characters, or when a record arrives more than
+    flush_interval seconds after the last flush. With line_buffered, every
+    record is written and flushed on its own (e.g. for `| jq` pipelines).
+    on_flush is called after each flush, once the records are out of the
+    process (e.g. to checkpoint progress).
+    """
+
+    def __init__(
+        self,
+        file: TextIO,
+        line_buffered: bool = False,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self.file = file
+        self.line_buffered = line_buffered
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.records = 0
+        self._lines: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, item: Any) -> None:
+        line = json_backend.dumps(item) + "\n"
+        self.records += 1
+        if self.line_buffered:
+            self.file.write(line)
+            self.flush()
+            return
+
+        self._lines.append(line)
+        self._buffered += len(line)
+        if (
+            self._buffered >= self.buffer_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered records and flushes the file."""
+        if self._lines:
+            self.file.write("".join(self._lines))
+            self._lines.clear()
+            self._buffered = 0
+        self.file.flush()
+        self._last_flush = time.monotonic()
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self) -> None:
+        """Flushes the remaining records. The file itself is left open."""
+        self.flush()
+
+
+class CSVWriter:
+    """
+    Writes records as CSV (or TSV) rows under a fixed header.
+
+    Records are flattened (see flatten_record) and written batch_size rows at a
+    time, with a flush after each batch. Columns are the declared ones, or the
+    fields of the first batch: fields outside them are dropped, logging a
+    warning (an error if the columns came from the first batch), and missing
+    ones are left empty, so columns never shift between batches.
+    on_flush is called after each flush.
+    """
+
+    def __init__(
+        self,
+        file: TextIO,
+        columns: Optional[List[str]] = None,
+        delimiter: str = ",",
+        batch_size: int = DEFAULT_CSV_BATCH_SIZE,
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self.file = file
+        self.columns = columns
+        self._declared = columns is not None
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.records = 0
+        self._csv = csv.writer(file, delimiter=delimiter, lineterminator="\n")
+        self._rows: List[Dict[str, Any]] = []
+        self._header_written = False
+        self._dropped_fields = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, item: Dict[str, Any]) -> None:
+        self._rows.append(flatten_record(item))
+        self.records += 1
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered rows, after the header if not written yet."""
+        if self.columns is None:
+            if not self._rows:
+                return
+            self.columns = list(dict.fromkeys(f for row in self._rows for f in row))
+        if not self._header_written:
+            self._csv.writerow(self.columns)
+            self._header_written = True
+
+        dropped = set().union(*self._rows) - set(self.columns) - self._dropped_fields
+        if dropped:
+            if self._declared:
+                logger.warning(
+                    f"Fields not in the CSV columns dropped: {sorted(dropped)}"
+                )
+            else:
+                logger.error(
+                    f"Fields missing from the first batch of records, which set "
+                    f"the CSV columns, dropped: {sorted(dropped)}. Use --format "
+                    f"jsonl to keep every field."
+                )
+            self._dropped_fields |= dropped
+
+        columns = self.columns
+        self._csv.writerows([row.get(c) for c in columns] for row in self._rows)
+        self._rows = []
+        self.file.flush()
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self) -> None:
+        """Writes the remaining rows. The file itself is left open."""
+        self.flush()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise BDNSError(
+            message="Parquet output requires the pyarrow package.",
+            suggestion="Install it with 'pip install bdns-fetch[parquet]' or use --format jsonl.",
+        ) from None
+    return pyarrow, pyarrow.parquet
+
+
+class ArrowWriter:
+    """
+    Writes records to a Parquet file, one row group per row_group_size records.
+
+    Records are buffered and converted to an Arrow record batch once a row group
+    is complete, so memory is bounded by one row group. Without a declared
+    schema, it is inferred from the first row group: nested objects and lists
+    become struct and list columns, ARROW_FIELD_TYPES fixes the type of known
+    fields and columns without any value yet become strings. Later values of
+    such a column that aren't strings are written as their JSON text (declare
+    the schema to keep their type). Fields missing from a record are written as
+    nulls; fields outside the schema are dropped with a warning. on_flush is
+    called after each row group is written.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, Path, BinaryIO],
+        schema=None,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression: str = "zstd",
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self._pa, self._pq = _import_pyarrow()
+        self.file = file
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.on_flush = on_flush
+        self.records = 0
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+        self._dropped_fields = set()
+        # Top-level columns typed as strings because they had no value yet
+        self._null_fields = set()
+        self._stringified_fields = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _fill_nulls(self, type_):
+        """Replaces null types, nested ones included, with strings."""
+        pa = self._pa
+        if pa.types.is_null(type_):
+            return pa.string()
+        if pa.types.is_struct(type_):
+            return pa.struct(
+                [field.with_type(self._fill_nulls(field.type)) for field in type_]
+            )
+        if pa.types.is_list(type_):
+            return pa.list_(self._fill_nulls(type_.value_type))
+        return type_
+
+    def _infer_schema(self, rows: List[Dict[str, Any]]):
+        inferred = self._pa.RecordBatch.from_pylist(rows).schema
+        fields = []
+        for field in inferred:
+            if field.name in ARROW_FIELD_TYPES:
+                type_ = getattr(self._pa, ARROW_FIELD_TYPES[field.name])()
+            else:
+                if self._pa.types.is_null(field.type):
+                    self._null_fields.add(field.name)
+                type_ = self._fill_nulls(field.type)
+            fields.append(field.with_type(type_))
+        return self._pa.schema(fields)
+
+    def _stringify_null_fields(
+        self, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """rows, with values of _null_fields that aren't strings as JSON text."""
+        fixed = []
+        for row in rows:
+            names = [
+                name
+                for name in self._null_fields.intersection(row)
+                if row[name] is not None and not isinstance(row[name], str)
+            ]
+            if names:
+                row = {**row, **{name: json_backend.dumps(row[name]) for name in names}}
+                self._warn_stringified(names)
+            fixed.append(row)
+        return fixed
+
+    def _warn_stringified(self, names: List[str]) -> None:
+        new = set(names) - self._stringified_fields
+        if new:
+            logger.warning(
+                f"Fields without values in the first row group are written as "
+                f"text: {sorted(new)}"
+            )
+            self._stringified_fields |= new
+
+    def _to_batch(self, rows: List[Dict[str, Any]]):
+        pa = self._pa
+        try:
+            if self.schema is None:
+                self.schema = self._infer_schema(rows)
+                logger.debug(f"Inferred Parquet schema:\n{self.schema}")
+            elif self._null_fields:
+                rows = self._stringify_null_fields(rows)
+            batch = pa.RecordBatch.from_pylist(rows, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise BDNSError(
+                message="Records don't fit the Parquet schema of the output.",
+                suggestion="Declare the schema with ArrowWriter(schema=...) or use --format jsonl.",
+                technical_details=str(e),
+            ) from e
+
+        dropped = set().union(*rows) - set(self.schema.names) - self._dropped_fields
+        if dropped:
+            logger.warning(
+                f"Fields not in the Parquet schema dropped: {sorted(dropped)}"
+            )
+            self._dropped_fields |= dropped
+        return batch
+
+    def write(self, item: Dict[str, Any]) -> None:
+        self._rows.append(item)
+        self.records += 1
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered records as a row group."""
+        if not self._rows:
+            return
+        # Taken even if they don't fit the schema, so close() doesn't retry them
+        rows, self._rows = self._rows, []
+        batch = self._to_batch(rows)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(
+                self.file, self.schema, compression=self.compression
+            )
+        self._writer.write_batch(batch, row_group_size=len(rows))
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self) -> None:
+        """
+        Writes the remaining records and the Parquet footer. The footer is
+        written even if the remaining records fail, keeping the row groups
+        already written readable.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._writer is None:
+                # No records: still write a valid (empty) file
+                schema = self._pa.schema([]) if self.schema is None else self.schema
+                self._writer = self._pq.ParquetWriter(
+                    self.file, schema, compression=self.compression
+                )
+            self._writer.close()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SQLiteWriter:
+    """
+    Upserts records into a table of a SQLite database, e.g. a local mirror
+    updated in place by incremental runs.
+
+    The table is created from the fields of the first batch, with the
+    endpoint's natural key (RECORD_KEYS) as NOT NULL primary key, and gains a
+    column whenever a record brings a new field. Nested objects and lists are
+    stored as JSON text. Records are inserted batch_size at a time with
+    executemany in one transaction; a record whose key is already in the table
+    replaces the stored row, and a record without a key raises BDNSError. Indexes on SQLITE_INDEX_COLUMNS are created on close,
+    after the load. on_flush is called after each committed batch.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, Path],
+        table: str,
+        key: Optional[str] = None,
+        batch_size: int = DEFAULT_SQLITE_BATCH_SIZE,
+        on_flush: Optional[Callable[[], None]] = None,
+    ):
+        self.file = file
+        self.table = table
+        self.key = key or RECORD_KEYS.get(table)
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.records = 0
+        self._rows: List[Dict[str, Any]] = []
+        self._columns: List[str] = []
+        self._closed = False
+        self._connection = sqlite3.connect(file)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _create_table(self, fields: List[str]) -> None:
+        """Creates the table, or adopts an existing one and its key."""
+        table_info = self._connection.execute(
+            f"PRAGMA table_info({_quote(self.table)})"
+        ).fetchall()
+        if table_info:
+            # (cid, name, type, notnull, default, pk)
+            self._columns = [row[1] for row in table_info]
+            self.key = next((row[1] for row in table_info if row[5]), None)
+            return
+
+        if self.key not in fields:
+            self.key = "id" if "id" in fields else None
+        if self.key is None:
+            logger.warning(
+                f"Records of {self.table} have no known key: they are inserted "
+                f"without replacing previous ones"
+            )
+        columns = [
+            f"{_quote(field)} NOT NULL PRIMARY KEY"
+            if field == self.key
+            else _quote(field)
+            for field in fields
+        ]
+        self._connection.execute(
+            f"CREATE TABLE {_quote(self.table)} ({', '.join(columns)})"
+        )
+        self._columns = list(fields)
+
+    def _add_columns(self, fields) -> None:
+        for field in fields:
+            if field not in self._columns:
+                self._connection.execute(
+                    f"ALTER TABLE {_quote(self.table)} ADD COLUMN {_quote(field)}"
+                )
+                self._columns.append(field)
+
+    @staticmethod
+    def _value(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json_backend.dumps(value)
+        return value
+
+    def _insert_statement(self) -> str:
+        columns = ", ".join(_quote(column) for column in self._columns)
+        placeholders = ", ".join("?" for _ in self._columns)
+        statement = (
+            f"INSERT INTO {_quote(self.table)} ({columns}) VALUES ({placeholders})"
+        )
+        if self.key is not None:
+            updates = ", ".join(
+                f"{_quote(column)} = excluded.{_quote(column)}"
+                for column in self._columns
+                if column != self.key
+            )
+            statement += f" ON CONFLICT({_quote(self.key)}) DO "
+            statement += f"UPDATE SET {updates}" if updates else "NOTHING"
+        return statement
+
+    def write(self, item: Dict[str, Any]) -> None:
+        self._rows.append(item)
+        self.records += 1
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Upserts the buffered records in one transaction."""
+        if not self._rows:
+            return
+        # Field order of the first record, then any field it lacks
+        fields = list(dict.fromkeys(field for row in self._rows for field in row))
+        with self._connection:
+            if not self._columns:
+                self._create_table(fields)
+            self._add_columns(fields)
+            # SQLite lets a primary key be NULL, and NULL keys never conflict:
+            # such rows would pile up on every run instead of being replaced
+            if self.key is not None and any(
+                row.get(self.key) is None for row in self._rows
+            ):
+                raise BDNSError(
+                    message=f"Records of {self.table} without {self.key} can't be upserted.",
+                    suggestion="Use --format jsonl to keep every record.",
+                )
+            value = self._value
+            self._connection.executemany(
+                self._insert_statement(),
+                (
+                    tuple(value(row.get(column)) for column in self._columns)
+                    for row in self._rows
+                ),
+            )
+        self._rows = []
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self) -> None:
+        """Upserts the remaining records, indexes the table and closes it."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+            with self._connection:
+                for column in SQLITE_INDEX_COLUMNS:
+                    if column in self._columns and column != self.key:
+                        self._connection.execute(
+                            f"CREATE INDEX IF NOT EXISTS "
+                            f"{_quote(f'{self.table}_{column}')} "
+                            f"ON {_quote(self.table)} ({_quote(column)})"
+                        )
+        finally:
+            self._connection.close()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmark of BDNSClient end to end, offline: pages/s, records/s, peak RSS and
+CPU per record fetching concesiones/busqueda from the local fake server and
+writing them, across max_workers values and output formats.
+
+Each configuration runs in its own process, so peak RSS and CPU time are its
+own and the fake server's work is not counted. The client gets a rate limiter
+of --max-rate requests per second instead of the API's 10.
+
+Usage:
+    python -m benchmarks.bench_client [--records 50000] [--workers 1,5,10]
+        [--formats jsonl,csv,parquet,sqlite] [--latency 0.02]
+        [--error-rate 0.01] [--throttle-rate 0.01]
+"""
+
+import argparse
+import json
+import math
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_server import FakeBDNSServer
+
+SUFFIXES = {"jsonl": ".jsonl", "csv": ".csv", "tsv": ".tsv"}
+
+
+def peak_rss_mib() -> float:
+    """Peak resident set size of this process, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run(args) -> None:
+    """Runs one configuration and prints its measurements as JSON."""
+    from bdns.fetch.client import BDNSClient
+    from bdns.fetch.json_backend import use_json_backend
+    from bdns.fetch.utils import RateLimiter, write_to_file
+
+    use_json_backend(args.json_backend)
+    client = BDNSClient(
+        max_workers=args.run_workers,
+        max_retries=10,
+        wait_time=0,
+        rate_limiter=RateLimiter(rate=args.max_rate),
+        base_url=args.run,
+    )
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = Path(directory) / f"out{SUFFIXES.get(args.run_format, '')}"
+        cpu_start, start = time.process_time(), time.perf_counter()
+        records = client.fetch_concesiones_busqueda(
+            num_pages=0, pageSize=args.page_size
+        )
+        write_to_file(
+            counted(records),
+            output,
+            output_format=args.run_format,
+            table="concesiones_busqueda",
+        )
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    client.close()
+
+    print(
+        json.dumps(
+            {
+                "records": count,
+                "pages": math.ceil(count / args.page_size),
+                "elapsed": elapsed,
+                "cpu": cpu,
+                "peak_rss": peak_rss_mib(),
+            }
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--workers", default="1,5,10")
+    parser.add_argument("--formats", default="jsonl,csv,parquet,sqlite")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--max-rate", type=float, default=1000.0)
+    parser.add_argument("--json-backend", default="auto")
+    # A single configuration, run by the benchmark in a child process
+    parser.add_argument("--run", metavar="BASE_URL", help=argparse.SUPPRESS)
+    parser.add_argument("--run-workers", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--run-format", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args)
+        return
+
+    server = FakeBDNSServer(
+        records=args.records,
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    print(
+        f"{args.records:,} records in pages of {args.page_size}, "
+        f"latency {args.latency * 1000:.0f} ms (sigma {args.latency_sigma}), "
+        f"errors {args.error_rate:.1%}, 429s {args.throttle_rate:.1%}"
+    )
+    print(
+        f"{'workers':>7} {'format':8} {'pages/s':>10} {'records/s':>12} "
+        f"{'peak RSS':>10} {'CPU/record':>12}"
+    )
+    # Encoded up front, so the first configuration doesn't wait for it
+    for page in range(math.ceil(args.records / args.page_size)):
+        server.page(page, args.page_size)
+
+    with server:
+        for workers in map(int, args.workers.split(",")):
+            for output_format in args.formats.split(","):
+                child = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.bench_client",
+                        *("--run", server.base_url),
+                        *("--run-workers", str(workers)),
+                        *("--run-format", output_format),
+                        *("--page-size", str(args.page_size)),
+                        *("--max-rate", str(args.max_rate)),
+                        *("--json-backend", args.json_backend),
+                    ],
+                    capture_output=True,
+                    text=True,
+                )
+                if child.returncode != 0:
+                    sys.exit(child.stderr)
+                result = json.loads(child.stdout.splitlines()[-1])
+                if result["records"] != args.records:
+                    sys.exit(f"Fetched {result['records']} of {args.records} records")
+                print(
+                    f"{workers:>7} {output_format:8} "
+                    f"{result['pages'] / result['elapsed']:>10,.1f} "
+                    f"{result['records'] / result['elapsed']:>12,.0f} "
+                    f"{result['peak_rss']:>6,.0f} MiB "
+                    f"{result['cpu'] / result['records'] * 1e6:>9,.1f} µs"
+                )
+    print(f"Server: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Microbenchmark of extract_option_values: per-call overhead of resolving the
+options.* defaults of fetch_* methods, against binding the signature per call.
+
+Usage:
+    python -m benchmarks.bench_options [--calls 200000]
+"""
+
+import argparse
+import functools
+import inspect
+import timeit
+
+from typer.models import OptionInfo
+
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.utils import extract_option_values
+
+
+def bind_per_call(func):
+    """The decorator before precomputing: binds the signature on every call."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound_args = inspect.signature(func).bind(*args, **kwargs)
+        bound_args.apply_defaults()
+        for param_name, value in bound_args.arguments.items():
+            if isinstance(value, OptionInfo):
+                bound_args.arguments[param_name] = value.default
+        return func(*bound_args.args, **bound_args.kwargs)
+
+    return wrapper
+
+
+def stub(method_name: str):
+    """A no-op function with the signature of a fetch_* method."""
+
+    def noop(*args, **kwargs):
+        return None
+
+    noop.__signature__ = inspect.signature(getattr(BDNSClient, method_name))
+    return noop
+
+
+# Method, and keyword arguments of the call: a lookup per id or person
+CALLS = {
+    "fetch_sectores()": ("fetch_sectores", {}),
+    "fetch_convocatorias(numConv=...)": (
+        "fetch_convocatorias",
+        {"numConv": "700000"},
+    ),
+    "fetch_terceros(busqueda=...)": ("fetch_terceros", {"busqueda": "B00000000"}),
+    "fetch_concesiones_busqueda(...)": (
+        "fetch_concesiones_busqueda",
+        {"nifCif": "B00000000"},
+    ),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'call':34} {'bind per call':>14} {'precomputed':>12} {'speedup':>8}")
+    for name, (method_name, kwargs) in CALLS.items():
+        timings = []
+        for decorator in (bind_per_call, extract_option_values):
+            wrapped = decorator(stub(method_name))
+            elapsed = min(
+                timeit.repeat(
+                    lambda: wrapped(None, **kwargs), number=args.calls, repeat=3
+                )
+            )
+            timings.append(elapsed / args.calls * 1e6)
+        before, after = timings
+        print(f"{name:34} {before:>11.2f} µs {after:>9.2f} µs {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
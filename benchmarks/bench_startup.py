@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmark of CLI startup: wall time of fresh interpreters importing the package
+and the CLI and rendering help, best of --runs, next to a bare interpreter.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 10] [--importtime]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "python (baseline)": ["-c", "pass"],
+    "import bdns.fetch": ["-c", "import bdns.fetch"],
+    "import bdns.fetch.cli": ["-c", "import bdns.fetch.cli"],
+    "bdns-fetch --version": ["-m", "bdns.fetch", "--version"],
+    "bdns-fetch --help": ["-m", "bdns.fetch", "--help"],
+    "bdns-fetch sectores --help": ["-m", "bdns.fetch", "sectores", "--help"],
+}
+
+
+def best_time(args, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--importtime",
+        action="store_true",
+        help="Also list the slowest imports of bdns.fetch.cli (python -X importtime)",
+    )
+    args = parser.parse_args()
+
+    for name, command in COMMANDS.items():
+        print(f"{name:28} {best_time(command, args.runs) * 1000:>8.0f} ms")
+
+    if args.importtime:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import bdns.fetch.cli"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # "import time: self [us] | cumulative | imported package"
+        imports = []
+        for line in result.stderr.splitlines()[1:]:
+            _, cumulative, module = line.split("|")
+            imports.append((int(cumulative), module.rstrip()))
+        print("\nSlowest imports (cumulative):")
+        for cumulative, module in sorted(imports, reverse=True)[:15]:
+            print(f"{cumulative / 1000:>8.1f} ms {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmark of output writers: records/second written by write_to_file, against
+the previous flush-per-record writer.
+
+Usage:
+    python -m benchmarks.bench_write [--records 200000] [--json-backend json]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from bdns.fetch.json_backend import use_json_backend
+from bdns.fetch.utils import write_to_file
+
+
+def make_records(count: int):
+    for i in range(count):
+        yield {
+            "id": i,
+            "codConcesion": f"SB{i:09d}",
+            "numeroConvocatoria": str(700000 + i % 5000),
+            "beneficiario": f"B{i:08d} AYUNTAMIENTO DE CÁDIZ",
+            "importe": round(i * 1.37, 2),
+            "fechaConcesion": "2024-03-01",
+            "nivel1": "ESTADO",
+            "nivel2": "MINISTERIO DE CIENCIA, INNOVACIÓN Y UNIVERSIDADES",
+            "tieneProyecto": bool(i % 2),
+        }
+
+
+def flush_per_record(records, path: Path) -> None:
+    """The writer before batching: line buffered and flushed after each record."""
+    with open(path, "w", encoding="utf-8", buffering=1) as f:
+        for item in records:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+
+
+WRITERS = {
+    "flush per record": flush_per_record,
+    "write_to_file --line-buffered": lambda records, path: write_to_file(
+        records, path, line_buffered=True
+    ),
+    "write_to_file (batched)": lambda records, path: write_to_file(records, path),
+    "write_to_file --format csv": lambda records, path: write_to_file(
+        records, path, output_format="csv", table="concesiones_busqueda"
+    ),
+    "write_to_file --format parquet": lambda records, path: write_to_file(
+        records, path, output_format="parquet"
+    ),
+    "write_to_file --format sqlite": lambda records, path: write_to_file(
+        records, path, output_format="sqlite", table="concesiones_busqueda"
+    ),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--json-backend", default="auto")
+    args = parser.parse_args()
+    print(f"JSON backend: {use_json_backend(args.json_backend)}")
+
+    # Built up front so only writing is timed
+    records = list(make_records(args.records))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for i, (name, writer) in enumerate(WRITERS.items()):
+            path = Path(directory) / f"out-{i}"
+            start = time.perf_counter()
+            writer(iter(records), path)
+            elapsed = time.perf_counter() - start
+            print(f"{name:32} {args.records / elapsed:>12,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Local stand-in for the BDNS API, to benchmark the client offline.
+
+Serves synthetic pages of concesiones/busqueda, shaped like the API's, over
+HTTP/1.1 keep-alive. Each response is delayed by a latency drawn from a
+lognormal distribution, and a fraction of them can be turned into 503 errors or
+429 responses to exercise retries and the rate limiter. Point a client at it
+with BDNSClient(base_url=server.base_url).
+
+Usage:
+    python -m benchmarks.fake_server [--records 100000] [--port 8000]
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_PATH = "/bdnstrans/api"
+
+# Page size when the request has no pageSize, as the API
+DEFAULT_PAGE_SIZE = 50
+
+
+def make_record(i: int) -> Dict[str, Any]:
+    """Synthetic record i of concesiones/busqueda."""
+    return {
+        "id": i,
+        "idConvocatoria": 700000 + i % 5000,
+        "numeroConvocatoria": str(700000 + i % 5000),
+        "convocatoria": "AYUDAS PARA LA CONTRATACIÓN DE PERSONAL INVESTIGADOR",
+        "descripcionCooficial": None,
+        "nivel1": "ESTADO",
+        "nivel2": "MINISTERIO DE CIENCIA, INNOVACIÓN Y UNIVERSIDADES",
+        "nivel3": "AGENCIA ESTATAL DE INVESTIGACIÓN",
+        "codConcesion": f"SB{i:09d}",
+        "fechaConcesion": "2024-03-01",
+        "idPersona": 1000000 + i,
+        "beneficiario": f"B{i:08d} AYUNTAMIENTO DE CÁDIZ",
+        "instrumento": "SUBVENCIÓN Y ENTREGA DINERARIA SIN CONTRAPRESTACIÓN ",
+        "importe": round(i * 1.37, 2),
+        "ayudaEquivalente": round(i * 1.37, 2),
+        "urlBR": None,
+        "tieneProyecto": bool(i % 2),
+    }
+
+
+class FakeBDNSServer:
+    """
+    Threaded HTTP server serving `records` synthetic concesiones.
+    Args:
+        records: Total number of records of the result set.
+        latency: Median response latency in seconds.
+        latency_sigma: Spread of the lognormal latency, 0 for a fixed latency.
+        error_rate: Fraction of responses replaced by a 503 error.
+        throttle_rate: Fraction of responses replaced by a 429 with Retry-After: 0.
+        seed: Seed of the latency and error draws.
+        host, port: Address to listen on; port 0 picks a free port.
+    """
+
+    def __init__(
+        self,
+        records: int = 100_000,
+        latency: float = 0.02,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.records = records
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Encoded pages, keyed on (page, page size): the server should not
+        # spend the CPU the benchmark is measuring on the client
+        self._pages: Dict[tuple, bytes] = {}
+        self.stats = dict.fromkeys(("requests", "errors", "throttled"), 0)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def serve_forever(self) -> None:
+        """Serves requests until stop() is called from another thread."""
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="fake-bdns-server", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def _draw(self) -> tuple:
+        """Latency and outcome ("ok", "error" or "throttled") of a response."""
+        with self._lock:
+            self.stats["requests"] += 1
+            latency = self.latency
+            if self.latency_sigma and latency > 0:
+                latency = self._random.lognormvariate(
+                    math.log(latency), self.latency_sigma
+                )
+            draw = self._random.random()
+            if draw < self.error_rate:
+                outcome = "error"
+            elif draw < self.error_rate + self.throttle_rate:
+                outcome = "throttled"
+            else:
+                outcome = "ok"
+            if outcome != "ok":
+                self.stats["errors" if outcome == "error" else "throttled"] += 1
+        return latency, outcome
+
+    def page(self, page: int, page_size: int) -> bytes:
+        """Encoded response for a page of the result set."""
+        body = self._pages.get((page, page_size))
+        if body is None:
+            start = page * page_size
+            stop = min(start + page_size, self.records)
+            body = json.dumps(
+                {
+                    "content": [make_record(i) for i in range(start, stop)],
+                    "totalElements": self.records,
+                    "totalPages": math.ceil(self.records / page_size),
+                    "number": page,
+                    "size": page_size,
+                    "first": page == 0,
+                    "last": stop >= self.records,
+                },
+                ensure_ascii=False,
+            ).encode("utf-8")
+            self._pages[(page, page_size)] = body
+        return body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the API, so the client's connection pool is used
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes: with Nagle's
+            # algorithm the body waits for the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != f"{API_PATH}/concesiones/busqueda":
+                    self._reply(404, b'{"codigo":404,"error":"Not Found"}')
+                    return
+                query = parse_qs(url.query)
+                try:
+                    page = int(query.get("page", ["0"])[0])
+                    page_size = int(query.get("pageSize", [DEFAULT_PAGE_SIZE])[0])
+                except ValueError:
+                    self._reply(400, b'{"codigo":400,"error":"Bad Request"}')
+                    return
+
+                latency, outcome = server._draw()
+                time.sleep(latency)
+                if outcome == "error":
+                    self._reply(503, b"Service Unavailable", "text/plain")
+                elif outcome == "throttled":
+                    self._reply(
+                        429, b"Too Many Requests", "text/plain", {"Retry-After": "0"}
+                    )
+                else:
+                    self._reply(200, server.page(page, max(1, page_size)))
+
+            def _reply(
+                self, status, body, content_type="application/json", headers=None
+            ):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = FakeBDNSServer(
+        records=args.records,
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving {args.records:,} concesiones at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"Served {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -44,3 +44,23 @@ def cleanup_test_file():
             pass  # Directory not empty or doesn't exist
 
     return _cleanup
+
+
+@pytest.fixture
+def fake_response():
+    """Build a stand-in for a requests.Response carrying a JSON payload."""
+
+    def _create_response(payload, status_code: int = 200, headers: dict = None):
+        import json
+
+        body = json.dumps(payload)
+        response = Mock()
+        response.status_code = status_code
+        response.reason = "OK" if status_code == 200 else "Error"
+        response.headers = headers or {}
+        response.text = body
+        response.content = body.encode("utf-8")
+        response.json = Mock(return_value=payload)
+        return response
+
+    return _create_response
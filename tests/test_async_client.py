@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for AsyncBDNSClient.
+These tests do not hit the BDNS API: HTTP calls go through a fake aiohttp session.
+"""
+
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from bdns.fetch.async_client import AsyncBDNSClient
+from bdns.fetch.utils import AdaptiveRateLimiter
+
+
+class FakeAsyncResponse:
+    """Minimal stand-in for an aiohttp response used as an async context manager."""
+
+    def __init__(self, payload, status: int = 200):
+        self.status = status
+        self.reason = "OK"
+        self.headers = {}
+        self._body = json.dumps(payload)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def text(self):
+        return self._body
+
+    async def read(self):
+        return self._body.encode("utf-8")
+
+
+class FakeAsyncSession:
+    """Serves pages of a synthetic paginated endpoint."""
+
+    closed = False
+
+    def __init__(self, total_pages: int = 1, payload=None):
+        self.total_pages = total_pages
+        self.payload = payload
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        if self.payload is not None:
+            return FakeAsyncResponse(self.payload)
+        page = int(parse_qs(urlparse(url).query)["page"][0])
+        return FakeAsyncResponse(
+            {
+                "content": [{"id": page}],
+                "totalPages": self.total_pages,
+                "number": page,
+            }
+        )
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestAsyncBDNSClient:
+    """Test the asyncio transport of the shared fetch_* methods."""
+
+    async def test_fetch_catalog(self):
+        """Non-paginated endpoints are exposed as async generators."""
+        client = AsyncBDNSClient()
+        client._session = FakeAsyncSession(payload=[{"id": 1}, {"id": 2}])
+
+        items = [item async for item in client.fetch_sectores()]
+
+        assert items == [{"id": 1}, {"id": 2}]
+
+    async def test_fetch_paginated_all_pages(self):
+        """All pages are fetched concurrently and every item is yielded."""
+        client = AsyncBDNSClient(max_workers=3)
+        session = FakeAsyncSession(total_pages=6)
+        client._session = session
+
+        items = [
+            item
+            async for item in client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        ]
+
+        assert sorted(item["id"] for item in items) == list(range(6))
+        assert len(session.urls) == 6
+
+    async def test_context_manager_closes_session(self):
+        """Leaving the async context manager closes the aiohttp session."""
+        session = FakeAsyncSession()
+        async with AsyncBDNSClient() as client:
+            client._session = session
+
+        assert session.closed
+        assert client._session is None
+
+    @pytest.mark.parametrize(
+        "name", ["fetch_sharded", "sync_concesiones_busqueda", "__enter__"]
+    )
+    async def test_synchronous_methods_raise(self, name):
+        """Methods inherited from BDNSClient that would block raise TypeError."""
+        with pytest.raises(TypeError, match="BDNSClient"):
+            getattr(AsyncBDNSClient(), name)()
+
+    async def test_current_rate_follows_the_limiter(self):
+        """current_rate reads through the asyncio wrapper of the limiter."""
+        limiter = AdaptiveRateLimiter(rate=10)
+        client = AsyncBDNSClient(rate_limiter=limiter)
+        limiter.record_response(429, 0.1)
+
+        assert client.current_rate == limiter.current_rate < 10
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the on-disk response cache.
+"""
+
+import os
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from bdns.fetch.cache import DirectoryCache, ResponseCache, SQLiteCache, open_cache
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.endpoints import (
+    BDNS_API_ENDPOINT_CONCESIONES_BUSQUEDA,
+    BDNS_API_ENDPOINT_SECTORES,
+)
+
+
+@pytest.fixture(params=["cache", "cache.sqlite"])
+def cache(request, tmp_path):
+    """Both cache backends, chosen by path suffix."""
+    cache = open_cache(tmp_path / request.param)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Test TTL handling and eviction of the cache backends."""
+
+    def test_backend_chosen_by_suffix(self, tmp_path):
+        assert isinstance(open_cache(tmp_path / "dir"), DirectoryCache)
+        assert isinstance(open_cache(tmp_path / "cache.db"), SQLiteCache)
+
+    def test_storage_methods_are_abstract(self):
+        with pytest.raises(TypeError):
+            ResponseCache()
+
+    def test_round_trip(self, cache):
+        """A cached catalog response is returned while fresh."""
+        cache.set(BDNS_API_ENDPOINT_SECTORES, [{"id": 1}])
+
+        entry = cache.get(BDNS_API_ENDPOINT_SECTORES)
+        assert entry.data == [{"id": 1}]
+        assert cache.get(f"{BDNS_API_ENDPOINT_SECTORES}?vpd=A07") is None
+
+    def test_expired_entries_are_ignored(self, cache):
+        cache.ttls = {BDNS_API_ENDPOINT_SECTORES: 60}
+        cache.set(BDNS_API_ENDPOINT_SECTORES, [{"id": 1}])
+        assert cache.get(BDNS_API_ENDPOINT_SECTORES) is not None
+
+        cache.ttls = {BDNS_API_ENDPOINT_SECTORES: 0.001}
+        time.sleep(0.01)
+        assert cache.get(BDNS_API_ENDPOINT_SECTORES) is None
+
+    def test_search_endpoints_are_not_cached(self, cache):
+        url = f"{BDNS_API_ENDPOINT_CONCESIONES_BUSQUEDA}?page=0"
+        cache.set(url, {"content": []})
+        assert cache.get(url) is None
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = DirectoryCache(tmp_path, ttls={"https://x/a": 60, "https://x/b": 60})
+        cache.set("https://x/a", "a" * 100)
+        cache.set("https://x/b", "b" * 100)
+        # Make "a" the most recently used entry
+        os.utime(cache._file(cache.key("https://x/b")), (0, 0))
+        cache.get("https://x/a")
+
+        # Room for one entry only
+        cache.max_size = cache._file(cache.key("https://x/a")).stat().st_size + 50
+        cache.set("https://x/a", "a" * 100)
+
+        assert cache.get("https://x/a") is not None
+        assert cache.get("https://x/b") is None
+
+
+@pytest.mark.unit
+class TestClientCache:
+    """Test the cache layer under _fetch_single_page."""
+
+    def test_cached_catalog_skips_request(self, fake_response, tmp_path):
+        client = BDNSClient(cache=open_cache(tmp_path))
+        client._session = Mock()
+        client._session.get.return_value = fake_response([{"id": 1}])
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert client._session.get.call_count == 1
+
+        # A new process with the same cache directory does not download again
+        client = BDNSClient(cache=open_cache(tmp_path))
+        client._session = Mock()
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        client._session.get.assert_not_called()
+
+    def test_stale_entry_is_revalidated(self, fake_response, tmp_path):
+        """An expired entry is revalidated with its ETag; 304 reuses it."""
+        cache = open_cache(tmp_path, ttls={BDNS_API_ENDPOINT_SECTORES: 60})
+        client = BDNSClient(cache=cache)
+        client._session = Mock()
+        client._session.get.return_value = fake_response(
+            [{"id": 1}], headers={"ETag": '"v1"'}
+        )
+        list(client.fetch_sectores())
+
+        cache.ttls = {BDNS_API_ENDPOINT_SECTORES: 0.001}
+        time.sleep(0.01)
+        client._session.get.return_value = fake_response(None, status_code=304)
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert client._session.get.call_args.kwargs["headers"] == {
+            "If-None-Match": '"v1"'
+        }
+        assert client.cache_stats == {
+            "hits": 0,
+            "misses": 1,
+            "revalidations": 1,
+            "unchanged": 0,
+        }
+
+    def test_content_hash_without_validators(self, fake_response, tmp_path):
+        """Without validators, an identical download is counted as unchanged."""
+        cache = open_cache(tmp_path, ttls={BDNS_API_ENDPOINT_SECTORES: 0.001})
+        client = BDNSClient(cache=cache)
+        client._session = Mock()
+        client._session.get.return_value = fake_response([{"id": 1}])
+
+        list(client.fetch_sectores())
+        time.sleep(0.01)
+        list(client.fetch_sectores())
+
+        assert client._session.get.call_args.kwargs["headers"] == {}
+        assert client.cache_stats["misses"] == 2
+        assert client.cache_stats["unchanged"] == 1
+        url = client._session.get.call_args.args[0]
+        assert cache.get(url, allow_stale=True).content_hash
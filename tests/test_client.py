@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for BDNSClient internals.
+These tests do not hit the BDNS API: HTTP calls go through a mocked session.
+"""
+
+import json
+from unittest.mock import Mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from typer.testing import CliRunner
+
+from bdns.fetch.cli import app
+from bdns.fetch.client import BDNSClient
+
+
+@pytest.mark.unit
+class TestBDNSClientSession:
+    """Test the pooled HTTP session owned by the client."""
+
+    def test_session_is_created_lazily_and_reused(self):
+        """The session is only built on first use and then shared."""
+        client = BDNSClient(max_workers=7)
+        assert client._session is None
+
+        session = client.session
+        assert session is client.session
+        adapter = session.get_adapter("https://www.infosubvenciones.es")
+        assert adapter._pool_maxsize == 7
+
+    def test_pool_maxsize_overrides_max_workers(self):
+        """An explicit pool size takes precedence over max_workers."""
+        client = BDNSClient(max_workers=2, pool_maxsize=12)
+        adapter = client.session.get_adapter("https://www.infosubvenciones.es")
+        assert adapter._pool_maxsize == 12
+
+    def test_stream_json_pools_a_connection_per_prefetched_page(self):
+        """Streamed pages keep their connection until consumed."""
+        client = BDNSClient(max_workers=3, stream_json=True)
+        adapter = client.session.get_adapter("https://www.infosubvenciones.es")
+        assert adapter._pool_maxsize == 6
+
+    def test_requests_go_through_session(self, fake_response):
+        """Every page request reuses the client session."""
+        client = BDNSClient()
+        client._session = Mock()
+        client._session.get.return_value = fake_response([{"id": 1}])
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert client._session.get.call_count == 2
+
+    def test_base_url_redirects_requests(self, fake_response):
+        """Requests go to base_url, keeping the API route and query."""
+        client = BDNSClient(base_url="http://127.0.0.1:8000/bdnstrans/api/")
+        client._session = Mock()
+        client._session.get.return_value = fake_response([{"id": 1}])
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        url = client._session.get.call_args.args[0]
+        assert url.startswith("http://127.0.0.1:8000/bdnstrans/api/sectores")
+
+    def test_context_manager_closes_session(self):
+        """Leaving the context manager closes the session."""
+        with BDNSClient() as client:
+            session = Mock()
+            client._session = session
+
+        session.close.assert_called_once()
+        assert client._session is None
+
+
+@pytest.mark.unit
+class TestBDNSClientPagination:
+    """Test concurrent pagination through a mocked session."""
+
+    @staticmethod
+    def _serve_pages(fake_response, total_pages):
+        def get(url, headers=None, timeout=None):
+            page = int(parse_qs(urlparse(url).query)["page"][0])
+            return fake_response(
+                {
+                    "content": [{"id": page}],
+                    "totalPages": total_pages,
+                    "number": page,
+                }
+            )
+
+        return get
+
+    def test_ordered_pagination(self, fake_response):
+        """With ordered=True items come out in page order."""
+        client = BDNSClient(max_workers=4, ordered=True)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 12)
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=1))
+
+        assert [item["id"] for item in items] == list(range(12))
+        assert client.last_pagination_stats["pages"] == 12
+
+    def test_stream_json(self, fake_response):
+        """Streamed pages are requested with stream=True and decoded in chunks."""
+
+        def get(url, headers=None, timeout=None, stream=False):
+            response = self._serve_pages(fake_response, 5)(url)
+            body = response.text.encode("utf-8")
+            response.iter_content = lambda chunk_size: [
+                body[i : i + 7] for i in range(0, len(body), 7)
+            ]
+            return response
+
+        client = BDNSClient(max_workers=2, ordered=True, stream_json=True)
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=1))
+
+        assert [item["id"] for item in items] == list(range(5))
+        assert all(call.kwargs["stream"] for call in client._session.get.call_args_list)
+
+    def test_stream_json_retries_body_cut_before_first_item(self, fake_response):
+        """A streamed page cut short before any record is requested again."""
+        attempts = []
+
+        def get(url, headers=None, timeout=None, stream=False):
+            response = self._serve_pages(fake_response, 1)(url)
+            body = response.text.encode("utf-8")
+            if not attempts:
+                body = body[: body.index(b"{", 1) + 3]
+            attempts.append(url)
+            response.iter_content = lambda chunk_size: [body]
+            return response
+
+        client = BDNSClient(wait_time=0, stream_json=True)
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=1))
+
+        assert [item["id"] for item in items] == [0]
+        assert len(attempts) == 2
+
+    @pytest.mark.parametrize("mode", ["memory", "bloom", "disk"])
+    def test_dedup_drops_records_repeated_across_pages(self, fake_response, mode):
+        """A record pushed onto the next page by a new registration is dropped."""
+
+        def get(url, headers=None, timeout=None):
+            page = int(parse_qs(urlparse(url).query)["page"][0])
+            codes = [f"SB{page}", f"SB{page + 1}"]
+            return fake_response(
+                {
+                    "content": [{"codConcesion": code} for code in codes],
+                    "totalPages": 4,
+                    "number": page,
+                }
+            )
+
+        client = BDNSClient(max_workers=2, ordered=True, dedup=mode)
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=2))
+
+        assert [item["codConcesion"] for item in items] == [f"SB{i}" for i in range(5)]
+        assert client.last_pagination_stats["duplicates"] == 3
+
+    @staticmethod
+    def _serve_live_dataset(fake_response, insert_after):
+        """Pages of 2 records; 3 records are registered after some requests."""
+        dataset = [{"codConcesion": f"SB{i}"} for i in range(10)]
+        requests_served = []
+
+        def get(url, headers=None, timeout=None):
+            if len(requests_served) == insert_after:
+                dataset[:0] = [{"codConcesion": f"NEW{i}"} for i in range(3)]
+            requests_served.append(url)
+            page = int(parse_qs(urlparse(url).query)["page"][0])
+            return fake_response(
+                {
+                    "content": dataset[2 * page : 2 * page + 2],
+                    "totalElements": len(dataset),
+                    "totalPages": (len(dataset) + 1) // 2,
+                    "number": page,
+                }
+            )
+
+        return get, dataset
+
+    def test_drift_is_reported(self, fake_response, caplog):
+        """Pages disagreeing on totalElements are reported as drift."""
+        get, _ = self._serve_live_dataset(fake_response, insert_after=3)
+        client = BDNSClient(max_workers=1, ordered=True)
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=2))
+
+        assert len(items) == 10
+        assert client.last_pagination_stats["drift"] == [10, 13]
+        assert "result set changed" in caplog.text
+
+    def test_drift_refetch_completes_the_dump(self, fake_response):
+        """Pages served from the outdated result set are fetched again."""
+        get, dataset = self._serve_live_dataset(fake_response, insert_after=3)
+        client = BDNSClient(max_workers=1, ordered=True, on_drift="refetch")
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=2))
+
+        assert sorted(item["codConcesion"] for item in items) == sorted(
+            record["codConcesion"] for record in dataset
+        )
+        stats = client.last_pagination_stats
+        assert stats["refetched_pages"] == 5
+        assert stats["duplicates"] == 6
+
+    def test_no_refetch_without_drift(self, fake_response):
+        """A stable result set is fetched once."""
+        get, _ = self._serve_live_dataset(fake_response, insert_after=-1)
+        client = BDNSClient(max_workers=2, on_drift="refetch")
+        client._session = Mock()
+        client._session.get.side_effect = get
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=2))
+
+        assert len(items) == 10
+        assert client._session.get.call_count == 5
+        assert "drift" not in client.last_pagination_stats
+
+    def test_drift_across_a_resumed_run(self, fake_response, tmp_path):
+        """Pages completed before an interruption are checked for drift too."""
+        get, dataset = self._serve_live_dataset(fake_response, insert_after=-1)
+        journal_dir = tmp_path / "journal"
+        client = BDNSClient(max_workers=1, ordered=True, journal_dir=journal_dir)
+        client._session = Mock()
+        client._session.get.side_effect = get
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=2)
+        first_run = [next(items)["codConcesion"] for _ in range(3)]
+        items.close()  # Interrupted after page 0
+        dataset[:0] = [{"codConcesion": f"NEW{i}"} for i in range(3)]
+
+        client = BDNSClient(
+            max_workers=1,
+            ordered=True,
+            journal_dir=journal_dir,
+            resume=True,
+            on_drift="refetch",
+        )
+        client._session = Mock()
+        client._session.get.side_effect = get
+        second_run = [
+            item["codConcesion"]
+            for item in client.fetch_concesiones_busqueda(num_pages=0, pageSize=2)
+        ]
+
+        assert client.last_pagination_stats["drift"] == [10, 13]
+        assert set(first_run + second_run) == {
+            record["codConcesion"] for record in dataset
+        }
+
+    def test_resume_skips_completed_pages(self, fake_response, tmp_path):
+        """An interrupted paginated fetch resumes after the last delivered page."""
+        journal_dir = tmp_path / "out.jsonl.resume"
+        client = BDNSClient(max_workers=2, ordered=True, journal_dir=journal_dir)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 6)
+
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        first_run = [next(items)["id"] for _ in range(3)]
+        items.close()  # Interrupted while page 2 was being written
+        assert first_run == [0, 1, 2]
+
+        client = BDNSClient(
+            max_workers=2, ordered=True, journal_dir=journal_dir, resume=True
+        )
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 6)
+        second_run = [
+            item["id"]
+            for item in client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        ]
+
+        assert second_run == [2, 3, 4, 5]
+        requested = {
+            int(parse_qs(urlparse(call.args[0]).query)["page"][0])
+            for call in client._session.get.call_args_list
+        }
+        assert requested == {2, 3, 4, 5}
+        # The journal is removed once the query completes
+        assert not journal_dir.exists()
+
+    def test_deferred_journal_waits_for_flush(self, fake_response, tmp_path):
+        """Without autoflush, pages are only recorded by flush_journals()."""
+        journal_dir = tmp_path / "journal"
+        client = BDNSClient(
+            max_workers=2,
+            ordered=True,
+            journal_dir=journal_dir,
+            journal_autoflush=False,
+        )
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 4)
+
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        next(items)
+        next(items)
+        (journal_file,) = journal_dir.iterdir()
+        assert '"page"' not in journal_file.read_text()
+
+        client.flush_journals()
+        assert '{"page": 0}' in journal_file.read_text()
+
+        # Completing the query only removes the journal on the next flush
+        list(items)
+        assert journal_file.exists()
+        client.flush_journals()
+        assert not journal_dir.exists()
+
+    def test_resume_skips_items_written_from_a_partial_page(
+        self, fake_response, tmp_path
+    ):
+        """Items of a page cut short are recorded on flush and not written twice."""
+
+        def get(url, headers=None, timeout=None):
+            page = int(parse_qs(urlparse(url).query)["page"][0])
+            return fake_response(
+                {
+                    "content": [{"id": 10 * page + i} for i in range(3)],
+                    "totalPages": 3,
+                    "number": page,
+                }
+            )
+
+        journal_dir = tmp_path / "journal"
+        client = BDNSClient(
+            ordered=True, journal_dir=journal_dir, journal_autoflush=False
+        )
+        client._session = Mock()
+        client._session.get.side_effect = get
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=3)
+        first_run = [next(items)["id"] for _ in range(5)]
+        client.flush_journals()  # The output holds the first 5 items
+        items.close()
+
+        client = BDNSClient(ordered=True, journal_dir=journal_dir, resume=True)
+        client._session = Mock()
+        client._session.get.side_effect = get
+        second_run = [
+            item["id"]
+            for item in client.fetch_concesiones_busqueda(num_pages=0, pageSize=3)
+        ]
+
+        assert first_run + second_run == [0, 1, 2, 10, 11, 12, 20, 21, 22]
+
+    def test_journal_discarded_without_resume(self, fake_response, tmp_path):
+        """Without resume a previous journal is ignored and every page fetched."""
+        journal_dir = tmp_path / "journal"
+        client = BDNSClient(journal_dir=journal_dir)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 3)
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        next(items)
+        next(items)
+        items.close()
+
+        client = BDNSClient(journal_dir=journal_dir)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve_pages(fake_response, 3)
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=1))
+
+        assert sorted(item["id"] for item in items) == [0, 1, 2]
+
+
+@pytest.mark.unit
+class TestResumeCLI:
+    """Test --resume of the CLI against the output of a previous run."""
+
+    @pytest.fixture
+    def serve_pages(self, fake_response, monkeypatch):
+        session = Mock()
+        session.get.side_effect = TestBDNSClientPagination._serve_pages(
+            fake_response, 3
+        )
+        monkeypatch.setattr(BDNSClient, "session", property(lambda self: session))
+        return session
+
+    @staticmethod
+    def run(output_file, *args):
+        return CliRunner().invoke(
+            app,
+            [
+                "--no-cache",
+                "--output-file",
+                str(output_file),
+                *args,
+                "concesiones-busqueda",
+                "--pageSize",
+                "1",
+                "--num-pages",
+                "0",
+            ],
+        )
+
+    def test_resume_after_a_completed_run(self, tmp_path, serve_pages):
+        """Without a journal left, --resume writes the output from scratch."""
+        output_file = tmp_path / "concesiones.jsonl"
+
+        assert self.run(output_file).exit_code == 0
+        result = self.run(output_file, "--resume")
+
+        assert result.exit_code == 0, result.output
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert sorted(json.loads(line)["id"] for line in lines) == [0, 1, 2]
+
+    def test_resume_appends_to_an_interrupted_run(self, tmp_path, serve_pages):
+        output_file = tmp_path / "concesiones.jsonl"
+        journal_dir = tmp_path / "concesiones.jsonl.resume"
+        assert self.run(output_file).exit_code == 0
+        # As left by a run interrupted after writing page 0
+        output_file.write_text('{"id": 0}\n', encoding="utf-8")
+        journal_dir.mkdir()
+        client = BDNSClient(journal_dir=journal_dir)
+        client._session = serve_pages
+        items = client.fetch_concesiones_busqueda(num_pages=0, pageSize=1)
+        next(items)
+        next(items)
+        items.close()
+
+        result = self.run(output_file, "--resume")
+
+        assert result.exit_code == 0, result.output
+        lines = output_file.read_text(encoding="utf-8").splitlines()
+        assert sorted(json.loads(line)["id"] for line in lines) == [0, 1, 2]
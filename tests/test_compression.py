@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for compressed output files.
+"""
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+import time
+
+import pytest
+
+from bdns.fetch.compression import BackgroundWriter, compression_codec, open_compressed
+from bdns.fetch.exceptions import BDNSError
+from bdns.fetch.utils import write_to_file
+
+RECORDS = [{"id": i, "beneficiario": "AYUNTAMIENTO DE CÁDIZ"} for i in range(1000)]
+
+
+def read_zstd(path):
+    zstandard = pytest.importorskip("zstandard")
+    with open(path, "rb") as f:
+        return zstandard.ZstdDecompressor().stream_reader(f).read()
+
+
+READERS = {
+    ".gz": lambda path: gzip.open(path).read(),
+    ".bz2": lambda path: bz2.open(path).read(),
+    ".xz": lambda path: lzma.open(path).read(),
+    ".zst": read_zstd,
+}
+
+
+class FailingStream(io.BytesIO):
+    def write(self, data):
+        raise OSError("No space left on device")
+
+
+@pytest.mark.unit
+class TestCompressedOutput:
+    """Test compression chosen by output file extension."""
+
+    def test_codec_from_extension(self):
+        assert compression_codec("out.jsonl.gz") is not None
+        assert compression_codec("OUT.JSONL.ZST") is not None
+        assert compression_codec("out.jsonl") is None
+        assert compression_codec("-") is None
+
+    @pytest.mark.parametrize("suffix", sorted(READERS))
+    def test_write_to_file_compresses(self, tmp_path, suffix):
+        output = tmp_path / f"concesiones.jsonl{suffix}"
+        if suffix == ".zst":
+            pytest.importorskip("zstandard")
+
+        write_to_file(iter(RECORDS), output, compression_level=1)
+
+        lines = READERS[suffix](output).decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == RECORDS
+
+    def test_append_adds_a_compressed_stream(self, tmp_path):
+        output = tmp_path / "concesiones.jsonl.gz"
+        write_to_file(iter(RECORDS[:10]), output)
+        write_to_file(iter(RECORDS[10:20]), output, mode="a")
+
+        lines = gzip.open(output).read().decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == RECORDS[:20]
+
+    def test_invalid_level(self, tmp_path):
+        with pytest.raises(BDNSError, match="compression level 12"):
+            open_compressed(tmp_path / "out.jsonl.gz", level=12)
+
+    def test_only_writes(self, tmp_path):
+        with pytest.raises(ValueError):
+            open_compressed(tmp_path / "out.jsonl.gz", mode="r")
+
+    def test_plain_files_untouched(self, tmp_path):
+        output = tmp_path / "concesiones.jsonl"
+        write_to_file(iter(RECORDS[:3]), output, compression_level=9)
+
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == RECORDS[:3]
+
+
+@pytest.mark.unit
+class TestBackgroundWriter:
+    """Test writes handed off to a background thread."""
+
+    def test_writes_in_order(self):
+        raw = io.BytesIO()
+        raw.close = lambda: None
+        writer = BackgroundWriter(raw, max_pending_writes=2)
+        for i in range(100):
+            writer.write(f"{i}\n".encode())
+        writer.close()
+
+        assert raw.getvalue() == "".join(f"{i}\n" for i in range(100)).encode()
+        assert writer.closed
+
+    def test_error_raised_on_close(self):
+        writer = BackgroundWriter(FailingStream())
+        writer.write(b"data")
+
+        with pytest.raises(OSError, match="No space left"):
+            writer.close()
+        assert writer.closed
+
+    def test_error_raised_on_next_write(self):
+        writer = BackgroundWriter(FailingStream())
+        writer.write(b"data")
+        deadline = time.monotonic() + 5
+        while writer._error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with pytest.raises(OSError):
+            writer.write(b"more data")
+        with pytest.raises(OSError):
+            writer.close()
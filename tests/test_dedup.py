@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for record deduplication.
+"""
+
+import os
+
+import pytest
+
+from bdns.fetch.dedup import (
+    BloomFilter,
+    Deduplicator,
+    DigestSet,
+    DiskDigestStore,
+    record_digest,
+)
+
+
+@pytest.mark.unit
+class TestRecordDigest:
+    """Test the identity digest of records."""
+
+    def test_key_field(self):
+        first = {"codConcesion": "SB1", "importe": 100}
+        updated = {"codConcesion": "SB1", "importe": 250}
+        assert record_digest(first, "codConcesion") == record_digest(
+            updated, "codConcesion"
+        )
+        assert record_digest(first, "codConcesion") != record_digest(
+            {"codConcesion": "SB2"}, "codConcesion"
+        )
+
+    def test_falls_back_to_id_then_record(self):
+        assert record_digest({"id": 1, "a": 1}, "codConcesion") == record_digest(
+            {"id": 1, "a": 2}
+        )
+        assert record_digest({"a": 1}) == record_digest({"a": 1})
+        assert record_digest({"a": 1}) != record_digest({"a": 2})
+
+    def test_signed_64_bits(self):
+        digest = record_digest({"id": 1})
+        assert -(2**63) <= digest < 2**63
+
+
+@pytest.mark.unit
+class TestDigestStores:
+    """Test the stores of seen digests."""
+
+    @pytest.fixture(params=["memory", "bloom", "disk"])
+    def store(self, request, tmp_path):
+        store = {
+            "memory": lambda: DigestSet(),
+            "bloom": lambda: BloomFilter(capacity=10_000, error_rate=1e-6),
+            "disk": lambda: DiskDigestStore(tmp_path),
+        }[request.param]()
+        yield store
+        store.close()
+
+    def test_add(self, store):
+        digests = [record_digest({"id": i}) for i in range(1000)]
+        assert all(store.add(digest) for digest in digests)
+        assert not any(store.add(digest) for digest in digests)
+
+    def test_bloom_filter_sizing(self):
+        bloom = BloomFilter(capacity=1_000_000, error_rate=1e-6)
+        assert bloom.hashes == 20
+        assert len(bloom._bits) < 4 * 1024 * 1024
+
+    def test_disk_store_removed_on_close(self, tmp_path):
+        store = DiskDigestStore(tmp_path)
+        store.add(1)
+        assert os.path.exists(store.path)
+        store.close()
+        assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.unit
+class TestDeduplicator:
+    """Test dropping repeated records from a stream."""
+
+    def test_uses_endpoint_key(self):
+        records = [
+            {"codConcesion": "SB1", "id": 1},
+            {"codConcesion": "SB1", "id": 2},
+            {"codConcesion": "SB2", "id": 1},
+        ]
+        with Deduplicator("concesiones_busqueda") as deduplicator:
+            assert list(deduplicator.filter(records)) == [records[0], records[2]]
+
+        assert deduplicator.records == 3
+        assert deduplicator.duplicates == 1
+
+    def test_across_streams(self):
+        with Deduplicator(key="numeroConvocatoria") as deduplicator:
+            first = list(deduplicator.filter([{"numeroConvocatoria": "1"}]))
+            second = list(deduplicator.filter([{"numeroConvocatoria": "1"}]))
+
+        assert (len(first), len(second)) == (1, 0)
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError, match="dedup mode"):
+            Deduplicator(mode="redis")
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the pluggable JSON backend.
+Every backend must write byte-identical JSONL to the standard library path.
+"""
+
+import json
+
+import pytest
+
+from bdns.fetch import json_backend
+from bdns.fetch.exceptions import BDNSError
+from bdns.fetch.utils import write_to_file
+
+RECORDS = [
+    {
+        "id": 1234567,
+        "codConcesion": "SB123456789",
+        "beneficiario": "B12345678 AYUNTAMIENTO DE CÁDIZ",
+        "importe": 15025.3,
+        "ayudaEquivalente": 0.0,
+        "fechaConcesion": "2024-03-01",
+        "tieneProyecto": False,
+        "urlBR": None,
+        "nivel": ["ESTADO", "MINISTERIO DE CIENCIA, INNOVACIÓN Y UNIVERSIDADES"],
+    },
+    {"descripcion": 'Línea "A"\n\tcontrol \x1f, € y emoji 😀', "orden": -0.0},
+    {"small": 1e-07, "large": 1e22, "huge": 2**70, "exact": 1e15},
+    {"text": "cuenta 2e planta"},
+    {"hora": "10:30", "lista": "a,b", "clave:con,signos": 1},
+    {"regiones": [{"id": 1, "descripcion": "ES61 - ANDALUCIA"}], "vacio": {}},
+    [],
+    {},
+]
+
+
+def installed_backends():
+    backends = []
+    for name in json_backend.JSON_BACKENDS:
+        try:
+            json_backend._load_backend(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+
+@pytest.fixture(params=installed_backends())
+def backend(request):
+    previous = json_backend.json_backend()
+    yield json_backend.use_json_backend(request.param)
+    json_backend.use_json_backend(previous)
+
+
+@pytest.mark.unit
+class TestJSONBackend:
+    """Test decoding and encoding with each installed backend."""
+
+    @pytest.mark.parametrize("record", RECORDS)
+    def test_dumps_matches_stdlib(self, backend, record):
+        expected = json.dumps(record, ensure_ascii=False)
+        assert json_backend.dumps(record) == expected
+
+    @pytest.mark.parametrize("record", RECORDS)
+    def test_round_trip(self, backend, record):
+        text = json.dumps(record, ensure_ascii=False)
+        assert json_backend.loads(text) == record
+        assert json_backend.loads(text.encode("utf-8")) == record
+
+    def test_dumps_keeps_non_finite_floats(self, backend):
+        """NaN and infinities are written as json writes them, not as null."""
+        record = {"nan": float("nan"), "inf": [float("inf"), -1e400], "urlBR": None}
+        assert json_backend.dumps(record) == (
+            '{"nan": NaN, "inf": [Infinity, -Infinity], "urlBR": null}'
+        )
+
+    def test_loads_accepts_what_stdlib_accepts(self, backend):
+        assert json_backend.loads(b'{"n": 123456789012345678901234567890}') == {
+            "n": 123456789012345678901234567890
+        }
+        with pytest.raises(ValueError):
+            json_backend.loads(b"<html>Bad gateway</html>")
+
+    def test_jsonl_output_is_byte_identical(self, backend, tmp_path):
+        output = tmp_path / f"{backend}.jsonl"
+        write_to_file(iter(RECORDS), output)
+
+        expected = "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS
+        )
+        assert output.read_bytes() == expected.encode("utf-8")
+
+
+@pytest.mark.unit
+def test_missing_backend_is_reported(monkeypatch):
+    def missing(name):
+        raise ImportError(name)
+
+    monkeypatch.setattr(json_backend, "_load_backend", missing)
+    with pytest.raises(BDNSError):
+        json_backend.use_json_backend("orjson")
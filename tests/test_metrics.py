@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for client metrics and their Prometheus export.
+"""
+
+import json
+import time
+from unittest.mock import Mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from typer.testing import CliRunner
+
+from bdns.fetch.cli import app
+from bdns.fetch.cache import open_cache
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.endpoints import (
+    BDNS_API_ENDPOINT_CONCESIONES_BUSQUEDA,
+    BDNS_API_ENDPOINT_SECTORES,
+    endpoint_name,
+)
+from bdns.fetch.metrics import (
+    Histogram,
+    InMemoryMetrics,
+    format_run_summary,
+    run_summary,
+)
+from bdns.fetch.utils import RateLimiter
+
+
+def serve_pages(fake_response, total_pages, page_size=3):
+    def get(url, headers=None, timeout=None):
+        page = int(parse_qs(urlparse(url).query)["page"][0])
+        return fake_response(
+            {
+                "content": [{"id": page * page_size + i} for i in range(page_size)],
+                "totalPages": total_pages,
+                "number": page,
+            }
+        )
+
+    return get
+
+
+@pytest.mark.unit
+class TestInMemoryMetrics:
+    """Test aggregation and the Prometheus text format."""
+
+    def test_endpoint_name(self):
+        assert (
+            endpoint_name(
+                "https://www.infosubvenciones.es/bdnstrans/api/concesiones/busqueda?page=2"
+            )
+            == "concesiones_busqueda"
+        )
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+        assert histogram.sum == pytest.approx(2.65)
+
+    def test_prometheus_text(self):
+        metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+        metrics.on_request("sectores", "url", 200, 0.05, 120)
+        metrics.on_request("sectores", "url", 503, 2.0, 10)
+        metrics.on_records("sectores", 7)
+        metrics.on_retry("sectores", "url", OSError())
+        metrics.on_rate_limit_wait(0.25)
+        metrics.on_queue_depth("sectores", 4)
+        metrics.on_queue_depth("sectores", 2)
+
+        lines = metrics.prometheus_text().splitlines()
+
+        assert "# TYPE bdns_fetch_request_duration_seconds histogram" in lines
+        assert 'bdns_fetch_requests_total{endpoint="sectores",status="503"} 1' in lines
+        assert (
+            'bdns_fetch_request_duration_seconds_bucket{endpoint="sectores",le="0.1"} 1'
+            in lines
+        )
+        assert (
+            'bdns_fetch_request_duration_seconds_bucket{endpoint="sectores",le="+Inf"} 2'
+            in lines
+        )
+        assert (
+            'bdns_fetch_request_duration_seconds_count{endpoint="sectores"} 2' in lines
+        )
+        assert 'bdns_fetch_response_bytes_total{endpoint="sectores"} 130' in lines
+        assert 'bdns_fetch_records_total{endpoint="sectores"} 7' in lines
+        assert 'bdns_fetch_retries_total{endpoint="sectores"} 1' in lines
+        assert "bdns_fetch_rate_limit_wait_seconds_total 0.25" in lines
+        assert 'bdns_fetch_queue_depth{endpoint="sectores"} 2' in lines
+        assert 'bdns_fetch_queue_depth_max{endpoint="sectores"} 4' in lines
+
+    def test_write_prometheus(self, tmp_path):
+        metrics = InMemoryMetrics()
+        metrics.on_records("sectores", 1)
+        metrics.write_prometheus(tmp_path / "metrics.prom")
+
+        text = (tmp_path / "metrics.prom").read_text()
+        assert 'bdns_fetch_records_total{endpoint="sectores"} 1' in text
+
+    def test_slowest_requests(self):
+        metrics = InMemoryMetrics(slowest=2)
+        for i, latency in enumerate([0.3, 0.1, 0.9, 0.5]):
+            metrics.on_request("sectores", f"url{i}", 200, latency, 0)
+
+        assert metrics.slowest_requests() == [
+            {"url": "url2", "status": 200, "seconds": 0.9},
+            {"url": "url3", "status": 200, "seconds": 0.5},
+        ]
+
+    def test_run_summary(self):
+        metrics = InMemoryMetrics()
+        metrics.on_request("concesiones_busqueda", "url0", 200, 0.5, 2048)
+        metrics.on_request("concesiones_busqueda", "url1", 429, 0.1, 0)
+        metrics.on_request("concesiones_busqueda", "url1", 200, 0.2, 2048)
+        metrics.on_retry("concesiones_busqueda", "url1", OSError())
+        metrics.on_rate_limit_wait(1.5)
+
+        summary = run_summary(metrics, 2.0, {"records": 100, "write_time": 0.25})
+
+        assert summary["requests"] == 3
+        assert summary["pages"] == 2
+        assert summary["pages_per_second"] == 1.0
+        assert summary["records_per_second"] == 50.0
+        assert summary["bytes"] == 4096
+        assert summary["retries"] == 1
+        assert summary["rate_limit_wait"] == 1.5
+        assert summary["write_time"] == 0.25
+        assert summary["slowest_requests"][0]["url"] == "url0"
+        text = format_run_summary(summary)
+        assert "Records written     100 (50/s)" in text
+        assert "url0" in text
+
+
+@pytest.mark.unit
+class TestClientMetrics:
+    """Test the metrics a client reports through a mocked session."""
+
+    def test_paginated_fetch(self, fake_response):
+        metrics = InMemoryMetrics()
+        client = BDNSClient(
+            max_workers=2, metrics=metrics, rate_limiter=RateLimiter(rate=1000)
+        )
+        client._session = Mock()
+        client._session.get.side_effect = serve_pages(fake_response, 4)
+
+        items = list(client.fetch_concesiones_busqueda(num_pages=0, pageSize=3))
+
+        assert len(items) == 12
+        assert metrics.requests["concesiones_busqueda", 200] == 4
+        assert metrics.latency["concesiones_busqueda"].count == 4
+        assert metrics.records["concesiones_busqueda"] == 12
+        assert metrics.bytes["concesiones_busqueda"] > 0
+        assert 1 <= metrics.queue_depth_max["concesiones_busqueda"] <= 3
+        assert metrics.rate_limit_wait >= 0
+
+    def test_streamed_pages_count_records(self, fake_response):
+        metrics = InMemoryMetrics()
+        client = BDNSClient(
+            max_workers=1,
+            metrics=metrics,
+            stream_json=True,
+            rate_limiter=RateLimiter(rate=1000),
+        )
+        client._session = Mock()
+
+        def get(url, headers=None, timeout=None, stream=False):
+            response = serve_pages(fake_response, 2)(url)
+            response.iter_content = Mock(return_value=iter([response.content]))
+            return response
+
+        client._session.get.side_effect = get
+
+        assert len(list(client.fetch_concesiones_busqueda(num_pages=0))) == 6
+        assert metrics.records["concesiones_busqueda"] == 6
+
+    def test_streamed_page_reported_when_headers_arrive(self, fake_response):
+        """Status and latency are reported before the body is consumed."""
+        metrics = InMemoryMetrics()
+        client = BDNSClient(metrics=metrics, rate_limiter=RateLimiter(rate=1000))
+        client._session = Mock()
+        url = BDNS_API_ENDPOINT_CONCESIONES_BUSQUEDA + "?page=0"
+        response = serve_pages(fake_response, 1)(url)
+        response.headers = {"Content-Length": str(len(response.content))}
+        response.iter_content = Mock(return_value=iter([response.content]))
+        client._session.get.return_value = response
+
+        page = client._fetch_page_stream(url)
+
+        assert metrics.requests["concesiones_busqueda", 200] == 1
+        assert metrics.bytes["concesiones_busqueda"] == len(response.content)
+        assert metrics.records["concesiones_busqueda"] == 0
+        assert len(list(page)) == 3
+        assert metrics.requests["concesiones_busqueda", 200] == 1
+        assert metrics.records["concesiones_busqueda"] == 3
+
+    def test_retries(self, fake_response):
+        metrics = InMemoryMetrics()
+        client = BDNSClient(
+            metrics=metrics, wait_time=0, rate_limiter=RateLimiter(rate=1000)
+        )
+        client._session = Mock()
+        client._session.get.side_effect = [
+            fake_response("Service Unavailable", status_code=503),
+            fake_response([{"id": 1}]),
+        ]
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert metrics.retries["sectores"] == 1
+        assert metrics.requests["sectores", 503] == 1
+        assert metrics.records["sectores"] == 1
+
+    def test_revalidations(self, fake_response, tmp_path):
+        """A 304 revalidating a cached catalog is reported like any response."""
+        metrics = InMemoryMetrics()
+        cache = open_cache(tmp_path, ttls={BDNS_API_ENDPOINT_SECTORES: 60})
+        rate_limiter = Mock(wraps=RateLimiter(rate=1000))
+        client = BDNSClient(metrics=metrics, cache=cache, rate_limiter=rate_limiter)
+        client._session = Mock()
+        client._session.get.return_value = fake_response(
+            [{"id": 1}], headers={"ETag": '"v1"'}
+        )
+        list(client.fetch_sectores())
+        cache.ttls = {BDNS_API_ENDPOINT_SECTORES: 0.001}
+        time.sleep(0.01)
+        client._session.get.return_value = fake_response(None, status_code=304)
+
+        assert list(client.fetch_sectores()) == [{"id": 1}]
+        assert metrics.requests["sectores", 304] == 1
+        assert metrics.latency["sectores"].count == 2
+        assert [call.args[0] for call in rate_limiter.record_response.mock_calls] == [
+            200,
+            304,
+        ]
+
+
+@pytest.mark.unit
+class TestStatsCLI:
+    """Test the --stats and --stats-file run summaries of the CLI."""
+
+    @pytest.fixture
+    def sectores_session(self, fake_response, monkeypatch):
+        session = Mock()
+        session.get.return_value = fake_response([{"id": 1}, {"id": 2}])
+        monkeypatch.setattr(BDNSClient, "session", property(lambda self: session))
+        return session
+
+    def test_stats_without_metrics_file(self, tmp_path, sectores_session):
+        """--stats alone prints the summary and writes no Prometheus file."""
+        output_file = tmp_path / "sectores.jsonl"
+
+        result = CliRunner().invoke(
+            app,
+            ["--stats", "--no-cache", "--output-file", str(output_file), "sectores"],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Records written     2" in result.output
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["sectores.jsonl"]
+
+    def test_stats_file(self, tmp_path, sectores_session):
+        stats_file = tmp_path / "stats.json"
+
+        result = CliRunner().invoke(
+            app,
+            [
+                "--stats-file",
+                str(stats_file),
+                "--no-cache",
+                "--output-file",
+                str(tmp_path / "sectores.jsonl"),
+                "sectores",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert json.loads(stats_file.read_text())["records"] == 2
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for resolving options.* defaults in programmatic calls.
+"""
+
+import inspect
+
+import pytest
+import typer
+
+from bdns.fetch.utils import extract_option_values
+
+PAGE_SIZE = typer.Option(10000, "--pageSize")
+VPD = typer.Option("GE", "--vpd")
+
+
+@pytest.mark.unit
+class TestExtractOptionValues:
+    """Test the precomputed option defaults of decorated methods."""
+
+    @staticmethod
+    @extract_option_values
+    def fetch(client, vpd: str = VPD, pageSize: int = PAGE_SIZE, order=None):
+        return client, vpd, pageSize, order
+
+    def test_defaults_resolved(self):
+        assert self.fetch("client") == ("client", "GE", 10000, None)
+
+    def test_keyword_arguments(self):
+        assert self.fetch("client", pageSize=5, order="id") == ("client", "GE", 5, "id")
+
+    def test_positional_arguments(self):
+        assert self.fetch("client", "A01", 5) == ("client", "A01", 5, None)
+
+    def test_option_passed_explicitly(self):
+        assert self.fetch("client", VPD, pageSize=PAGE_SIZE) == (
+            "client",
+            "GE",
+            10000,
+            None,
+        )
+
+    def test_invalid_arguments_still_raise(self):
+        with pytest.raises(TypeError):
+            self.fetch("client", unknown=1)
+        with pytest.raises(TypeError):
+            self.fetch("client", "A01", vpd="A02")
+
+    def test_signature_kept_for_the_cli(self):
+        assert list(inspect.signature(self.fetch).parameters) == [
+            "client",
+            "vpd",
+            "pageSize",
+            "order",
+        ]
+
+    def test_variadic_functions_bind_each_call(self):
+        @extract_option_values
+        def fetch(*args, vpd: str = VPD, **kwargs):
+            return args, vpd, kwargs
+
+        assert fetch(1, extra=2) == ((1,), "GE", {"extra": 2})
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the concurrent pagination scheduler.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from bdns.fetch.pagination import iter_window
+
+
+@pytest.mark.unit
+class TestIterWindow:
+    """Test the bounded sliding-window scheduler."""
+
+    def test_yields_every_result(self):
+        """Every argument is processed exactly once."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(iter_window(executor, lambda x: x * 2, range(20), 4))
+
+        assert sorted(results) == [x * 2 for x in range(20)]
+
+    def test_slow_consumer_bounds_scheduled_calls(self):
+        """No more than `window` calls are scheduled ahead of the consumer."""
+        lock = threading.Lock()
+        started = []
+
+        def fetch(page):
+            with lock:
+                started.append(page)
+            return page
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            consumed = 0
+            for _ in iter_window(executor, fetch, range(50), 3):
+                time.sleep(0.01)
+                consumed += 1
+                with lock:
+                    assert len(started) - consumed <= 3
+
+        assert consumed == 50
+
+    def test_closing_generator_cancels_pending(self):
+        """Abandoning the generator does not schedule the remaining calls."""
+        calls = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            results = iter_window(executor, calls.append, range(100), 2)
+            next(results)
+            results.close()
+
+        assert len(calls) <= 3
+
+    def test_ordered_yields_in_argument_order(self):
+        """Ordered mode emits results in submission order despite completion order."""
+
+        def fetch(page):
+            # Earlier pages finish last
+            time.sleep(0.002 * (10 - page % 10))
+            return page
+
+        stats = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                iter_window(executor, fetch, range(30), 6, ordered=True, stats=stats)
+            )
+
+        assert results == list(range(30))
+        assert 0 < stats["reorder_buffer_peak"] < 6
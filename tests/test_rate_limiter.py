@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the rate limiters.
+"""
+
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.utils import (
+    AdaptiveRateLimiter,
+    RateLimiter,
+    SharedRateLimiter,
+    parse_retry_after,
+)
+
+
+@pytest.mark.unit
+class TestAdaptiveRateLimiter:
+    """Test the AIMD rate adaptation."""
+
+    def test_backs_off_on_throttling(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.record_response(429, 0.1)
+        assert limiter.current_rate == 5
+
+    def test_concurrent_failures_count_once(self):
+        """Failures within one period are a single congestion signal."""
+        limiter = AdaptiveRateLimiter(rate=10)
+        for _ in range(5):
+            limiter.record_response(503, 0.1)
+        assert limiter.current_rate == 5
+
+    def test_rate_never_drops_below_minimum(self):
+        limiter = AdaptiveRateLimiter(rate=10, min_rate=2)
+        for _ in range(10):
+            limiter._last_decrease = float("-inf")  # Outside the cooldown
+            limiter.record_response(500, 0.1)
+        assert limiter.current_rate == 2
+
+    def test_recovers_up_to_ceiling(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.record_response(429, 0.1)
+        for _ in range(1000):
+            limiter.record_response(200, 0.1)
+        assert limiter.current_rate == 10
+
+    def test_backs_off_on_rising_latency(self):
+        limiter = AdaptiveRateLimiter(rate=10, min_latency=0.1)
+        for _ in range(5):
+            limiter.record_response(200, 0.1)
+        for _ in range(10):
+            limiter.record_response(200, 5.0)
+        assert limiter.current_rate < 10
+
+    def test_retry_after_pauses_requests(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.record_response(429, 0.1, retry_after=30)
+        assert 29 < limiter.try_acquire() <= 30
+
+    def test_fixed_limiter_ignores_feedback(self):
+        limiter = RateLimiter(rate=10)
+        limiter.record_response(429, 0.1, retry_after=30)
+        assert limiter.current_rate == 10
+        assert limiter.try_acquire() == 0
+
+
+@pytest.mark.unit
+class TestSharedRateLimiter:
+    """Test the token bucket shared through a SQLite file."""
+
+    def test_limiters_share_one_budget(self, tmp_path):
+        """Limiters on the same file (e.g. in different processes) share tokens."""
+        path = tmp_path / "rate-limit.sqlite"
+        first = SharedRateLimiter(path, rate=2)
+        second = SharedRateLimiter(path, rate=2)
+
+        assert first.try_acquire() == 0
+        assert second.try_acquire() == 0
+        assert first.try_acquire() > 0
+        assert second.try_acquire() > 0
+
+        first.close()
+        second.close()
+
+    def test_retry_after_pauses_every_limiter(self, tmp_path):
+        path = tmp_path / "rate-limit.sqlite"
+        first = SharedRateLimiter(path, rate=10)
+        second = SharedRateLimiter(path, rate=10)
+
+        first.record_response(429, 0.1, retry_after=30)
+
+        assert 29 < second.try_acquire() <= 30
+        first.close()
+        second.close()
+
+
+@pytest.mark.unit
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 60
+
+
+@pytest.mark.unit
+def test_client_retries_throttled_requests(fake_response):
+    """A 429 is retried and slows the client's limiter down."""
+    limiter = AdaptiveRateLimiter(rate=10)
+    client = BDNSClient(wait_time=0, rate_limiter=limiter)
+    client._session = Mock()
+    client._session.get.side_effect = [
+        fake_response({"error": "busy"}, status_code=429),
+        fake_response([{"id": 1}]),
+    ]
+
+    assert list(client.fetch_sectores()) == [{"id": 1}]
+    assert client._session.get.call_count == 2
+    assert client.current_rate == limiter.current_rate < 10
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for date-range sharding.
+These tests do not hit the BDNS API: HTTP calls go through a mocked session.
+"""
+
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.exceptions import BDNSError
+from bdns.fetch.sharding import plan_date_shards
+
+START = date(2024, 1, 1)
+RECORDS_PER_DAY = 3
+
+
+def records_between(start: date, end: date):
+    days = (end - start).days + 1
+    return [
+        {"id": f"{start + timedelta(days=day)}-{n}"}
+        for day in range(days)
+        for n in range(RECORDS_PER_DAY)
+    ]
+
+
+@pytest.mark.unit
+class TestPlanDateShards:
+    """Test the recursive bisection planner."""
+
+    def test_bisects_until_target_size(self):
+        """Windows above the target are split; all records are covered once."""
+        probe = Mock(side_effect=lambda a, b: len(records_between(a, b)))
+
+        shards = plan_date_shards(probe, START, START + timedelta(days=9), 7)
+
+        assert all(shard.total_elements <= 7 for shard in shards)
+        assert sum(shard.total_elements for shard in shards) == 30
+        assert shards[0].start == START
+        assert shards[-1].end == START + timedelta(days=9)
+        for previous, current in zip(shards, shards[1:]):
+            assert current.start == previous.end + timedelta(days=1)
+
+    def test_single_day_is_not_split(self):
+        """A one-day window is kept even if it exceeds the target."""
+        shards = plan_date_shards(lambda a, b: 500, START, START, 10)
+        assert [shard.total_elements for shard in shards] == [500]
+
+    def test_empty_windows_are_dropped(self):
+        """Windows without records produce no shard."""
+        assert plan_date_shards(lambda a, b: 0, START, START + timedelta(5), 1) == []
+
+
+@pytest.mark.unit
+class TestFetchSharded:
+    """Test sharded fetching through a mocked session."""
+
+    @staticmethod
+    def _serve(fake_response):
+        def get(url, headers=None, timeout=None):
+            query = parse_qs(urlparse(url).query)
+            start = datetime.strptime(query["fechaRegInicio"][0], "%d/%m/%Y").date()
+            end = datetime.strptime(query["fechaRegFin"][0], "%d/%m/%Y").date()
+            page = int(query["page"][0])
+            size = int(query["pageSize"][0])
+            records = records_between(start, end)
+            return fake_response(
+                {
+                    "content": records[page * size : (page + 1) * size],
+                    "totalElements": len(records),
+                    "totalPages": -(-len(records) // size),
+                    "number": page,
+                }
+            )
+
+        return get
+
+    def test_fetch_sharded_returns_every_record(self, fake_response):
+        """Sharded fetching yields each record of the range exactly once."""
+        client = BDNSClient(max_workers=2)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve(fake_response)
+        end = START + timedelta(days=19)
+
+        items = list(
+            client.fetch_sharded(
+                "fetch_concesiones_busqueda", START, end, target_size=10, pageSize=4
+            )
+        )
+
+        assert sorted(item["id"] for item in items) == sorted(
+            record["id"] for record in records_between(START, end)
+        )
+
+    def test_copies_share_the_client_session(self, fake_response, monkeypatch):
+        """Probe and shard clients reuse one session, created on the client."""
+        session = Mock()
+        session.get.side_effect = self._serve(fake_response)
+        session_class = Mock(return_value=session)
+        monkeypatch.setattr("requests.Session", session_class)
+        client = BDNSClient(max_workers=2, dedup="memory")
+
+        list(
+            client.fetch_sharded(
+                "fetch_concesiones_busqueda",
+                START,
+                START + timedelta(days=9),
+                target_size=10,
+                pageSize=4,
+            )
+        )
+
+        session_class.assert_called_once()
+        assert client._session is session
+
+    def test_shards_keep_no_journal(self, fake_response, tmp_path):
+        """Pages handed over by shard threads are not recorded before written."""
+        journal_dir = tmp_path / "journal"
+        client = BDNSClient(journal_dir=journal_dir, journal_autoflush=False)
+        client._session = Mock()
+        client._session.get.side_effect = self._serve(fake_response)
+
+        items = client.fetch_sharded(
+            "fetch_concesiones_busqueda",
+            START,
+            START + timedelta(days=9),
+            target_size=10,
+            pageSize=4,
+        )
+        for _ in range(3):
+            next(items)
+        client.flush_journals()
+
+        assert client._journals == []
+        assert not journal_dir.exists()
+        items.close()
+
+    def test_rejects_unsupported_date_field(self):
+        """Endpoints without registration dates cannot be sharded on them."""
+        client = BDNSClient()
+        with pytest.raises(BDNSError):
+            list(
+                client.fetch_sharded(
+                    "fetch_convocatorias_busqueda", START, START, by="registro"
+                )
+            )
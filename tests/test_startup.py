@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests guarding CLI startup time: heavy modules are imported on use.
+"""
+
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+from bdns.fetch.options import DateType
+
+# Modules the CLI must not import until a command needs them
+LAZY_MODULES = ("dateparser", "asyncio", "aiohttp", "requests", "tqdm", "tenacity")
+
+
+@pytest.mark.unit
+class TestStartup:
+    """Test that importing the CLI leaves heavy modules unimported."""
+
+    def test_cli_import_is_lazy(self):
+        code = (
+            "import sys, bdns.fetch.cli; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == ""
+
+    def test_date_options_still_parse(self):
+        assert DateType.convert("2024-03-01", None, None) == date(2024, 3, 1)
+
+    def test_commands_registered_without_self(self):
+        from bdns.fetch.cli import COMMANDS, app
+
+        commands = {command.name: command for command in app.registered_commands}
+        assert set(COMMANDS) <= set(commands)
+        assert "self" not in commands["sectores"].callback.__signature__.parameters
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for incremental decoding of paginated responses.
+"""
+
+import json
+
+import pytest
+
+from bdns.fetch.streaming import StreamedPage, iter_json_array
+
+PAGE = {
+    "content": [{"id": i, "descripcion": "Subvención " * i} for i in range(20)],
+    "totalPages": 1234,
+    "number": 7,
+    "last": False,
+}
+
+
+def chunked(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.unit
+class TestIterJsonArray:
+    """Test decoding of the content array from arbitrary chunk boundaries."""
+
+    @pytest.mark.parametrize("size", [1, 3, 17, 1 << 20])
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_items_and_metadata(self, size, indent):
+        body = json.dumps(PAGE, ensure_ascii=False, indent=indent).encode("utf-8")
+        metadata = {}
+
+        items = list(iter_json_array(chunked(body, size), metadata=metadata))
+
+        assert items == PAGE["content"]
+        assert metadata == {"totalPages": 1234, "number": 7, "last": False}
+
+    def test_metadata_before_content(self):
+        body = b'{"totalPages": 2, "content": [], "number": 0}'
+        metadata = {}
+        assert list(iter_json_array([body], metadata=metadata)) == []
+        assert metadata == {"totalPages": 2, "number": 0}
+
+    def test_items_are_yielded_before_the_body_ends(self):
+        """The first record is available once its own bytes have arrived."""
+        received = []
+
+        def chunks():
+            for chunk in chunked(json.dumps(PAGE).encode("utf-8"), 64):
+                received.append(chunk)
+                yield chunk
+
+        first = next(iter_json_array(chunks()))
+        assert first == PAGE["content"][0]
+        assert len(received) < len(chunked(json.dumps(PAGE).encode("utf-8"), 64))
+
+    def test_truncated_body_raises(self):
+        body = json.dumps(PAGE).encode("utf-8")[:-40]
+        with pytest.raises(ValueError):
+            list(iter_json_array(chunked(body, 16)))
+
+
+@pytest.mark.unit
+def test_streamed_page_reports_metadata_and_closes():
+    closed = []
+    completed = []
+    page = StreamedPage(
+        chunked(json.dumps(PAGE).encode("utf-8"), 100),
+        close=lambda: closed.append(True),
+        on_complete=completed.append,
+    )
+
+    assert list(page) == PAGE["content"]
+    assert page.get("totalPages") == 1234
+    assert completed == [page]
+    assert closed == [True]
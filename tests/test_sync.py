@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for incremental sync on registration dates.
+These tests do not hit the BDNS API: HTTP calls go through a mocked session.
+"""
+
+import json
+from datetime import date
+from unittest.mock import Mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from typer.testing import CliRunner
+
+from bdns.fetch.cli import app
+from bdns.fetch.client import BDNSClient
+from bdns.fetch.sync import SyncState
+
+
+@pytest.fixture
+def page_session(fake_response):
+    """Session returning a single page and recording the requested URLs."""
+    session = Mock()
+    session.get.side_effect = lambda url, headers=None, timeout=None: fake_response(
+        {"content": [{"id": 1}, {"id": 2}], "totalPages": 1, "number": 0}
+    )
+    return session
+
+
+def requested_params(session, call=-1):
+    url = session.get.call_args_list[call].args[0]
+    return parse_qs(urlparse(url).query)
+
+
+@pytest.mark.unit
+class TestSyncState:
+    """Test checkpoint persistence."""
+
+    def test_commit_persists_staged_checkpoint(self, tmp_path):
+        """Staged checkpoints are only visible after commit."""
+        state = SyncState(tmp_path / "state.json")
+        state.stage("concesiones_busqueda", {"vpd": "GE"}, date(2024, 5, 1))
+        assert state.get("concesiones_busqueda", {"vpd": "GE"}) is None
+
+        state.commit()
+
+        reloaded = SyncState(tmp_path / "state.json")
+        assert reloaded.get("concesiones_busqueda", {"vpd": "GE"}) == date(2024, 5, 1)
+        assert reloaded.get("concesiones_busqueda", {"vpd": "A07"}) is None
+
+    def test_context_manager_rolls_back_on_error(self, tmp_path):
+        """Checkpoints staged in a failing block are discarded."""
+        with pytest.raises(RuntimeError):
+            with SyncState(tmp_path / "state.json") as state:
+                state.stage("minimis_busqueda", {}, date(2024, 5, 1))
+                raise RuntimeError("output failed")
+
+        assert not (tmp_path / "state.json").exists()
+
+    def test_commit_keeps_other_checkpoints(self, tmp_path):
+        """Committing one endpoint does not drop checkpoints written meanwhile."""
+        first = SyncState(tmp_path / "state.json")
+        second = SyncState(tmp_path / "state.json")
+        first.stage("minimis_busqueda", {}, date(2024, 5, 1))
+        second.stage("concesiones_busqueda", {}, date(2024, 6, 1))
+        first.commit()
+        second.commit()
+
+        state = SyncState(tmp_path / "state.json")
+        assert state.get("minimis_busqueda", {}) == date(2024, 5, 1)
+        assert state.get("concesiones_busqueda", {}) == date(2024, 6, 1)
+
+
+@pytest.mark.unit
+class TestSyncMethods:
+    """Test the BDNSClient.sync_* API."""
+
+    def test_sync_fetches_delta_since_checkpoint(self, tmp_path, page_session):
+        """The second sync starts from the checkpoint of the first one."""
+        client = BDNSClient()
+        client._session = page_session
+        state_file = tmp_path / "state.json"
+
+        first = list(
+            client.sync_concesiones_busqueda(
+                state_file=state_file, since=date(2024, 1, 1), descripcion="agua"
+            )
+        )
+        assert len(first) == 2
+        assert requested_params(page_session)["fechaRegInicio"] == ["01/01/2024"]
+
+        list(client.sync_concesiones_busqueda(state_file, descripcion="agua"))
+        today = date.today().strftime("%d/%m/%Y")
+        assert requested_params(page_session)["fechaRegInicio"] == [today]
+        assert requested_params(page_session)["fechaRegFin"] == [today]
+
+    def test_checkpoint_not_advanced_if_not_consumed(self, tmp_path, page_session):
+        """Abandoning the generator leaves the checkpoint untouched."""
+        client = BDNSClient()
+        client._session = page_session
+        state_file = tmp_path / "state.json"
+
+        next(client.sync_minimis_busqueda(state_file, since=date(2024, 1, 1)))
+
+        assert not state_file.exists()
+
+
+@pytest.mark.unit
+class TestSyncCLI:
+    """Test the bdns-fetch sync command group."""
+
+    def test_sync_command_writes_output_then_checkpoint(
+        self, tmp_path, page_session, monkeypatch
+    ):
+        """The checkpoint is committed once the delta has been written."""
+        monkeypatch.setattr(BDNSClient, "session", property(lambda self: page_session))
+        output_file = tmp_path / "delta.jsonl"
+        state_file = tmp_path / "state.json"
+
+        result = CliRunner().invoke(
+            app,
+            [
+                "--output-file",
+                str(output_file),
+                "sync",
+                "ayudasestado-busqueda",
+                "--state-file",
+                str(state_file),
+                "--since",
+                "2024-01-01",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        lines = output_file.read_text(encoding="utf-8").strip().split("\n")
+        assert [json.loads(line)["id"] for line in lines] == [1, 2]
+        checkpoints = json.loads(state_file.read_text())["checkpoints"]
+        assert [c["endpoint"] for c in checkpoints.values()] == [
+            "ayudasestado_busqueda"
+        ]
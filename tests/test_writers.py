@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the output writers.
+"""
+
+import io
+import csv
+import gzip
+import json
+import sqlite3
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from bdns.fetch.exceptions import BDNSError
+from bdns.fetch.utils import write_to_file
+from bdns.fetch.writers import (
+    CSV_COLUMNS,
+    ArrowWriter,
+    CSVWriter,
+    JSONLWriter,
+    SQLiteWriter,
+    flatten_record,
+)
+
+
+class CountingFile(io.StringIO):
+    """StringIO recording how many writes and flushes it received."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+RECORDS = [{"id": i, "beneficiario": "AYUNTAMIENTO DE CÁDIZ"} for i in range(100)]
+
+
+@pytest.mark.unit
+class TestJSONLWriter:
+    """Test batching and flushing of JSON lines."""
+
+    def test_batches_records_into_one_write(self):
+        file = CountingFile()
+        with JSONLWriter(file, flush_interval=60) as writer:
+            for record in RECORDS:
+                writer.write(record)
+
+        assert [json.loads(line) for line in file.getvalue().splitlines()] == RECORDS
+        assert file.writes == 1
+        assert writer.records == 100
+
+    def test_flushes_on_buffer_size(self):
+        file = CountingFile()
+        line_size = len(json.dumps(RECORDS[0], ensure_ascii=False)) + 1
+        with JSONLWriter(file, buffer_size=10 * line_size, flush_interval=60) as writer:
+            for record in RECORDS:
+                writer.write(record)
+
+        assert file.writes == 10
+
+    def test_flushes_on_interval(self):
+        file = CountingFile()
+        writer = JSONLWriter(file, flush_interval=0)
+        writer.write(RECORDS[0])
+        assert file.getvalue().count("\n") == 1
+
+    def test_line_buffered(self):
+        file = CountingFile()
+        with JSONLWriter(file, line_buffered=True) as writer:
+            for record in RECORDS[:5]:
+                writer.write(record)
+                assert file.getvalue().count("\n") == writer.records
+
+        assert file.flushes >= 5
+
+    def test_on_flush_runs_after_records_are_written(self):
+        file = CountingFile()
+        seen = []
+        on_flush = Mock(side_effect=lambda: seen.append(file.getvalue().count("\n")))
+        with JSONLWriter(file, flush_interval=60, on_flush=on_flush) as writer:
+            for record in RECORDS:
+                writer.write(record)
+            assert seen == []
+
+        assert seen == [100]
+
+    @pytest.mark.parametrize("output_format", ["jsonl", "csv", "sqlite"])
+    def test_write_to_file_stats(self, tmp_path, output_format):
+        """stats counts the records written and the time spent writing them."""
+        stats = {}
+
+        def slow_records():
+            for record in RECORDS:
+                yield record
+            time.sleep(0.2)
+
+        write_to_file(
+            slow_records(), tmp_path / "out", output_format=output_format, stats=stats
+        )
+
+        assert stats["records"] == 100
+        assert 0 < stats["write_time"] < 0.2
+
+
+CONCESIONES = [
+    {
+        "id": i,
+        "codConcesion": f"SB{i}",
+        "beneficiario": "AYUNTAMIENTO DE CÁDIZ",
+        "importe": 1000 + i,
+        "nivel3": None,
+        "organo": {"nivel1": "ANDALUCÍA", "nivel2": "CONSEJERÍA", "nivel3": None},
+        "regiones": [{"id": 1, "descripcion": "ES61 - ANDALUCIA"}],
+    }
+    for i in range(10)
+]
+
+
+@pytest.mark.unit
+class TestCSVWriter:
+    """Test streaming CSV/TSV rows under a fixed header."""
+
+    def test_flatten_record(self):
+        assert flatten_record(CONCESIONES[0]) == {
+            "id": 0,
+            "codConcesion": "SB0",
+            "beneficiario": "AYUNTAMIENTO DE CÁDIZ",
+            "importe": 1000,
+            "nivel3": None,
+            "organo.nivel1": "ANDALUCÍA",
+            "organo.nivel2": "CONSEJERÍA",
+            "organo.nivel3": None,
+            "regiones": '[{"id": 1, "descripcion": "ES61 - ANDALUCIA"}]',
+        }
+
+    def test_columns_from_first_batch(self):
+        file = CountingFile()
+        records = [{"id": 1, "organo": {"nivel1": "ESTADO"}}, {"id": 2, "extra": "x"}]
+        with CSVWriter(file, batch_size=1) as writer:
+            for record in records:
+                writer.write(record)
+
+        assert file.getvalue() == "id,organo.nivel1\n1,ESTADO\n2,\n"
+
+    def test_dropping_fields_of_inferred_columns_is_an_error(self, caplog):
+        with CSVWriter(CountingFile(), batch_size=1) as writer:
+            writer.write({"id": 1})
+            writer.write({"id": 2, "extra": "x"})
+
+        assert [record.levelname for record in caplog.records] == ["ERROR"]
+        assert "extra" in caplog.text
+
+    @pytest.mark.parametrize(
+        "table",
+        [
+            "concesiones_busqueda",
+            "convocatorias_busqueda",
+            "minimis_busqueda",
+            "ayudasestado_busqueda",
+            "partidospoliticos_busqueda",
+            "sanciones_busqueda",
+        ],
+    )
+    def test_busqueda_endpoints_declare_columns(self, tmp_path, table):
+        """The header of paginated endpoints doesn't depend on their first records."""
+        output = tmp_path / f"{table}.csv"
+        write_to_file(iter([{"id": 1}]), output, output_format="csv", table=table)
+
+        header = output.read_text(encoding="utf-8").splitlines()[0]
+        assert header == ",".join(CSV_COLUMNS[table])
+
+    def test_declared_columns(self):
+        file = CountingFile()
+        with CSVWriter(file, columns=["codConcesion", "importe"]) as writer:
+            writer.write({"importe": 10.5, "codConcesion": "SB1", "id": 1})
+
+        assert file.getvalue() == "codConcesion,importe\nSB1,10.5\n"
+
+    def test_writes_in_batches(self):
+        file = CountingFile()
+        with CSVWriter(file, batch_size=40) as writer:
+            for record in RECORDS:
+                writer.write(record)
+            assert file.getvalue().count("\n") == 81
+
+        assert file.flushes == 3
+        rows = list(csv.DictReader(io.StringIO(file.getvalue())))
+        assert [int(row["id"]) for row in rows] == list(range(100))
+
+    def test_write_to_file_tsv(self, tmp_path):
+        output = tmp_path / "concesiones.tsv.gz"
+        write_to_file(
+            iter([{"codConcesion": "SB1", "convocatoria": "AYUDAS\tI+D"}]),
+            output,
+            output_format="tsv",
+            table="concesiones_busqueda",
+        )
+
+        with gzip.open(output, "rt", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f, delimiter="\t"))
+        assert rows[0]["codConcesion"] == "SB1"
+        assert rows[0]["convocatoria"] == "AYUDAS\tI+D"
+        assert rows[0]["importe"] == ""
+
+
+@pytest.mark.unit
+class TestArrowWriter:
+    """Test Parquet output through Arrow record batches."""
+
+    @pytest.fixture(autouse=True)
+    def parquet(self):
+        return pytest.importorskip("pyarrow.parquet")
+
+    def test_writes_row_groups(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        with ArrowWriter(output, row_group_size=4) as writer:
+            for record in CONCESIONES:
+                writer.write(record)
+
+        file = parquet.ParquetFile(output)
+        assert file.metadata.num_row_groups == 3
+        assert file.read().to_pylist() == CONCESIONES
+        assert writer.records == 10
+
+    def test_nested_fields(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        with ArrowWriter(output) as writer:
+            writer.write(CONCESIONES[0])
+
+        schema = parquet.read_schema(output)
+        assert str(schema.field("organo").type) == (
+            "struct<nivel1: string, nivel2: string, nivel3: string>"
+        )
+        assert str(schema.field("regiones").type.value_type) == (
+            "struct<id: int64, descripcion: string>"
+        )
+        assert str(schema.field("nivel3").type) == "string"
+
+    def test_schema_is_kept_across_row_groups(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        records = [
+            {"id": 1, "importe": 100, "nivel3": None},
+            {"id": 2, "importe": 100.5, "nivel3": "AYUNTAMIENTO", "extra": 1},
+            {"id": 3},
+        ]
+        with ArrowWriter(output, row_group_size=1) as writer:
+            for record in records:
+                writer.write(record)
+
+        assert parquet.read_table(output).to_pylist() == [
+            {"id": 1, "importe": 100.0, "nivel3": None},
+            {"id": 2, "importe": 100.5, "nivel3": "AYUNTAMIENTO"},
+            {"id": 3, "importe": None, "nivel3": None},
+        ]
+
+    def test_declared_schema(self, tmp_path, parquet):
+        import pyarrow
+
+        schema = pyarrow.schema(
+            [("id", pyarrow.int32()), ("codConcesion", pyarrow.string())]
+        )
+        output = tmp_path / "concesiones.parquet"
+        with ArrowWriter(output, schema=schema) as writer:
+            writer.write(CONCESIONES[0])
+
+        assert parquet.read_schema(output).equals(schema)
+        assert parquet.read_table(output).to_pylist() == [
+            {"id": 0, "codConcesion": "SB0"}
+        ]
+
+    def test_incompatible_record(self, tmp_path):
+        writer = ArrowWriter(tmp_path / "concesiones.parquet", row_group_size=1)
+        writer.write({"id": 1})
+
+        with pytest.raises(BDNSError, match="Parquet schema"):
+            writer.write({"id": "SB1"})
+
+    def test_file_is_closed_after_incompatible_records(self, tmp_path, parquet):
+        """A failing row group doesn't fail again on close; the footer is written."""
+        output = tmp_path / "concesiones.parquet"
+        with pytest.raises(BDNSError, match="Parquet schema"):
+            with ArrowWriter(output, row_group_size=2) as writer:
+                for record in [{"id": 1}, {"id": 2}, {"id": "SB3"}, {"id": 4}]:
+                    writer.write(record)
+
+        assert parquet.read_table(output).to_pylist() == [{"id": 1}, {"id": 2}]
+
+    def test_fields_without_values_take_later_values_as_text(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        records = [
+            {"id": 1, "urlBR": None},
+            {"id": 2, "urlBR": 3},
+            {"id": 3, "urlBR": {"url": "https://example.org"}},
+            {"id": 4, "urlBR": "https://example.org"},
+        ]
+        with ArrowWriter(output, row_group_size=1) as writer:
+            for record in records:
+                writer.write(record)
+
+        assert [row["urlBR"] for row in parquet.read_table(output).to_pylist()] == [
+            None,
+            "3",
+            '{"url": "https://example.org"}',
+            "https://example.org",
+        ]
+        assert records[1]["urlBR"] == 3
+
+    def test_no_records(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        ArrowWriter(output).close()
+
+        assert parquet.read_table(output).num_rows == 0
+
+    def test_write_to_file(self, tmp_path, parquet):
+        output = tmp_path / "concesiones.parquet"
+        on_flush = Mock()
+        write_to_file(
+            iter(CONCESIONES), output, output_format="parquet", on_flush=on_flush
+        )
+
+        assert parquet.read_table(output).to_pylist() == CONCESIONES
+        on_flush.assert_called_once()
+
+
+def read_table(path, table):
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in connection.execute(f"SELECT * FROM {table}")]
+    finally:
+        connection.close()
+
+
+@pytest.mark.unit
+class TestSQLiteWriter:
+    """Test upserts into a local SQLite mirror."""
+
+    def test_creates_table_keyed_on_natural_key(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        with SQLiteWriter(output, "concesiones_busqueda", batch_size=4) as writer:
+            for record in CONCESIONES:
+                writer.write(record)
+
+        rows = read_table(output, "concesiones_busqueda")
+        assert [row["codConcesion"] for row in rows] == [f"SB{i}" for i in range(10)]
+        assert json.loads(rows[0]["organo"]) == CONCESIONES[0]["organo"]
+        assert writer.key == "codConcesion"
+
+    def test_upserts_on_incremental_runs(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        with SQLiteWriter(output, "concesiones_busqueda") as writer:
+            writer.write({"codConcesion": "SB1", "importe": 100})
+            writer.write({"codConcesion": "SB2", "importe": 200})
+        with SQLiteWriter(output, "concesiones_busqueda") as writer:
+            writer.write({"codConcesion": "SB2", "importe": 250, "instrumento": "SUB"})
+            writer.write({"codConcesion": "SB3", "importe": 300})
+
+        assert read_table(output, "concesiones_busqueda") == [
+            {"codConcesion": "SB1", "importe": 100, "instrumento": None},
+            {"codConcesion": "SB2", "importe": 250, "instrumento": "SUB"},
+            {"codConcesion": "SB3", "importe": 300, "instrumento": None},
+        ]
+
+    def test_falls_back_to_id(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        with SQLiteWriter(output, "sanciones_busqueda") as writer:
+            writer.write({"id": 1, "nifCif": "B00000000"})
+            writer.write({"id": 1, "nifCif": "B11111111"})
+
+        assert writer.key == "id"
+        assert read_table(output, "sanciones_busqueda") == [
+            {"id": 1, "nifCif": "B11111111"}
+        ]
+
+    def test_without_key_inserts(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        with SQLiteWriter(output, "regiones") as writer:
+            writer.write({"descripcion": "ANDALUCÍA"})
+            writer.write({"descripcion": "ANDALUCÍA"})
+
+        assert len(read_table(output, "regiones")) == 2
+
+    def test_key_is_not_null(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        writer = SQLiteWriter(output, "concesiones_busqueda")
+        writer.write({"codConcesion": "SB1", "importe": 100})
+        writer.write({"codConcesion": None, "importe": 200})
+
+        with pytest.raises(BDNSError):
+            writer.close()
+        with sqlite3.connect(output) as connection:
+            key = connection.execute(
+                "SELECT \"notnull\" FROM pragma_table_info('concesiones_busqueda') "
+                "WHERE pk"
+            ).fetchone()
+        assert key == (1,)
+        assert read_table(output, "concesiones_busqueda") == []
+
+    def test_indexes_filter_columns(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        with SQLiteWriter(output, "concesiones_busqueda") as writer:
+            writer.write(
+                {"codConcesion": "SB1", "fechaConcesion": "2024-03-01", "nivel1": "X"}
+            )
+
+        connection = sqlite3.connect(output)
+        indexes = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND name NOT LIKE 'sqlite_%'"
+            )
+        }
+        connection.close()
+        assert indexes == {
+            "concesiones_busqueda_fechaConcesion",
+            "concesiones_busqueda_nivel1",
+        }
+
+    def test_write_to_file(self, tmp_path):
+        output = tmp_path / "bdns.db"
+        on_flush = Mock()
+        write_to_file(
+            iter(CONCESIONES),
+            output,
+            output_format="sqlite",
+            table="concesiones_busqueda",
+            on_flush=on_flush,
+        )
+
+        assert len(read_table(output, "concesiones_busqueda")) == 10
+        on_flush.assert_called_once()